@@ -82,8 +82,9 @@ __author__ = 'Juniper Networks'
 __version__ = '1.0.3'
 __license__ = 'MIT'
 __all__ = [
-    'XMLDictNode', 'XMLListNode', 'XMLCDATANode', 'Parser', 'parse',
-    'EtreeParser', 'parse_etree'
+    'XMLDictNode', 'XMLListNode', 'XMLCDATANode', 'XMLMutableCDATANode',
+    'Parser', 'PushParser', 'FramedPushParser',
+    'parse', 'EtreeParser', 'parse_etree'
 ]
 
 class OrderedDict(_OrderedDict):
@@ -92,6 +93,8 @@ class OrderedDict(_OrderedDict):
     This module uses the OrderedDict class to maintain ordering
     of the input data.
     """
+    __slots__ = ()
+
     def __repr__(self, _repr_running=None):
         if _repr_running is None:
             _repr_running = {}
@@ -163,7 +166,8 @@ class _XMLListPlaceholder(object): # pragma no cover
 
 # This is a silly little hack to get around the fact that we have circular
 # references in the three different node type files.
-_node_refs = {'XMLListNode': None, 'XMLCDATANode': None, 'XMLDictNode': None}
+_node_refs = {'XMLListNode': None, 'XMLCDATANode': None, 'XMLDictNode': None,
+              'XMLMutableCDATANode': None}
 
 # These imports are purposely at the end because they depend on things that
 # are defined above this line.
@@ -175,14 +179,27 @@ from ._basenode import XMLNodeBase
 # Import the node classes, updating the references in the dictionary.
 from .listnode import XMLListNode
 _node_refs['XMLListNode'] = XMLListNode
-from .cdatanode import XMLCDATANode
+from .cdatanode import XMLCDATANode, XMLMutableCDATANode
 _node_refs['XMLCDATANode'] = XMLCDATANode
+_node_refs['XMLMutableCDATANode'] = XMLMutableCDATANode
 from .dictnode import XMLDictNode
 _node_refs['XMLDictNode'] = XMLDictNode
 
 # Now, import anything else we want.
-from .xmlparser import Parser, parse
+from .xmlparser import Parser, PushParser, FramedPushParser, parse
 from .etreeparser import EtreeParser, parse_etree
+try: # pragma no cover
+    from .asyncparser import AsyncParser
+    __all__.append('AsyncParser')
+except (ImportError, SyntaxError): # pragma no cover
+    # The asyncio parser requires Python 3.6 or later.
+    pass
+try: # pragma no cover
+    from .batchparser import parse_many, parse_split, ParseManyError
+    __all__.extend(['parse_many', 'parse_split', 'ParseManyError'])
+except ImportError: # pragma no cover
+    # Some platforms (such as Jython) do not provide multiprocessing.
+    pass
 
 def emit_xml(obj, *args, **kwargs):
     """Translate a Python dictionary or list to XML output.
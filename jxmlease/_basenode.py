@@ -14,7 +14,10 @@ from __future__ import absolute_import
 
 from xml.sax.saxutils import XMLGenerator
 from copy import copy
+import weakref
 from . import _node_refs, OrderedDict, StringIO, _unicode
+from ._nodecopy import (_get_state, _set_state, _reduce, _deepcopy,
+                        _copy, _reduce_node)
 from . import _XMLCDATAPlaceholder, _XMLDictPlaceholder, _XMLListPlaceholder
 
 __all__ = ['XMLNodeBase']
@@ -24,6 +27,58 @@ class _NoArg(object): # pylint: disable=too-few-public-methods
     def __init__(self):
         pass
 
+class _EmptyXMLAttrs(OrderedDict):
+    """Internal Use Only"""
+    # An immutable, empty attribute dictionary. Nodes without XML
+    # attributes share a single instance of this class, rather than
+    # each holding their own empty dictionary. The node replaces it
+    # with a new OrderedDict before the dictionary is used by anything
+    # but the node itself. (See XMLNodeBase._own_xml_attrs().)
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("The shared empty XML attribute dictionary "
+                        "cannot be modified")
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+    move_to_end = __ior__ = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return "_empty_xml_attrs"
+
+_empty_xml_attrs = _EmptyXMLAttrs()
+
+# The instance attributes of the node classes. Each concrete node class
+# must declare these slots itself because the built-in types they
+# subclass (str, OrderedDict, and list) have incompatible layouts.
+# (XMLCDATANode does not store its text, which is the node itself.)
+_common_slots = ('tag', 'key', '_parent', '_xml_attrs',
+                 '_replacement_node', '_index_hint')
+
+def _node_slots(base, *extra):
+    """Internal function to compute the slots of a node class.
+
+    Args:
+        base (type): The built-in type the node class subclasses.
+        *extra (strings): Slots the node class adds to the common ones.
+
+    Returns:
+        A tuple suitable for use as the class' :py:obj:`__slots__`.
+    """
+    slots = _common_slots + extra
+    # Keep the nodes weak-referenceable, as they were before they used
+    # slots.
+    if not base.__weakrefoffset__:
+        slots += ('__weakref__',)
+    return slots
+
 _common_docstring = lambda x: """Initialize an %s object.
 
 The optional first parameter can be the value to which the
@@ -138,6 +193,7 @@ def _docstring_fixup(cls):
                         pass
 
 XMLCDATANode = _XMLCDATAPlaceholder
+XMLMutableCDATANode = _XMLCDATAPlaceholder
 XMLDictNode = _XMLDictPlaceholder
 XMLListNode = _XMLListPlaceholder
 def _resolve_references_once():
@@ -154,10 +210,12 @@ def _resolve_references_once():
     # pylint: disable=global-statement
     # pylint: disable=invalid-name
     global XMLCDATANode
+    global XMLMutableCDATANode
     global XMLDictNode
     global XMLListNode
     global _resolve_references
     XMLCDATANode = _node_refs['XMLCDATANode']
+    XMLMutableCDATANode = _node_refs['XMLMutableCDATANode']
     XMLDictNode = _node_refs['XMLDictNode']
     XMLListNode = _node_refs['XMLListNode']
     _resolve_references = lambda: None
@@ -169,6 +227,12 @@ class XMLNodeBase(object):
 
     This modules is not intended for standalone use.
     """
+    # The slots are declared by the concrete node classes. (See
+    # _node_slots().) This class cannot declare them, because its
+    # subclasses also subclass built-in types with incompatible
+    # layouts, so pylint cannot see them here.
+    # pylint: disable=assigning-non-slot
+    __slots__ = ()
 
     def __new__(cls, *args, **kwargs):
         # Resolve delayed references, if necessary
@@ -228,12 +292,12 @@ class XMLNodeBase(object):
         # node_text and xml_attrs.
 
         # Set some overall defaults
-        xml_attrs = OrderedDict()
+        xml_attrs = _empty_xml_attrs
         node_text = _unicode()
 
         # Modify the defaults if the initial value was an XMLNodeBase object
         if isinstance(initializer, XMLNodeBase):
-            xml_attrs = getattr(initializer, "xml_attrs", xml_attrs)
+            xml_attrs = getattr(initializer, "_xml_attrs", xml_attrs)
             node_text = getattr(initializer, "text", node_text)
 
         # Process the arguments to override the defaults
@@ -250,16 +314,76 @@ class XMLNodeBase(object):
         # Add attributes to the object.
         self.tag = tag
         self.key = copy(key)
-        self.xml_attrs = OrderedDict()
-        for k in xml_attrs:
-            self.xml_attrs[k] = _unicode(xml_attrs[k])
+        if xml_attrs:
+            self._xml_attrs = OrderedDict()
+            for k in xml_attrs:
+                self._xml_attrs[k] = _unicode(xml_attrs[k])
+        else:
+            self._xml_attrs = _empty_xml_attrs
         if not hasattr(self, "text"):
             self.text = node_text
         self.parent = parent_node
         self._replacement_node = None
+        # The node's position in its parent, if the parent is a list.
+        # This is only a hint. (See _find_in_list().)
+        self._index_hint = 0
         if convert:
             self.standardize(deep=deep)
 
+    def _init_fast(self, tag, key, parent, xml_attrs, text):
+        # Set the node's attributes directly. This is the counterpart
+        # of __init__() for the _new_fast() constructors, which skip
+        # the argument processing in __new__() and __init__(). The
+        # caller must supply a new xml_attrs dictionary (which the node
+        # takes over) with string values, and must supply text (and
+        # children, if any) that are already standardized.
+        _resolve_references()
+        self.tag = tag
+        self.key = key
+        self._xml_attrs = xml_attrs or _empty_xml_attrs
+        self.text = text
+        self._parent = parent
+        self._replacement_node = None
+        self._index_hint = 0
+
+    @property
+    def parent(self):
+        """The parent node, or None if the node has no parent."""
+        # The parser may store a weak reference to the parent. (See the
+        # parent_links argument of the Parser class.)
+        parent = self._parent
+        if isinstance(parent, weakref.ref):
+            return parent()
+        return parent
+
+    @parent.setter
+    def parent(self, value):
+        self._parent = value
+
+    @property
+    def xml_attrs(self):
+        """The XML attribute dictionary."""
+        return self._own_xml_attrs()
+
+    @xml_attrs.setter
+    def xml_attrs(self, value):
+        self._xml_attrs = value
+
+    def _own_xml_attrs(self):
+        # Return the node's XML attribute dictionary, first replacing
+        # the shared empty dictionary with one the node can modify.
+        if self._xml_attrs is _empty_xml_attrs:
+            self._xml_attrs = OrderedDict()
+        return self._xml_attrs
+
+    # Copy and pickle support. (See _nodecopy.)
+    __getstate__ = _get_state
+    __setstate__ = _set_state
+    __reduce__ = _reduce
+    __deepcopy__ = _deepcopy
+    __copy__ = _copy
+    _reduce_node = _reduce_node
+
     def has_xml_attrs(self):
         """Determine if the node has XML attributes.
 
@@ -267,7 +391,7 @@ class XMLNodeBase(object):
             A bool that is True if the node has XML attributes, and
                 False otherwise.
         """
-        if len(self.xml_attrs) > 0:
+        if len(self._xml_attrs) > 0:
             return True
         return False
 
@@ -299,7 +423,7 @@ class XMLNodeBase(object):
                 (See :py:meth:`get_current_node`.)
         """
         self._check_replacement()
-        self.xml_attrs[attr] = _unicode(val)
+        self._own_xml_attrs()[attr] = _unicode(val)
 
     def get_xml_attr(self, attr, defval=_NoArg()):
         """Get an XML attribute.
@@ -320,7 +444,7 @@ class XMLNodeBase(object):
                 :py:obj:`defval` is not supplied.
         """
         try:
-            return self.xml_attrs[attr]
+            return self._xml_attrs[attr]
         except KeyError:
             if not isinstance(defval, _NoArg):
                 return defval
@@ -337,7 +461,7 @@ class XMLNodeBase(object):
         Returns:
             :py:class:`OrderedDict`: The XML attribute dictionary.
         """
-        return self.xml_attrs
+        return self._own_xml_attrs()
 
     def delete_xml_attr(self, attr):
         """Delete an XML attribute.
@@ -357,7 +481,9 @@ class XMLNodeBase(object):
                 :py:meth:`get_current_node`.)
         """
         self._check_replacement()
-        del self.xml_attrs[attr]
+        if attr not in self._xml_attrs:
+            raise KeyError(attr)
+        del self._xml_attrs[attr]
 
     def set_cdata(self, cdata, return_node=False):
         """Set a node's CDATA.
@@ -587,6 +713,7 @@ class XMLNodeBase(object):
 
         # Reparent ourselves.
         self.parent = new_node
+        self._index_hint = 0
 
         # Return the list.
         return new_node
@@ -627,86 +754,90 @@ class XMLNodeBase(object):
         else:
             return self
 
+    def _find_in_list(self, nodelist):
+        # Return the index of this node in nodelist, or None if it is not
+        # there. The index recorded when the node was added to the list
+        # is checked first, so this is normally constant time.
+        hint = self._index_hint
+        if hint < len(nodelist) and nodelist[hint] is self:
+            return hint
+        for (i, node) in enumerate(nodelist):
+            if node is self:
+                self._index_hint = i
+                return i
+        return None
+
     def _replace_node(self, newnode):
         # Replace a node with a new node. If the replacement node is
         # None, then the node is deleted.
+        #
+        # The node is located in its parent by identity. (Comparing by
+        # equality would compare whole subtrees, and could find a
+        # sibling that merely has the same value.)
+        # pylint: disable=protected-access
 
         self._check_replacement()
         # We need to replace ourselves with a new node.
-        if self.parent is None:
+        parent = self.parent
+        if parent is None:
             raise AttributeError("Attempt to modify root document")
         # Record the replacement for anyone who still holds
         # references to this node.
         if newnode is not None:
             self._replacement_node = newnode
-        # Case 1: Parent is dictionary
-        try:
+        # Case 1: Parent is list
+        if isinstance(parent, list):
+            i = self._find_in_list(parent)
+            if i is not None:
+                if newnode is not None:
+                    newnode._index_hint = i
+                    parent[i] = newnode
+                else:
+                    del parent[i]
+                    # Make sure we don't need to delete the enclosing
+                    # list, too.
+                    if len(parent) == 0:
+                        parent._replace_node(None)
+                return
+        # Case 2: Parent is dictionary
+        elif isinstance(parent, dict):
             # Plan A: Do the lookup by expected key.
-            if self.key in self.parent:
-                if self.parent[self.key] == self:
-                    if newnode is not None:
-                        self.parent[self.key] = newnode
-                    else:
-                        del self.parent[self.key]
-                    return
+            if parent.get(self.key) is self:
+                if newnode is not None:
+                    parent[self.key] = newnode
+                else:
+                    del parent[self.key]
+                return
             # Plan B: Brute force check, in case of some sort of
             # mismatch. We do our best, within reason.
-            myiter = None
-            try:
-                # Python 2
-                myiter = self.parent.iteritems()
-            except AttributeError:
-                # Python 3
-                myiter = self.parent.items()
-            for key, val in myiter:
-                if val == self:
+            for (key, val) in list(parent.items()):
+                if val is self:
                     if newnode is not None:
                         # Update the new node's key
                         newnode.key = copy(key)
                         # Replace us
-                        self.parent[key] = newnode
+                        parent[key] = newnode
                     else:
-                        del self.parent[key]
+                        del parent[key]
                     return
                 elif isinstance(val, XMLListNode):
                     # Check the list
-                    for i in range(0, len(val)):
-                        if val[i] == self:
-                            if newnode is not None:
-                                # Update the new node's key and parent
-                                newnode.key = copy(key)
-                                newnode.parent = val
-                                # Replace us
-                                val[i] = newnode
-                            else:
-                                del val[i]
-                                # Make sure we don't need to delete the
-                                # enclosing list, too.
-                                if len(val) == 0:
-                                    val._replace_node(None)
-                            return
-        except: # pylint: disable=bare-except
-            pass
-        # Case 2: Parent is list
-        try:
-            made_change = False
-            for i in range(0, len(self.parent)):
-                if self.parent[i] == self and self.parent[i].xml_attrs == self.xml_attrs:
-                    if newnode is not None:
-                        self.parent[i] = newnode
+                    i = self._find_in_list(val)
+                    if i is not None:
+                        if newnode is not None:
+                            # Update the new node's key and parent
+                            newnode.key = copy(key)
+                            newnode.parent = val
+                            newnode._index_hint = i
+                            # Replace us
+                            val[i] = newnode
+                        else:
+                            del val[i]
+                            # Make sure we don't need to delete the
+                            # enclosing list, too.
+                            if len(val) == 0:
+                                val._replace_node(None)
                         return
-                    else:
-                        del self.parent[i]
-                        made_change = True
-                        break
-            if made_change:
-                # Make sure we don't need to delete the enclosing list,
-                # too.
-                if len(self.parent) == 0:
-                    self.parent._replace_node(None)
-                return
-        except: # pylint: disable=bare-except
-            pass
         raise AttributeError("Unable to find existing node in parent")
 
     def dict(self, attrs=None, tags=None, func=None, in_place=False,
@@ -998,7 +1129,7 @@ class XMLNodeBase(object):
         # multiple root nodes, it is not OK. Otherwise, we assume
         # it is.
         while full_document_ok is None:
-            if isinstance(curnode, XMLCDATANode):
+            if isinstance(curnode, (XMLCDATANode, XMLMutableCDATANode)):
                 # Always OK
                 full_document_ok = True
             elif not isinstance(curnode, XMLNodeBase):
@@ -1360,7 +1491,7 @@ class XMLNodeBase(object):
     def __repr__(self):
         return "%s(xml_attrs=%r, value=%s)" % (
             getattr(self, "__const_class_name__", self.__class__.__name__),
-            self.xml_attrs, super(XMLNodeBase, self).__repr__()
+            self._xml_attrs, super(XMLNodeBase, self).__repr__()
         )
 
     def __str__(self):
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# Copyright (c) 2015-2016, Juniper Networks, Inc.
+# All rights reserved.
+#
+# See the LICENSE file for further information.
+"""Internal module that converts XML trees to and from a flat format."""
+from __future__ import absolute_import
+
+from array import array
+import sys
+import weakref
+from . import OrderedDict, _unicode
+from ._basenode import _empty_xml_attrs
+from .cdatanode import XMLCDATANode, XMLMutableCDATANode
+from .dictnode import XMLDictNode
+from .listnode import XMLListNode
+from ._lazytree import _LazyXMLDictNode
+from ._parsehandler import _get_parent_link
+
+__all__ = []
+
+# The flat format of a tree is a tuple of (version, parent_links, names,
+# strings, codes):
+#   version: _format_version.
+#   parent_links: The kind of parent references the tree had ('strong',
+#       'weak' or 'none'), as for the parent_links argument of the
+#       parser.
+#   names: A list of the distinct tags, keys and attribute names in the
+#       tree.
+#   strings: A list of the distinct attribute values and CDATA in the
+#       tree.
+#   codes: An array of integers describing the nodes in document order.
+#       Each node is described by:
+#           kind, tag, key,
+#           the key under which its parent stores it (only for the
+#               children of dictionary nodes),
+#           number of XML attributes,
+#           (attribute name, attribute value) for each XML attribute,
+#           text,
+#           number of children (only for dictionary and list nodes).
+#       The tags, keys and attribute names are indexes into names. The
+#       attribute values and text are indexes into strings. Either may
+#       be _none for None. The node's children follow it.
+#
+# The format holds plain strings and integers, so it pickles compactly.
+# It has no parent references; they are recreated when the tree is
+# built.
+_format_version = 2
+
+# The node kinds.
+_cdata = 0
+_mutable_cdata = 1
+_dict = 2
+_list = 3
+# A dictionary node whose _ignore_level flag is set.
+_dict_ignore_level = 4
+
+# The kinds of the node classes. Other classes (including subclasses of
+# these) cannot be flattened, as they could not be rebuilt.
+_kinds = {
+    XMLCDATANode: _cdata,
+    XMLMutableCDATANode: _mutable_cdata,
+    XMLDictNode: _dict,
+    _LazyXMLDictNode: _dict,
+    XMLListNode: _list,
+}
+
+_none = -1
+
+# The key of a node whose parent is not a dictionary.
+_no_key = object()
+
+# The function used to intern the names (of type str) when a tree is
+# built.
+try: # pragma no cover
+    _intern = sys.intern
+except AttributeError: # pragma no cover
+    _intern = intern # pylint: disable=undefined-variable
+
+def _add_string(value, strings, string_ids):
+    # Return the index of value in strings, adding it if needed.
+    value_id = string_ids.get(value)
+    if value_id is None:
+        value_id = len(strings)
+        strings.append(value)
+        string_ids[value] = value_id
+    return value_id
+
+def _parent_links_of(node):
+    # Return the parent_links setting which matches the node's parent
+    # reference.
+    parent = getattr(node, '_parent', None)
+    if parent is None:
+        return 'none'
+    elif isinstance(parent, weakref.ref):
+        return 'weak'
+    return 'strong'
+
+def _flatten_tree(root):
+    """Internal function to convert a tree to the flat format.
+
+    Args:
+        root (XMLNodeBase): The root of the tree.
+
+    Returns:
+        The flat format of the tree.
+
+    Raises:
+        :py:exc:`TypeError`: If the tree contains an object which is not
+            one of the XML node classes.
+    """
+    # pylint: disable=protected-access
+    names = []
+    name_ids = {None: _none}
+    strings = []
+    string_ids = {None: _none}
+    parent_links = None
+    codes = array('i')
+    add_code = codes.append
+    # Each entry of the stack is a node and the key under which its
+    # parent stores it (or _no_key if the parent is not a dictionary).
+    # A dictionary's keys usually match the keys of its children, but
+    # need not. (See XMLNodeBase.dict().)
+    stack = [(root, _no_key)]
+    while stack:
+        (node, dict_key) = stack.pop()
+        kind = _kinds.get(type(node))
+        if kind is None:
+            raise TypeError("Cannot flatten an object of type '%s'"
+                            % (type(node).__name__))
+        if kind == _cdata:
+            text = _unicode(node)
+            children = None
+        elif kind == _dict:
+            if node._ignore_level:
+                kind = _dict_ignore_level
+            text = node.text
+            children = [(child, k) for (k, child) in node.items()]
+        elif kind == _list:
+            text = node.text
+            children = [(child, _no_key) for child in node]
+        else:
+            text = node.text
+            children = None
+        attrs = node._xml_attrs
+        add_code(kind)
+        add_code(_add_string(node.tag, names, name_ids))
+        add_code(_add_string(node.key, names, name_ids))
+        if dict_key is not _no_key:
+            add_code(_add_string(dict_key, names, name_ids))
+        add_code(len(attrs))
+        for (k, v) in attrs.items():
+            add_code(_add_string(k, names, name_ids))
+            add_code(_add_string(v, strings, string_ids))
+        add_code(_add_string(text, strings, string_ids))
+        if children is not None:
+            if children and parent_links is None:
+                parent_links = _parent_links_of(children[0][0])
+            add_code(len(children))
+            stack.extend(reversed(children))
+    return (_format_version, parent_links or 'strong', names, strings, codes)
+
+def _next_function(values):
+    # Return a function which returns the next value each time it is
+    # called.
+    values = iter(values)
+    return getattr(values, '__next__', None) or values.next
+
+def _build_tree(flat, parent_links=None):
+    """Internal function to build a tree from the flat format.
+
+    Args:
+        flat (tuple): The flat format of the tree, as returned by
+            :py:func:`_flatten_tree`.
+        parent_links (string): The kind of parent references to create
+            ('strong', 'weak' or 'none'). If this is None, the tree gets
+            the kind it had when it was flattened.
+
+    Returns:
+        The root of the tree.
+    """
+    # pylint: disable=protected-access
+    (version, flat_parent_links, names, strings, codes) = flat
+    if version != _format_version:
+        raise ValueError("Unsupported flat tree format version: %r"
+                         % (version,))
+    make_parent_link = _get_parent_link(parent_links or flat_parent_links)
+    # Trees built from the same format share the strings of their names.
+    # None is stored as _none (-1), which selects the last entry of each
+    # list.
+    # pylint: disable=unidiomatic-typecheck
+    names = [_intern(name) if type(name) is str else name
+             for name in names]
+    names.append(None)
+    strings = list(strings)
+    strings.append(None)
+    next_code = _next_function(codes.tolist())
+    new_cdata = XMLCDATANode._new_fast
+    new_mutable_cdata = XMLMutableCDATANode._new_fast
+    new_dict = XMLDictNode._new_fast
+    new_list = XMLListNode._new_fast
+    add_to_dict = OrderedDict.__setitem__
+    add_to_list = list.append
+    # Each entry of the stack is a list of: a dictionary or list node,
+    # whether it is a list, the number of its children still to be
+    # built, and the parent reference for them.
+    stack = []
+    entry = None
+    root = None
+    while True:
+        kind = next_code()
+        tag = names[next_code()]
+        key = names[next_code()]
+        if stack and not stack[-1][1]:
+            dict_key = names[next_code()]
+        num_attrs = next_code()
+        if num_attrs:
+            attrs = OrderedDict()
+            for _ in range(num_attrs):
+                name = names[next_code()]
+                attrs[name] = strings[next_code()]
+        else:
+            attrs = _empty_xml_attrs
+        text = strings[next_code()]
+        if kind == _cdata:
+            node = new_cdata(text, tag, attrs)
+        elif kind == _mutable_cdata:
+            node = new_mutable_cdata(text, tag, attrs)
+        elif kind == _list:
+            node = new_list([], tag, key)
+            node.text = text
+        else:
+            node = new_dict(tag, attrs)
+            node.text = text
+            node._ignore_level = kind == _dict_ignore_level
+        node.key = key
+        if entry is not None:
+            parent = entry[0]
+            node._parent = entry[3]
+            if entry[1]:
+                node._index_hint = len(parent)
+                add_to_list(parent, node)
+            else:
+                add_to_dict(parent, dict_key, node)
+            entry[2] -= 1
+        else:
+            root = node
+        if kind >= _dict:
+            num_children = next_code()
+            if num_children:
+                if make_parent_link is None:
+                    link = node
+                else:
+                    link = make_parent_link(node)
+                entry = [node, kind == _list, num_children, link]
+                stack.append(entry)
+        # Go back up past the nodes whose children are all built.
+        while entry is not None and entry[2] == 0:
+            stack.pop()
+            entry = stack[-1] if stack else None
+        if entry is None:
+            return root
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# Copyright (c) 2015-2016, Juniper Networks, Inc.
+# All rights reserved.
+#
+# See the LICENSE file for further information.
+"""Internal module that provides lazily-built parse trees."""
+from __future__ import absolute_import
+
+from array import array
+from types import FunctionType
+from . import OrderedDict, _unicode
+from ._basenode import _empty_xml_attrs, XMLNodeBase
+from .dictnode import XMLDictNode
+from .listnode import XMLListNode
+
+__all__ = []
+
+class _EventBuffer(object):
+    # The elements of a parsed document, stored compactly in arrays.
+    #
+    # Element i is described by entry i of each per-element array:
+    #   tags: the index of its name in the names table.
+    #   ends: the index of the first element after its subtree. So, its
+    #       children are i + 1, ends[i + 1], ... up to ends[i].
+    #   attr_starts: the index of its first attribute in the attribute
+    #       arrays. (Its attributes end where the next element's start.)
+    #   text_starts/text_lengths: the location of its (final) CDATA in
+    #       the text.
+    #
+    # The CDATA and attribute values are appended to a list of pieces
+    # while parsing. To save memory, the pieces are periodically joined
+    # into larger chunks. The chunks are joined into a single string the
+    # first time a node is built.
+    def __init__(self, cdata_class, make_parent_link=None, intern=None):
+        # pylint: disable=redefined-builtin
+        self.cdata_class = cdata_class
+        self.make_parent_link = make_parent_link
+        # If set, the table used to intern attribute values.
+        self.intern = intern
+        self.names = []
+        self.name_ids = {}
+        self.tags = array('i')
+        self.ends = array('i')
+        self.attr_starts = array('i')
+        self.text_starts = array('l')
+        self.text_lengths = array('l')
+        self.attr_names = array('i')
+        self.attr_value_starts = array('l')
+        self.attr_value_lengths = array('l')
+        self.pieces = []
+        self.chunks = []
+        self.size = 0
+        self.text = None
+
+    def add_name(self, name):
+        """Add a name to the names table and return its index."""
+        name_id = len(self.names)
+        self.names.append(name)
+        self.name_ids[name] = name_id
+        return name_id
+
+    def add_text(self, text):
+        """Add a string to the text and return its offset."""
+        start = self.size
+        self.pieces.append(text)
+        self.size += len(text)
+        if len(self.pieces) >= 1024:
+            self.chunks.append(_unicode().join(self.pieces))
+            self.pieces = []
+        return start
+
+    def get_text(self, start, length):
+        """Return a string from the text."""
+        if length == 0:
+            return _unicode()
+        if self.text is None:
+            self.chunks.extend(self.pieces)
+            self.text = _unicode().join(self.chunks)
+            self.chunks = self.pieces = None
+        return self.text[start:start + length]
+
+    def get_attrs(self, idx):
+        """Return the XML attributes of an element."""
+        start = self.attr_starts[idx]
+        if idx + 1 < len(self.attr_starts):
+            end = self.attr_starts[idx + 1]
+        else:
+            end = len(self.attr_names)
+        if start == end:
+            return _empty_xml_attrs
+        attrs = OrderedDict()
+        for i in range(start, end):
+            value = self.get_text(self.attr_value_starts[i],
+                                  self.attr_value_lengths[i])
+            if self.intern is not None:
+                value = self.intern.setdefault(value, value)
+            attrs[self.names[self.attr_names[i]]] = value
+        return attrs
+
+    def build_node(self, idx):
+        """Return a new node for an element.
+
+        An element without children becomes a CDATA node. Otherwise,
+        the element becomes a lazy dictionary node, which builds its
+        children when they are first needed.
+        """
+        tag = self.names[self.tags[idx]]
+        attrs = self.get_attrs(idx)
+        text = self.get_text(self.text_starts[idx], self.text_lengths[idx])
+        if self.ends[idx] == idx + 1:
+            return self.cdata_class._new_fast(text, tag, attrs) # pylint: disable=protected-access
+        node = _LazyXMLDictNode._new_lazy(self, idx, tag, attrs) # pylint: disable=protected-access
+        node.text = text
+        return node
+
+# The key of the placeholder entry in unbuilt lazy nodes.
+_unbuilt_key = object()
+
+class _LazyXMLDictNode(XMLDictNode):
+    # An XMLDictNode whose children are built from an _EventBuffer the
+    # first time they are needed. Until then, the node only holds the
+    # buffer and the index of its element (or -1 for the document).
+    # Once the children are built, the node behaves exactly like an
+    # XMLDictNode.
+    #
+    # All the methods that use the node's children are wrapped (below)
+    # so that they build them first. Code in C (such as the C
+    # implementation of json.dumps()) may read the dictionary directly,
+    # but it only does that for empty dictionaries; otherwise, it calls
+    # the methods. So, until its children are built, the node holds a
+    # placeholder entry, which _materialize() removes.
+    __slots__ = ('_lazy_buffer', '_lazy_index')
+
+    @classmethod
+    def _new_lazy(cls, buf, idx, tag=None, xml_attrs=None):
+        # Create a node for element idx of the buffer. (The nodes are
+        # created here, not by __init__(), so this sets the slots.)
+        # pylint: disable=protected-access,attribute-defined-outside-init
+        node = cls._new_fast(tag, xml_attrs or _empty_xml_attrs)
+        node.__const_class_name__ = 'XMLDictNode'
+        # Add the placeholder while the node is marked as built. (On
+        # Python 2, the OrderedDict methods call the wrapped methods.)
+        node._lazy_buffer = None
+        OrderedDict.__setitem__(node, _unbuilt_key, None)
+        node._lazy_buffer = buf
+        node._lazy_index = idx
+        return node
+
+    def _materialize(self):
+        # Build the node's children. The node is marked as built first,
+        # so the OrderedDict methods used here (and any other methods
+        # called by the parent link functions) do not try it again.
+        # pylint: disable=attribute-defined-outside-init
+        buf = self._lazy_buffer
+        if buf is None:
+            return
+        idx = self._lazy_index
+        self._lazy_buffer = None
+        OrderedDict.__delitem__(self, _unbuilt_key)
+        if idx < 0:
+            end = len(buf.tags)
+        else:
+            end = buf.ends[idx]
+        link = buf.make_parent_link
+        if link is None:
+            self_link = self
+        else:
+            self_link = link(self)
+        child = idx + 1
+        while child < end:
+            node = buf.build_node(child)
+            key = node.key
+            existing = OrderedDict.get(self, key)
+            if existing is None:
+                node._parent = self_link # pylint: disable=protected-access
+                OrderedDict.__setitem__(self, key, node)
+            else:
+                if not isinstance(existing, XMLListNode):
+                    # Turn the existing entry into a list, as add_node()
+                    # would.
+                    newlist = XMLListNode._new_fast([existing], key, key, # pylint: disable=protected-access
+                                                    self_link)
+                    existing._parent = newlist # pylint: disable=protected-access
+                    if link is not None:
+                        existing._parent = link(newlist) # pylint: disable=protected-access
+                    OrderedDict.__setitem__(self, key, newlist)
+                    existing = newlist
+                if link is None:
+                    node._parent = existing # pylint: disable=protected-access
+                else:
+                    node._parent = link(existing) # pylint: disable=protected-access
+                node._index_hint = len(existing) # pylint: disable=protected-access
+                list.append(existing, node)
+            child = buf.ends[child]
+
+    def _reduce_node(self):
+        # Copies are ordinary XMLDictNode objects.
+        self._materialize()
+        (func, _, state, list_items, dict_items) = super(
+            _LazyXMLDictNode, self)._reduce_node()
+        state.pop('_lazy_buffer', None)
+        state.pop('_lazy_index', None)
+        return (func, (XMLDictNode,), state, list_items, dict_items)
+
+    def __eq__(self, other):
+        self._materialize()
+        if isinstance(other, _LazyXMLDictNode):
+            other._materialize() # pylint: disable=protected-access
+        return super(_LazyXMLDictNode, self).__eq__(other)
+
+    def __ne__(self, other):
+        self._materialize()
+        if isinstance(other, _LazyXMLDictNode):
+            other._materialize() # pylint: disable=protected-access
+        return super(_LazyXMLDictNode, self).__ne__(other)
+
+    __hash__ = None
+
+# The container methods which use the node's children.
+_container_methods = (
+    '__contains__', '__delitem__', '__getitem__', '__iter__', '__len__',
+    '__reversed__', '__setitem__', '__or__', '__ror__', '__ior__',
+    'clear', 'copy', 'get', 'items', 'keys', 'move_to_end', 'pop',
+    'popitem', 'setdefault', 'update', 'values',
+    'has_key', 'iteritems', 'iterkeys', 'itervalues', 'viewitems',
+    'viewkeys', 'viewvalues',
+)
+
+# The node methods which do not use the node's children.
+_node_only_methods = (
+    '__new__', '__init__', '_init_fast', '__getstate__', '__setstate__',
+    '__reduce__', '_reduce_node', '__eq__', '__ne__', '_check_replacement',
+    'has_xml_attrs', 'set_xml_attr', 'get_xml_attr', 'get_xml_attrs',
+    'delete_xml_attr', 'set_cdata', 'append_cdata', 'get_cdata',
+    'strip_cdata', 'get_current_node', '_find_in_list', '_replace_node',
+)
+
+def _materializing(method):
+    # Return a wrapper for method that builds the node's children first.
+    def wrapper(self, *args, **kwargs):
+        # pylint: disable=protected-access
+        if self._lazy_buffer is not None:
+            self._materialize()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+def _wrap_methods():
+    # Wrap the methods of _LazyXMLDictNode that use the node's children.
+    names = set(k for k in _container_methods if hasattr(XMLDictNode, k))
+    for cls in (XMLNodeBase, XMLDictNode):
+        for (k, v) in vars(cls).items():
+            if isinstance(v, FunctionType) and k not in _node_only_methods:
+                names.add(k)
+    for k in names:
+        setattr(_LazyXMLDictNode, k, _materializing(getattr(XMLDictNode, k)))
+
+_wrap_methods()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# Copyright (c) 2015-2016, Juniper Networks, Inc.
+# All rights reserved.
+#
+# See the LICENSE file for further information.
+"""Internal module that lets lxml drive the parse handlers."""
+from __future__ import absolute_import
+
+import re
+from xml.parsers import expat
+
+# pylint: disable=wrong-import-position
+
+try: # pragma no cover
+    from lxml import etree
+except ImportError: # pragma no cover
+    etree = None
+
+from . import _unicode
+
+# pylint: enable=wrong-import-position
+
+try: # pragma no cover
+    _bytes = bytes
+except NameError: # pragma no cover
+    _bytes = str
+
+__all__ = []
+
+# The namespace the "xml" prefix is bound to.
+_xml_namespace = "http://www.w3.org/XML/1998/namespace"
+
+# The libxml2 error code for a document without a root element.
+_xml_err_document_empty = 4
+
+# The size of the pieces in which data is passed to lxml. (lxml limits
+# the size of the data passed to it at once, unless huge_tree is set.)
+_feed_size = 65536
+
+# The location which lxml adds to the end of its error messages.
+_location_re = re.compile(r', line \d+, column \d+$')
+
+# Marks a namespace which was not bound before an element bound it.
+_unbound = object()
+
+def _ignore_event(*args): # pylint: disable=unused-argument
+    # The handler for events which have no handler function.
+    pass
+
+def _lxml_expat_module(huge_tree=False):
+    """Internal function to return the lxml equivalent of the expat module.
+
+    Args:
+        huge_tree (bool): If True, disable lxml's limits on the depth of
+            the tree and the size of text nodes.
+
+    Returns:
+        An object with a :py:func:`ParserCreate` function, which creates
+        parsers that work like expat parsers, but use lxml.
+
+    Raises:
+        :py:exc:`ValueError`: If lxml is not installed.
+    """
+    if etree is None:
+        raise ValueError("The 'lxml' backend requires the lxml package")
+    return _LxmlExpatModule(huge_tree)
+
+def _expat_error(err):
+    # Convert an lxml syntax error to the ExpatError which the Parser
+    # expects. The error for an empty input gets the message expat uses,
+    # so it is handled the same way. The offset is the zero-based
+    # column, as it is for expat.
+    msg = _location_re.sub('', err.msg or '')
+    if msg.startswith("no element found"):
+        msg = expat.errors.XML_ERROR_NO_ELEMENTS
+    lineno = max(err.lineno or 0, 1)
+    offset = max(err.offset or 0, 0)
+    rv = expat.ExpatError("%s: line %d, column %d" % (msg, lineno, offset))
+    rv.code = err.code
+    rv.lineno = lineno
+    rv.offset = offset
+    return rv
+
+def _target_attribute(name):
+    # Return a property for an attribute of the parser which is kept on
+    # its target. (If the target referred to the parser instead, they
+    # would form a reference cycle, which would keep the parsed tree
+    # alive until the garbage collector runs.)
+    def fget(self):
+        """Get the attribute."""
+        return getattr(self._target, name) # pylint: disable=protected-access
+    def fset(self, value):
+        """Set the attribute."""
+        setattr(self._target, name, value) # pylint: disable=protected-access
+    return property(fget, fset)
+
+class _LxmlExpatModule(object): # pylint: disable=too-few-public-methods
+    # Provides the ParserCreate() function of the expat module, for
+    # parsers which use lxml.
+    def __init__(self, huge_tree=False):
+        self.huge_tree = huge_tree
+
+    def ParserCreate(self, encoding=None, namespace_separator=None, # pylint: disable=invalid-name
+                     intern=None):
+        """Create a parser, as :py:func:`xml.parsers.expat.ParserCreate`
+        does."""
+        # pylint: disable=redefined-builtin
+        return _LxmlParser(encoding, namespace_separator, intern,
+                           self.huge_tree)
+
+class _LxmlParser(object):
+    # A parser which provides the parts of the expat parser interface
+    # the Parser uses. It feeds the data to an lxml parser, whose target
+    # passes the events to the handler functions.
+    ordered_attributes = _target_attribute('ordered_attributes')
+    StartElementHandler = _target_attribute('start_element')
+    EndElementHandler = _target_attribute('end_element')
+    CharacterDataHandler = _target_attribute('characters')
+
+    def __init__(self, encoding, namespace_separator, intern, huge_tree):
+        # pylint: disable=redefined-builtin
+        self.buffer_text = False
+        self._encoding = encoding
+        self._target = _LxmlTarget(namespace_separator, intern)
+        # Like an expat parser, the parser starts with handlers which
+        # ignore the events. (pylint checks these names where they are
+        # first assigned on an instance, so they are allowed here.)
+        # pylint: disable=invalid-name
+        self.StartElementHandler = _ignore_event
+        self.EndElementHandler = _ignore_event
+        self.CharacterDataHandler = _ignore_event
+        # pylint: enable=invalid-name
+        # The data before the root element, while it is small. (See
+        # _check_prolog().)
+        self._prolog = []
+        self._prolog_size = 0
+        # Entities are not resolved, so a document cannot make the
+        # parser read other files. (expat does not read them either.)
+        self._parser = etree.XMLParser(
+            target=self._target, encoding=encoding, huge_tree=huge_tree,
+            resolve_entities=False, no_network=True
+        )
+
+    def _save_prolog(self, data):
+        # Keep the data until the root element starts.
+        if self._target.started or self._prolog_size > _feed_size:
+            self._prolog = None
+        else:
+            self._prolog.append(data)
+            self._prolog_size += len(data)
+
+    def _check_prolog(self):
+        # lxml reports a document without a root element in the same way
+        # whether it is empty (holding only whitespace, comments and the
+        # like) or holds text. Let expat parse the data, so it raises the
+        # error it would raise.
+        if self._prolog:
+            data = self._prolog[0][:0].join(self._prolog)
+        else:
+            data = _bytes()
+        parser = expat.ParserCreate(self._encoding)
+        parser.Parse(data, True)
+
+    def _feed(self, data):
+        if self._prolog is not None:
+            self._save_prolog(data)
+        self._parser.feed(data)
+
+    def Parse(self, data, isfinal=False): # pylint: disable=invalid-name
+        """Parse the next piece of the document, as expat does."""
+        try:
+            if isinstance(data, (_bytes, _unicode)):
+                for i in range(0, len(data), _feed_size):
+                    self._feed(data[i:i + _feed_size])
+            else:
+                # lxml only accepts strings, so convert memory views (and
+                # similar objects) one piece at a time.
+                view = memoryview(data)
+                for i in range(0, len(view), _feed_size):
+                    self._feed(view[i:i + _feed_size].tobytes())
+            if isfinal:
+                self._parser.close()
+        except etree.XMLSyntaxError as e:
+            self._finish()
+            if (e.code == _xml_err_document_empty and
+                    self._prolog is not None and
+                    not self._target.started):
+                self._check_prolog()
+            raise _expat_error(e)
+        if isfinal:
+            self._finish()
+        return 1
+
+    def _finish(self):
+        # lxml's parser refers to the target in reference cycles, so the
+        # target may outlive this object. Drop the target's references to
+        # the handler functions (and, through them, to the parsed tree),
+        # so the tree is freed as soon as it is no longer used.
+        target = self._target
+        target.start_element = target.end_element = _ignore_event
+        target.characters = _ignore_event
+
+    def ParseFile(self, fileobj): # pylint: disable=invalid-name
+        """Parse a document from a file-like object, as expat does."""
+        while True:
+            data = fileobj.read(_feed_size)
+            if not data:
+                break
+            self.Parse(data)
+        return self.Parse(_bytes(), True)
+
+class _LxmlTarget(object):
+    # The target of the lxml parser. It converts lxml's events to the
+    # events an expat parser reports, and passes them to the handler
+    # functions set on the parser.
+    #
+    # lxml reports names as "{namespace}name". Without namespace
+    # processing, expat reports them as they are written ("prefix:name")
+    # and reports namespace declarations as attributes. So, the target
+    # keeps track of the prefix bound to each namespace, and puts the
+    # names back together. (A name's prefix cannot be recovered if two
+    # prefixes in scope are bound to the same namespace, or if it is not
+    # bound to a namespace at all.)
+    def __init__(self, namespace_separator, intern):
+        # pylint: disable=redefined-builtin
+        self.separator = namespace_separator
+        self.intern = intern
+        self.ordered_attributes = False
+        self.start_element = _ignore_event
+        self.end_element = _ignore_event
+        self.characters = _ignore_event
+        self.started = False
+        # The prefixes bound to the namespaces, for element names and
+        # attribute names. (An attribute name without a prefix is not in
+        # the default namespace.)
+        self.element_prefixes = {_xml_namespace: "xml"}
+        self.attribute_prefixes = {_xml_namespace: "xml"}
+        # The converted element and attribute names. These are cleared
+        # when the bindings change.
+        self.element_names = {}
+        self.attribute_names = {}
+        # For each open element, None or a list of the bindings to
+        # restore when it ends.
+        self.restore = []
+
+    def _name(self, name, prefixes):
+        # Return a name in the form expat reports it.
+        if name[:1] == '{':
+            (namespace, name) = name[1:].split('}', 1)
+            if self.separator is not None:
+                name = namespace + self.separator + name
+            else:
+                prefix = prefixes.get(namespace)
+                if prefix:
+                    name = prefix + ':' + name
+        if self.intern is not None:
+            name = self.intern.setdefault(name, name)
+        return name
+
+    def _bind(self, nsmap):
+        # Bind the prefixes an element declares. Return the attributes
+        # which declare them, as expat reports them.
+        attrs = []
+        restore = []
+        for (prefix, namespace) in nsmap.items():
+            restore.append((namespace,
+                            self.element_prefixes.get(namespace, _unbound),
+                            self.attribute_prefixes.get(namespace,
+                                                        _unbound)))
+            self.element_prefixes[namespace] = prefix
+            if prefix:
+                self.attribute_prefixes[namespace] = prefix
+            if self.separator is None:
+                if prefix:
+                    attrs.append(self._name("xmlns:" + prefix, None))
+                else:
+                    attrs.append(self._name("xmlns", None))
+                attrs.append(namespace)
+        self.restore.append(restore)
+        self.element_names = {}
+        self.attribute_names = {}
+        return attrs
+
+    def _unbind(self, restore):
+        # Restore the bindings an element changed.
+        for (namespace, element_prefix, attribute_prefix) in reversed(
+                restore):
+            for (prefixes, prefix) in (
+                    (self.element_prefixes, element_prefix),
+                    (self.attribute_prefixes, attribute_prefix)):
+                if prefix is _unbound:
+                    prefixes.pop(namespace, None)
+                else:
+                    prefixes[namespace] = prefix
+        self.element_names = {}
+        self.attribute_names = {}
+
+    def start(self, tag, attrib, nsmap):
+        """Handle the start of an element."""
+        self.started = True
+        if nsmap:
+            attrs = self._bind(nsmap)
+        else:
+            attrs = []
+            self.restore.append(None)
+        if attrib:
+            names = self.attribute_names
+            for (key, value) in attrib.items():
+                name = names.get(key)
+                if name is None:
+                    name = names[key] = self._name(key,
+                                                   self.attribute_prefixes)
+                attrs.append(name)
+                attrs.append(value)
+        if not self.ordered_attributes:
+            attrs = dict(zip(attrs[0::2], attrs[1::2])) # pylint: disable=zip-builtin-not-iterating
+        name = self.element_names.get(tag)
+        if name is None:
+            name = self.element_names[tag] = self._name(tag,
+                                                        self.element_prefixes)
+        self.start_element(name, attrs)
+
+    def end(self, tag):
+        """Handle the end of an element."""
+        name = self.element_names.get(tag)
+        if name is None:
+            name = self._name(tag, self.element_prefixes)
+        restore = self.restore.pop()
+        if restore:
+            self._unbind(restore)
+        self.end_element(name)
+
+    def data(self, data):
+        """Handle character data."""
+        self.characters(data)
+
+    def close(self): # pylint: disable=no-self-use
+        """Handle the end of the document."""
+        return None
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# Copyright (c) 2015-2016, Juniper Networks, Inc.
+# All rights reserved.
+#
+# See the LICENSE file for further information.
+"""Internal module that copies and pickles XML nodes.
+
+   The functions in this module are the copy and pickle methods of the
+   XMLNodeBase class.
+"""
+from __future__ import absolute_import
+
+from copy import deepcopy
+import weakref
+from . import OrderedDict, _unicode
+
+__all__ = []
+
+# The memo key which tells _deepcopy() to copy nodes one by one.
+_deepcopy_by_node = object()
+
+def _new_node(cls, value=None):
+    """Internal function to create a node saved by _reduce_node()."""
+    # The slots and children are restored afterwards.
+    if issubclass(cls, _unicode):
+        return _unicode.__new__(cls, value)
+    elif issubclass(cls, OrderedDict):
+        node = OrderedDict.__new__(cls)
+        OrderedDict.__init__(node)
+        return node
+    elif issubclass(cls, list):
+        return list.__new__(cls)
+    return object.__new__(cls)
+
+def _get_state(self):
+    # The nodes store their attributes in slots, so copy and pickle
+    # cannot rely on __dict__. Return the values of all the slots (and
+    # the __dict__ of subclasses that have one). A pure-Python
+    # OrderedDict (as on Python 2) keeps its linked list of keys in
+    # __dict__; that belongs to the dictionary, not the node.
+    state = dict((k, v) for (k, v) in getattr(self, '__dict__', {}).items()
+                 if not k.startswith('_OrderedDict__'))
+    for cls in type(self).__mro__:
+        for k in cls.__dict__.get('__slots__', ()):
+            if k != '__weakref__' and hasattr(self, k):
+                state[k] = getattr(self, k)
+    # Weak references cannot be pickled (and copy would share them), so
+    # save the parent itself and recreate the weak reference when
+    # restoring the node.
+    if isinstance(state.get('_parent'), weakref.ref):
+        state['_parent'] = self.parent
+        state['_weak_parent'] = True
+    return state
+
+def _set_state(self, state):
+    # pylint: disable=protected-access
+    state = dict(state)
+    weak_parent = state.pop('_weak_parent', False)
+    for (k, v) in state.items():
+        setattr(self, k, v)
+    if weak_parent and self._parent is not None:
+        self._parent = weakref.ref(self._parent)
+
+def _reduce(self):
+    # Pickles save the node's subtree in the flat format (see
+    # _flattree), which holds each distinct name and string once and no
+    # parent references. It is much smaller, and faster to load, than
+    # the nodes. The node becomes the root of the loaded tree.
+    # (_flattree imports the node classes, so import it here.)
+    # pylint: disable=import-outside-toplevel,protected-access
+    from ._flattree import _flatten_tree, _build_tree
+    try:
+        return (_build_tree, (_flatten_tree(self),))
+    except TypeError:
+        # The subtree holds objects the flat format cannot describe.
+        # Save the node itself. Its children are saved separately, so a
+        # child saved in the flat format loses its parent reference.
+        return self._reduce_node()
+
+def _deepcopy(self, memo):
+    # A deep copy of a root node uses the flat format, as pickles do. A
+    # deep copy of any other node keeps its parent reference, so it must
+    # copy the whole tree node by node. (The nodes it copies include
+    # root nodes, which must not use the flat format either. The memo
+    # records that.)
+    # pylint: disable=import-outside-toplevel,protected-access
+    from ._flattree import _flatten_tree, _build_tree
+    if self.parent is None and _deepcopy_by_node not in memo:
+        try:
+            node = _build_tree(_flatten_tree(self))
+        except TypeError:
+            pass
+        else:
+            memo[id(self)] = node
+            return node
+    memo[_deepcopy_by_node] = True
+    (func, args, state, list_items, dict_items) = self._reduce_node()
+    node = func(*args)
+    memo[id(self)] = node
+    node.__setstate__(deepcopy(state, memo))
+    if list_items is not None:
+        node.extend(deepcopy(v, memo) for v in list_items)
+    if dict_items is not None:
+        for (k, v) in dict_items:
+            node[deepcopy(k, memo)] = deepcopy(v, memo)
+    return node
+
+def _reduce_node(self):
+    # Return the node in the form of __reduce__(): a function which
+    # creates the node, its arguments, the slot values, and the
+    # children. (The children and slots are restored after the node is
+    # created, so they may refer back to it.)
+    args = (self.__class__,)
+    list_items = dict_items = None
+    if isinstance(self, _unicode):
+        args += (_unicode(self),)
+    elif isinstance(self, OrderedDict):
+        dict_items = iter(list(self.items()))
+    elif isinstance(self, list):
+        list_items = iter(list(self))
+    return (_new_node, args, self.__getstate__(), list_items, dict_items)
+
+def _copy(self):
+    # A shallow copy shares the node's children, XML attributes and
+    # parent.
+    # pylint: disable=protected-access
+    (func, args, state, list_items, dict_items) = self._reduce_node()
+    node = func(*args)
+    node.__setstate__(state)
+    if list_items is not None:
+        node.extend(list_items)
+    if dict_items is not None:
+        for (k, v) in dict_items:
+            node[k] = v
+    return node
@@ -8,11 +8,72 @@
 """Internal module that provides a common parsing handler."""
 from __future__ import absolute_import
 
+import gc
+import weakref
+from contextlib import contextmanager
 from . import OrderedDict, _unicode
+from ._basenode import _empty_xml_attrs, XMLNodeBase
+from .cdatanode import XMLCDATANode, XMLMutableCDATANode
 from .dictnode import XMLDictNode
+from .listnode import XMLListNode
+from ._lazytree import _EventBuffer, _LazyXMLDictNode
 
 __all__ = []
 
+class _MatchStep(object):
+    # One step of a match path: the axis, the name test and any
+    # predicates. A descendant step ("//name") may match an element at
+    # any depth below the previous step; a child step ("/name") must
+    # match the element directly below it. The name "*" matches any
+    # element.
+    __slots__ = ('descendant', 'name', 'predicates')
+
+    def __init__(self, descendant, name, predicates):
+        self.descendant = descendant
+        self.name = name
+        self.predicates = predicates
+
+    def test_tag(self, tag):
+        """Determine whether an element's tag satisfies the name test."""
+        return self.name == "*" or self.name == tag
+
+class _MatchPredicate(object):
+    # A predicate on the last step of a match path. The predicate tests
+    # for an XML attribute (``[@name]``) or a child node (``[name]``),
+    # optionally with a specific value (``[@name='value']`` or
+    # ``[name='value']``).
+    __slots__ = ('attribute', 'name', 'value')
+
+    def __init__(self, attribute, name, value):
+        self.attribute = attribute
+        self.name = name
+        self.value = value
+
+    def test_attrs(self, attrs):
+        """Determine whether an attribute dictionary satisfies the predicate.
+
+        This can only be used for attribute predicates.
+        """
+        if self.name not in attrs:
+            return False
+        return self.value is None or attrs[self.name] == self.value
+
+    def test_node(self, node):
+        """Determine whether a node satisfies the predicate."""
+        if self.attribute:
+            # pylint: disable=protected-access
+            if self.name not in node._xml_attrs:
+                return False
+            return self.value is None or node._xml_attrs[self.name] == self.value
+        if not isinstance(node, XMLDictNode) or self.name not in node:
+            return False
+        if self.value is None:
+            return True
+        for child in node[self.name].list():
+            if child.get_cdata() == self.value:
+                return True
+        return False
+
 class _GeneratorMatch(object):
     # Essentially, a data structure used to hold information on matches.
     def __init__(self, rooted=False, elements=None, depth=0, match_string=""):
@@ -22,6 +83,231 @@ class _GeneratorMatch(object):
         self.elements = elements
         self.depth = depth
         self.match_string = match_string
+        self.predicates = []
+
+    def test_node(self, node):
+        """Determine whether a node satisfies the match's predicates."""
+        for predicate in self.predicates:
+            if not predicate.test_node(node):
+                return False
+        return True
+
+    def test_attrs(self, attrs):
+        """Determine whether an element's attributes satisfy the match's
+        predicates.
+
+        This can only be used for matches whose predicates are all
+        attribute predicates.
+        """
+        for predicate in self.predicates:
+            if not predicate.test_attrs(attrs):
+                return False
+        return True
+
+def _match_error(match_string, reason):
+    return Warning("Match condition %s (%s)" % (reason, match_string))
+
+def _parse_predicate(match_string, text):
+    text = text.strip()
+    attribute = text.startswith("@")
+    if attribute:
+        text = text[1:]
+    value = None
+    if "=" in text:
+        (text, value) = text.split("=", 1)
+        value = value.strip()
+        if len(value) < 2 or value[0] not in "'\"" or value[-1] != value[0]:
+            raise _match_error(match_string,
+                               "contains an unquoted predicate value")
+        value = value[1:-1]
+    name = text.strip()
+    if name == "" or "/" in name or "[" in name:
+        raise _match_error(match_string, "contains an invalid predicate")
+    return _MatchPredicate(attribute, name, value)
+
+def _parse_generator_matches(match_string):
+    # Parse a match string into a list of steps. The supported syntax
+    # is a streaming-friendly subset of XPath: "/" and "//" separators,
+    # "*" wildcards, and predicates on the last step. A string without
+    # a leading slash matches the "right side" of a path (as if it
+    # started with "//").
+    match_obj = _GeneratorMatch(match_string=match_string)
+    steps = []
+    idx = 0
+    length = len(match_string)
+    if match_string.startswith("//"):
+        descendant = True
+        idx = 2
+    elif match_string.startswith("/"):
+        match_obj.rooted = True
+        descendant = False
+        idx = 1
+    else:
+        descendant = True
+    while idx < length:
+        # Get the name test.
+        end = idx
+        while end < length and match_string[end] not in "/[":
+            end += 1
+        name = match_string[idx:end].strip()
+        if name == "":
+            raise _match_error(match_string, "contains empty path elements")
+        idx = end
+
+        # Get the predicates, if any.
+        predicates = []
+        while idx < length and match_string[idx] == "[":
+            end = idx + 1
+            quote = None
+            while end < length and (quote or match_string[end] != "]"):
+                if quote and match_string[end] == quote:
+                    quote = None
+                elif not quote and match_string[end] in "'\"":
+                    quote = match_string[end]
+                end += 1
+            if end >= length:
+                raise _match_error(match_string, "contains an unterminated "
+                                   "predicate")
+            predicates.append(_parse_predicate(match_string,
+                                               match_string[idx + 1:end]))
+            idx = end + 1
+        steps.append(_MatchStep(descendant, name, predicates))
+
+        # Get the separator. A single trailing slash is ignored.
+        if idx < length:
+            if match_string[idx] != "/":
+                raise _match_error(match_string, "contains an invalid step")
+            if match_string.startswith("//", idx):
+                descendant = True
+                idx += 2
+                if idx >= length:
+                    raise _match_error(match_string,
+                                       "ends with a descendant separator")
+            else:
+                descendant = False
+                idx += 1
+
+    if len(steps) == 0 and not match_obj.rooted:
+        raise _match_error(match_string, "is empty")
+    for step in steps[:-1]:
+        if step.predicates:
+            raise _match_error(match_string, "contains predicates on a step "
+                               "other than the last one")
+
+    # Get the depth and the element list.
+    match_obj.depth = len(steps)
+    match_obj.elements = steps
+    if steps:
+        match_obj.predicates = steps[-1].predicates
+
+    return match_obj
+
+class _MatchState(object):
+    # A state in the match automaton.
+    #
+    # The positions attribute holds a set of (match index, steps
+    # matched) pairs, describing how far along each match the current
+    # path has progressed. The matches attribute holds the matches (in
+    # the order the user supplied them) whose path is satisfied by the
+    # path that led to this state. The list stops at the first match
+    # without predicates, since later matches can never be used. The
+    # transitions attribute caches the next state for each tag seen so
+    # far.
+    __slots__ = ('positions', 'matches', 'transitions')
+
+    def __init__(self, positions, matches):
+        self.positions = positions
+        self.matches = matches
+        self.transitions = {}
+
+class _MatchAutomaton(object):
+    # A compiled form of the generator match strings.
+    #
+    # The automaton is a DFA which is built lazily from the match
+    # strings: each combination of a state and a tag is evaluated once
+    # and then cached, so each element costs a single dictionary lookup,
+    # regardless of the number of match strings. A child step must match
+    # the next element; a descendant step (including the first step of a
+    # relative match) may also skip any number of elements. Predicates
+    # are evaluated against the node when the element closes.
+    def __init__(self, generator):
+        if isinstance(generator, str):
+            generator = [generator]
+        self.match_tests = [_parse_generator_matches(i) for i in generator]
+        if len(self.match_tests) > 0:
+            self.match_depth = min(match.depth for match in self.match_tests)
+        else:
+            self.match_depth = -1
+        self._states = {}
+        self.start = self._get_state(frozenset(
+            (i, 0) for i in range(0, len(self.match_tests))
+        ))
+
+    def _get_state(self, positions):
+        try:
+            return self._states[positions]
+        except KeyError:
+            pass
+        matches = []
+        for (i, count) in sorted(positions):
+            match = self.match_tests[i]
+            if count == match.depth:
+                matches.append(match)
+                if not match.predicates:
+                    break
+        state = _MatchState(positions, tuple(matches))
+        self._states[positions] = state
+        return state
+
+    def transition(self, state, tag):
+        """Return the state reached from *state* by an element *tag*."""
+        try:
+            return state.transitions[tag]
+        except KeyError:
+            pass
+        positions = set()
+        for (i, count) in state.positions:
+            match = self.match_tests[i]
+            if count < match.depth:
+                step = match.elements[count]
+                if step.test_tag(tag):
+                    positions.add((i, count + 1))
+                if step.descendant:
+                    positions.add((i, count))
+        rv = self._get_state(frozenset(positions))
+        state.transitions[tag] = rv
+        return rv
+
+def _get_start_automaton(paths, description):
+    # Return the compiled automaton for paths which are checked when an
+    # element starts. Only attribute predicates can be evaluated then.
+    rv = _get_automaton(paths, {})
+    if rv is not None:
+        for match in rv.match_tests:
+            for predicate in match.predicates:
+                if not predicate.attribute:
+                    raise Warning("%s condition contains a child node "
+                                  "predicate (%s)" %
+                                  (description, match.match_string))
+    return rv
+
+def _get_automaton(generator, cache):
+    # Return the compiled automaton for a generator argument, compiling
+    # it if it isn't already in the cache.
+    if not generator:
+        return None
+    if isinstance(generator, _MatchAutomaton):
+        return generator
+    if isinstance(generator, str):
+        cache_key = (generator,)
+    else:
+        cache_key = tuple(generator)
+    try:
+        return cache[cache_key]
+    except KeyError:
+        rv = _MatchAutomaton(generator)
+        cache[cache_key] = rv
+        return rv
 
 class _DictSAXHandler(object):
     # A handler for SAX events.
@@ -33,77 +319,118 @@ class _DictSAXHandler(object):
                  namespaces=None,
                  strip_namespace=False,
                  cdata_separator=_unicode(''),
-                 generator=None):
-        self.path = []
-        self.stack = []
-        self.matches = []
-        self.root = XMLDictNode()
-        self.item = self.root
-        self.item_depth = 0
+                 generator=None,
+                 release_matches=False,
+                 exclude=None,
+                 project=None, intern=None, intern_values=False,
+                 parent_links='strong', mutable_cdata=False):
+        # pylint: disable=redefined-builtin
         self.xml_attribs = xml_attribs
         self.strip_whitespace = strip_whitespace
         self.namespace_separator = namespace_separator
         self.namespaces = namespaces
         self.strip_namespace = strip_namespace
-        self.match_tests = []
-        self.matches = []
-        if isinstance(generator, str):
-            self.match_tests.append(self._parse_generator_matches(generator))
-        elif generator is not None:
-            for i in generator:
-                self.match_tests.append(self._parse_generator_matches(i))
-        if len(self.match_tests) > 0:
-            self.match_depth = 1000000 # effectively, infinity
-            for match in self.match_tests:
-                if match.depth < self.match_depth:
-                    self.match_depth = match.depth
+        self.matcher = _get_automaton(generator, {})
+        if self.matcher is not None:
+            self.match_depth = self.matcher.match_depth
         else:
             self.match_depth = -1
-        self.in_ignore = (self.match_depth > 0)
+        self.excluder = _get_start_automaton(exclude, "Exclusion")
+        self.projector = _get_start_automaton(project, "Projection")
+        self.release_matches = release_matches
+        # A dictionary mapping each name (and, if intern_values is set,
+        # each attribute value) to the single copy of that string the
+        # nodes should use.
+        self.intern = intern
+        self.intern_values = intern_values and intern is not None
+        # The function used to replace a finished node's parent
+        # reference, or None to keep the strong references add_node()
+        # creates.
+        self.make_parent_link = _get_parent_link(parent_links)
+        # The class used for nodes which only contain CDATA.
+        if mutable_cdata:
+            self.cdata_class = XMLMutableCDATANode
+        else:
+            self.cdata_class = XMLCDATANode
         self.cdata_separator = cdata_separator
-        self.need_cdata_separator = False
-        self.processing_started = False
+        self.reset()
 
-    def _parse_generator_matches(self, match_string):
-        match_obj = _GeneratorMatch(match_string=match_string)
-        parsed_match_string = match_string.split("/")
+    def reset(self):
+        """Prepare the handler to handle a new document.
 
-        # Determine if we had a leading slash
-        if parsed_match_string[0] == "":
-            match_obj.rooted = True
-            del parsed_match_string[0]
-
-        # Pop a single trailing slash
-        if parsed_match_string[-1] == "":
-            del parsed_match_string[-1]
+           This discards the state of the previous document (if any),
+           so that one handler can handle a series of documents.
+        """
+        self.path = []
+        self.stack = []
+        self.matches = []
+        self.root = XMLDictNode._new_fast(None, _empty_xml_attrs) # pylint: disable=protected-access
+        self.item = self.root
+        self.item_depth = 0
+        if self.matcher is not None:
+            # The stack of automaton states and absolute path strings
+            # for the open elements.
+            self.match_states = [self.matcher.start]
+            self.path_strings = [_unicode('')]
+        self.in_ignore = (self.match_depth > 0)
+        if self.excluder is not None:
+            self.exclude_states = [self.excluder.start]
+        # The number of open levels of an excluded subtree. While this is
+        # non-zero, we ignore all events.
+        self.skip_depth = 0
+        if self.projector is not None:
+            self.project_states = [self.projector.start]
+        # The depth of the element that matched a projection path, while
+        # we are inside it.
+        self.keep_depth = None
+        self.need_cdata_separator = False
+        self.processing_started = False
+        # CDATA is collected in a list of fragments for each open element
+        # and only turned into node text when the element closes.
+        self.text = []
+        self.text_stack = []
+        # An element is not added to the tree until we know whether it
+        # has children. Until then, its name and attributes are saved
+        # here. Normally, this holds at most the innermost open element.
+        # When projecting, it also holds the open elements which are not
+        # (yet) known to contain a projected node.
+        self.pending = []
 
-        # Verify there are no other empty elements.
-        for i in parsed_match_string:
-            if i == "":
-                raise Warning(
-                    "Match condition contains empty path elements (%s)" %
-                    (match_string,)
-                    )
-        # Get the depth and the element list.
-        match_obj.depth = len(parsed_match_string)
-        match_obj.elements = parsed_match_string
+    def _check_generator_matches(self):
+        for match in self.match_states[-1].matches:
+            if match.predicates and not match.test_node(self.item):
+                continue
+            path = self.path_strings[-1]
+            if path == "":
+                path = _unicode('/')
+            self.matches.append((path, match.match_string, self.item))
+            if self.release_matches:
+                self._release_item()
+            break
 
-        return match_obj
+    def _release_item(self):
+        # Detach the current item from its parent so that the tree does
+        # not keep a reference to a match once the consumer has it.
+        if self.item.parent is None:
+            return
+        self.item._replace_node(None) # pylint: disable=protected-access
+        self.item.parent = None
 
-    def _check_generator_matches(self):
-        if self.match_depth > len(self.path):
+    def _convert_parent_link(self, node):
+        # Replace the strong parent reference of a finished node. If the
+        # node's parent is a list, the list (and its first member) may
+        # have been created when this node was added, so convert their
+        # references, too.
+        # pylint: disable=protected-access
+        parent = node._parent
+        if not isinstance(parent, XMLNodeBase):
             return
-        for match in self.match_tests:
-            if match.rooted and len(self.path) != match.depth:
-                continue
-            if not(match.rooted) and len(self.path) < match.depth:
-                continue
-            if match.elements == self.path[-match.depth:]:
-                path = '/'.join([""] + self.path)
-                if path == "":
-                    path = _unicode('/')
-                self.matches.append((path, match.match_string, self.item))
-                break
+        if isinstance(parent, XMLListNode):
+            if isinstance(parent._parent, XMLNodeBase):
+                parent._parent = self.make_parent_link(parent._parent)
+            if parent[0]._parent is parent:
+                parent[0]._parent = self.make_parent_link(parent)
+        node._parent = self.make_parent_link(parent)
 
     def _build_name(self, full_name):
         if (not self.namespaces) and (not self.strip_namespace):
@@ -122,7 +449,7 @@ class _DictSAXHandler(object):
 
     def _attrs_to_dict(self, attrs):
         if isinstance(attrs, dict):
-            rv = attrs
+            rv = OrderedDict((k, _unicode(v)) for (k, v) in attrs.items())
         else:
             rv = OrderedDict(zip(attrs[0::2], attrs[1::2])) # pylint: disable=zip-builtin-not-iterating
         if self.strip_namespace:
@@ -140,19 +467,83 @@ class _DictSAXHandler(object):
                     del rv[k]
         return rv
 
+    def _intern_attrs(self, attrs):
+        # Return the attributes, using the interned copies of the names
+        # (and values, if requested).
+        table = self.intern
+        if self.intern_values:
+            return OrderedDict(
+                (table.setdefault(k, k), table.setdefault(v, v))
+                for (k, v) in attrs.items()
+            )
+        return OrderedDict(
+            (table.setdefault(k, k), v) for (k, v) in attrs.items()
+        )
+
+    def _check_exclude(self, name, attrs):
+        # Determine whether an element should be excluded. If not, save
+        # the new exclusion automaton state.
+        state = self.excluder.transition(self.exclude_states[-1], name)
+        for match in state.matches:
+            if match.test_attrs(attrs):
+                return True
+        self.exclude_states.append(state)
+        return False
+
+    def _check_project(self, name, attrs):
+        # Determine whether an element matches a projection path. Save
+        # the new projection automaton state.
+        state = self.projector.transition(self.project_states[-1], name)
+        self.project_states.append(state)
+        for match in state.matches:
+            if match.test_attrs(attrs):
+                return True
+        return False
+
+    def _start_pending(self):
+        # The pending elements have children in the tree, so they must be
+        # dictionaries. Add them to the tree and make the innermost one
+        # the current item.
+        for (name, attrs) in self.pending:
+            newnode = XMLDictNode._new_fast(name, attrs) # pylint: disable=protected-access
+            self.stack.append(self.item)
+            self.item = self.item.add_node(name, new_node=newnode)
+        del self.pending[:]
+
     def start_element(self, full_name, attrs):
         """Handle the start of an element."""
         self.processing_started = True
+        if self.skip_depth:
+            self.skip_depth += 1
+            return
         name = self._build_name(full_name)
+        if self.intern is not None:
+            name = self.intern.setdefault(name, name)
         attrs = self._attrs_to_dict(attrs)
-        self.path.append(name)
-        if self.xml_attribs:
+        if self.xml_attribs and attrs:
             attrs = OrderedDict(
                 (self._build_name(key), value)
                 for (key, value) in attrs.items()
             )
+            if self.intern is not None:
+                attrs = self._intern_attrs(attrs)
         else:
-            attrs = OrderedDict()
+            attrs = _empty_xml_attrs
+        if self.excluder is not None and self._check_exclude(name, attrs):
+            # Skip this element and all of its children.
+            self.skip_depth = 1
+            return
+        self.path.append(name)
+        if self.matcher is not None:
+            self.match_states.append(
+                self.matcher.transition(self.match_states[-1], name)
+            )
+            self.path_strings.append(
+                self.path_strings[-1] + _unicode('/') + name
+            )
+        if (self.projector is not None and self._check_project(name, attrs)
+                and self.keep_depth is None):
+            self.keep_depth = len(self.path)
         if self.in_ignore and len(self.path) >= self.match_depth:
             # We were ignoring lower levels of the hierarchy. Get a new
             # root.
@@ -160,45 +551,86 @@ class _DictSAXHandler(object):
             self.in_ignore = False
 
         if not self.in_ignore:
-            # Add a new item
-            newnode = self.item.add_node(name, xml_attrs=attrs)
-            # Save the old item (which may have been updated).
-            self.stack.append(self.item.get_current_node())
-            # Change the current focus to the new item.
-            self.item = newnode
+            # If our parent is still pending, it now has a child. (When
+            # projecting, this is only true if the new item is part of a
+            # projected node.)
+            if self.pending and (self.projector is None or
+                                 self.keep_depth is not None):
+                self._start_pending()
+            # Defer creating the new item until we know what it holds.
+            self.pending.append((name, attrs))
+            # Start a new CDATA buffer for the new item.
+            self.text_stack.append(self.text)
+            self.text = []
             # We don't need a CDATA separator when starting an item.
             self.need_cdata_separator = False
 
     def end_element(self, full_name): # pylint: disable=unused-argument
         """Handle the end of an element."""
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
         if not self.in_ignore:
+            text = _unicode().join(self.text)
+            self.text = self.text_stack.pop()
             if self.strip_whitespace:
-                self.item = self.item.strip_cdata(return_node=True)
-            self._check_generator_matches()
-            self.item = self.stack.pop()
+                text = _unicode.strip(text)
+            if self.pending:
+                (name, attrs) = self.pending.pop()
+                if self.projector is None or self.keep_depth is not None:
+                    # This item has no children. Build it once, with its
+                    # final CDATA.
+                    self.stack.append(self.item)
+                    self.item = self.item.add_node(
+                        name, new_node=self.cdata_class._new_fast(text, name, attrs)) # pylint: disable=protected-access
+                    if self.matcher is not None:
+                        self._check_generator_matches()
+                    if self.make_parent_link is not None:
+                        self._convert_parent_link(self.item)
+                    self.item = self.stack.pop()
+                # Otherwise, the item is not part of the projection.
+                # Drop it.
+            else:
+                if len(text) > 0:
+                    self.item.set_cdata(text)
+                if self.matcher is not None:
+                    self._check_generator_matches()
+                if self.make_parent_link is not None:
+                    self._convert_parent_link(self.item)
+                self.item = self.stack.pop()
 
         self.path.pop()
+        if self.excluder is not None:
+            self.exclude_states.pop()
+        if self.projector is not None:
+            self.project_states.pop()
+            if self.keep_depth is not None and len(self.path) < self.keep_depth:
+                self.keep_depth = None
+        if self.matcher is not None:
+            self.match_states.pop()
+            self.path_strings.pop()
         if len(self.path) < self.match_depth:
             self.in_ignore = True
 
         if not self.in_ignore:
             # We may need a CDATA separator when ending an item.
-            if len(self.item.get_cdata()) > 0:
+            if len(self.text) > 0:
                 self.need_cdata_separator = True
 
     def characters(self, data):
         """Handle character data."""
         self.processing_started = True
-        if not self.in_ignore:
+        if not (self.in_ignore or self.skip_depth):
             if self.need_cdata_separator:
-                data = self.cdata_separator + data
+                self.text.append(self.cdata_separator)
                 self.need_cdata_separator = False
-            self.item = self.item.append_cdata(data, return_node=True)
+            self.text.append(data)
 
     def end_document(self):
         """Handle the end of the document."""
         assert len(self.path) == 0, "endDocument() called with open elements"
-        self._check_generator_matches()
+        if self.matcher is not None:
+            self._check_generator_matches()
 
     def pop_matches(self):
         """Return a match from the cache.
@@ -225,3 +657,255 @@ class _DictSAXHandler(object):
         self.matches = []
         return rv
 
+
+class _FastDictSAXHandler(_DictSAXHandler):
+    # A handler for SAX events, specialized for the default options.
+    #
+    # This handler produces the same tree as the _DictSAXHandler class,
+    # but skips the namespace, attribute, matching, exclusion and
+    # projection logic. It may only be used when the namespaces,
+    # strip_namespace, generator, exclude and project arguments are
+    # unset and the xml_attribs argument is True.
+    def start_element(self, full_name, attrs):
+        """Handle the start of an element."""
+        self.processing_started = True
+        if self.pending:
+            self._start_pending()
+        if not attrs:
+            attrs = _empty_xml_attrs
+        elif isinstance(attrs, dict):
+            attrs = OrderedDict((k, _unicode(v)) for (k, v) in attrs.items())
+        else:
+            attrs = OrderedDict(zip(attrs[0::2], attrs[1::2])) # pylint: disable=zip-builtin-not-iterating
+        if self.intern is not None:
+            full_name = self.intern.setdefault(full_name, full_name)
+            if attrs:
+                attrs = self._intern_attrs(attrs)
+        self.pending.append((full_name, attrs))
+        self.text_stack.append(self.text)
+        self.text = []
+        self.need_cdata_separator = False
+
+    def end_element(self, full_name): # pylint: disable=unused-argument
+        """Handle the end of an element."""
+        text = _unicode().join(self.text)
+        self.text = self.text_stack.pop()
+        if self.strip_whitespace:
+            text = _unicode.strip(text)
+        if self.pending:
+            (name, attrs) = self.pending.pop()
+            node = self.item.add_node(
+                name, new_node=self.cdata_class._new_fast(text, name, attrs)) # pylint: disable=protected-access
+            if self.make_parent_link is not None:
+                self._convert_parent_link(node)
+        else:
+            if len(text) > 0:
+                self.item.set_cdata(text)
+            if self.make_parent_link is not None:
+                self._convert_parent_link(self.item)
+            self.item = self.stack.pop()
+        if len(self.text) > 0:
+            self.need_cdata_separator = True
+
+    def characters(self, data):
+        """Handle character data."""
+        self.processing_started = True
+        if self.need_cdata_separator:
+            self.text.append(self.cdata_separator)
+            self.need_cdata_separator = False
+        self.text.append(data)
+
+class _LazySAXHandler(_DictSAXHandler):
+    # A handler for SAX events which records the elements in an
+    # _EventBuffer, rather than building nodes. The resulting tree is
+    # a lazy root node, which builds its children (and they build
+    # theirs) when they are first needed.
+    #
+    # The finished tree is the same as the one the _DictSAXHandler class
+    # builds. The generator, exclude and project arguments are not
+    # supported.
+    def __init__(self, **kwargs):
+        for k in ('generator', 'exclude', 'project'):
+            if kwargs.get(k):
+                raise ValueError("The 'lazy' argument cannot be combined "
+                                 "with the '%s' argument" % k)
+        super(_LazySAXHandler, self).__init__(**kwargs)
+
+    def reset(self):
+        """Prepare the handler to handle a new document."""
+        super(_LazySAXHandler, self).reset()
+        if self.intern_values:
+            value_table = self.intern
+        else:
+            value_table = None
+        self.buffer = _EventBuffer(self.cdata_class, self.make_parent_link,
+                                   value_table)
+        self.root = _LazyXMLDictNode._new_lazy(self.buffer, -1) # pylint: disable=protected-access
+        self.item = self.root
+        # The indexes of the open elements.
+        self.open_elements = []
+        # A map from the names expat reports to their indexes in the
+        # buffer's names table.
+        self.name_ids = {}
+
+    def _add_name(self, full_name):
+        # Add a name expat reported to the buffer's names table and
+        # return its index.
+        name = self._build_name(full_name)
+        name_id = self.buffer.name_ids.get(name)
+        if name_id is None:
+            if self.intern is not None:
+                name = self.intern.setdefault(name, name)
+            name_id = self.buffer.add_name(name)
+        self.name_ids[full_name] = name_id
+        return name_id
+
+    def _add_attrs(self, attrs):
+        # Record the attributes of the newest element.
+        buf = self.buffer
+        if (self.namespaces or self.strip_namespace or
+                isinstance(attrs, dict)):
+            attrs = self._attrs_to_dict(attrs)
+            attrs = [x for pair in attrs.items() for x in pair]
+        for i in range(0, len(attrs), 2):
+            name_id = self.name_ids.get(attrs[i])
+            if name_id is None:
+                name_id = self._add_name(attrs[i])
+            buf.attr_names.append(name_id)
+            buf.attr_value_starts.append(buf.add_text(attrs[i + 1]))
+            buf.attr_value_lengths.append(len(attrs[i + 1]))
+
+    def start_element(self, full_name, attrs):
+        """Handle the start of an element."""
+        self.processing_started = True
+        buf = self.buffer
+        name_id = self.name_ids.get(full_name)
+        if name_id is None:
+            name_id = self._add_name(full_name)
+        self.open_elements.append(len(buf.tags))
+        buf.tags.append(name_id)
+        buf.ends.append(0)
+        buf.attr_starts.append(len(buf.attr_names))
+        buf.text_starts.append(0)
+        buf.text_lengths.append(0)
+        if attrs and self.xml_attribs:
+            self._add_attrs(attrs)
+        self.text_stack.append(self.text)
+        self.text = []
+        self.need_cdata_separator = False
+
+    def end_element(self, full_name): # pylint: disable=unused-argument
+        """Handle the end of an element."""
+        buf = self.buffer
+        idx = self.open_elements.pop()
+        if self.text:
+            text = _unicode().join(self.text)
+            if self.strip_whitespace:
+                text = _unicode.strip(text)
+            if text:
+                buf.text_starts[idx] = buf.add_text(text)
+                buf.text_lengths[idx] = len(text)
+        buf.ends[idx] = len(buf.tags)
+        self.text = self.text_stack.pop()
+        if self.text:
+            self.need_cdata_separator = True
+
+    def characters(self, data):
+        """Handle character data."""
+        self.processing_started = True
+        if self.need_cdata_separator:
+            self.text.append(self.cdata_separator)
+            self.need_cdata_separator = False
+        self.text.append(data)
+
+    def end_document(self):
+        """Handle the end of the document."""
+        assert len(self.open_elements) == 0, \
+            "endDocument() called with open elements"
+
+@contextmanager
+def _gc_suspended(suspend):
+    # If suspend is True, disable the cyclic garbage collector for the
+    # duration of the block. Its previous state is restored on the way
+    # out, even if the block raises an exception.
+    if not suspend or not gc.isenabled():
+        yield
+        return
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+def _gc_suspended_iter(iterator):
+    # Iterate over iterator, suspending the garbage collector only while
+    # the iterator is working. The collector runs normally while the
+    # caller handles each item.
+    while True:
+        with _gc_suspended(True):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def _gc_freeze(freeze):
+    # If requested, move everything the collector currently tracks
+    # (including a newly-built tree) into the permanent generation,
+    # where later collections ignore it. This requires Python 3.7 or
+    # later; on older versions, it does nothing.
+    if freeze and hasattr(gc, "freeze"):
+        gc.freeze()
+
+def _no_parent_link(parent): # pylint: disable=unused-argument
+    # The parent reference stored when parent_links is 'none'.
+    return None
+
+def _get_parent_link(parent_links):
+    # Return the function which creates the parent reference selected
+    # by the parent_links argument, or None for the strong references
+    # add_node() creates.
+    if parent_links == 'strong':
+        return None
+    elif parent_links == 'weak':
+        return weakref.ref
+    elif parent_links == 'none':
+        return _no_parent_link
+    raise ValueError("'parent_links' argument must be 'strong', "
+                     "'weak', or 'none', not %r" % (parent_links,))
+
+def _get_intern_table(intern, default_table):
+    # Return the interning dictionary selected by the intern argument:
+    # None if interning is off, the parser's own table if it is True,
+    # or the caller's dictionary.
+    if intern is None or intern is False:
+        return None
+    if intern is True:
+        return default_table
+    if not isinstance(intern, dict):
+        raise TypeError("'intern' argument must be a bool or a dict, "
+                        "not '%s'" % type(intern).__name__)
+    return intern
+
+def _make_sax_handler(lazy=False, **kwargs):
+    # Return the most specialized handler that supports the arguments.
+    if lazy:
+        return _LazySAXHandler(**kwargs)
+    for k in ('namespaces', 'strip_namespace', 'generator', 'exclude',
+              'project'):
+        if kwargs.get(k):
+            return _DictSAXHandler(**kwargs)
+    if not kwargs.get('xml_attribs', True):
+        return _DictSAXHandler(**kwargs)
+    return _FastDictSAXHandler(**kwargs)
+
+def _make_parser_handler(kwargs, automata, intern_table):
+    # Return the handler for a parser's arguments. The generator,
+    # exclusion and projection match strings are compiled once and
+    # cached in automata for use by later calls. A true intern argument
+    # selects the parser's own intern_table.
+    kwargs = dict(kwargs)
+    for k in ('generator', 'exclude', 'project'):
+        kwargs[k] = _get_automaton(kwargs.get(k), automata)
+    kwargs['intern'] = _get_intern_table(kwargs.get('intern'), intern_table)
+    return _make_sax_handler(**kwargs)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# Copyright (c) 2015-2016, Juniper Networks, Inc.
+# All rights reserved.
+#
+# Copyright (C) 2012 Martin Blech and individual contributors.
+#
+# See the LICENSE file for further information.
+"""Module that provides asyncio-based XML parsing.
+
+   This module uses the async/await syntax, so it is only available
+   on Python 3.6 and later.
+"""
+from __future__ import absolute_import
+
+from . import _unicode
+from .xmlparser import Parser, _bytes, _ChunkSizer
+
+__all__ = ['AsyncParser']
+
+async def _read_chunks(xml_input, sizer):
+    # Turn the supported input types into an async iterator of chunks.
+    # Each read() asks for the current size chosen by the sizer. Check
+    # for read() first: a StreamReader is also an async iterator, but
+    # it iterates over lines, which may be arbitrarily long.
+    if isinstance(xml_input, (_unicode, _bytes)):
+        yield xml_input
+    elif hasattr(xml_input, "read"):
+        while True:
+            buf = await xml_input.read(sizer.size)
+            if len(buf) == 0:
+                break
+            yield buf
+    else:
+        async for buf in xml_input:
+            yield buf
+
+class AsyncParser(Parser):
+    """Creates Python data structures from XML read by asyncio code.
+
+    This class works like the :py:class:`Parser` class, except that it
+    reads its input from an :py:class:`asyncio.StreamReader` (or any
+    object with a ``read()`` coroutine) or an asynchronous iterator of
+    strings or bytes. The input is fed to the parser as it arrives, so
+    one event loop can parse many documents concurrently.
+
+    When the :py:obj:`generator` parameter is supplied, calling an
+    :py:class:`AsyncParser` object returns an asynchronous iterator
+    that produces the same ``(path,match_string,xml_node)`` tuples as a
+    :py:class:`Parser` object::
+
+        >>> myparser = AsyncParser(generator=["/a/b"])
+        >>> async for (path, match, value) in myparser(reader):
+        ...     print("%s: %s" % (path, value))
+
+    Otherwise, calling an :py:class:`AsyncParser` object returns a
+    coroutine that produces an :py:class:`XMLDictNode` containing the
+    parsed XML tree::
+
+        >>> root = await AsyncParser()(reader)
+
+    An :py:class:`AsyncParser` accepts the same arguments as the
+    :py:class:`Parser` class.
+    """
+
+    async def _parse_generator(self, xml_input, push):
+        # pylint: disable=arguments-differ
+        sizer = _ChunkSizer(self._chunk_size)
+        async for buf in _read_chunks(xml_input, sizer):
+            matches = push.feed(buf)
+            sizer.update(len(matches) > 0)
+            for rv in matches:
+                yield rv
+        for rv in push.close():
+            yield rv
+
+    async def _parse_tree(self, xml_input, push):
+        sizer = _ChunkSizer(self._chunk_size)
+        async for buf in _read_chunks(xml_input, sizer):
+            push.feed(buf)
+        return push.close()
+
+    def __call__(self, xml_input, **kwargs):
+        """See class documentation."""
+        push = self.push_parser(**kwargs)
+        if self._kwargs.get("generator", False):
+            return self._parse_generator(xml_input, push)
+        return self._parse_tree(xml_input, push)
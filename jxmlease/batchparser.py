@@ -0,0 +1,641 @@
+#!/usr/bin/env python
+# Copyright (c) 2015-2016, Juniper Networks, Inc.
+# All rights reserved.
+#
+# See the LICENSE file for further information.
+"""Module that provides parallel parsing of XML documents."""
+from __future__ import absolute_import
+
+import mmap
+import multiprocessing
+import os
+import re
+import uuid
+from xml.parsers import expat
+from . import OrderedDict, _unicode
+from ._basenode import XMLNodeBase
+from ._flattree import _flatten_tree, _build_tree
+from ._parsehandler import _gc_suspended, _get_parent_link
+from .dictnode import XMLDictNode
+from .listnode import XMLListNode
+from .xmlparser import Parser, _bytes
+
+__all__ = ['parse_many', 'parse_split', 'ParseManyError']
+
+class ParseManyError(Exception):
+    """Reports an error parsing one of the documents given to parse_many.
+
+    Attributes:
+        index (int): The position of the document in the inputs.
+        error (Exception): The exception raised while parsing the
+            document.
+        path (string): The path of the document, if it was given as a
+            path, or None.
+    """
+    def __init__(self, index, error, path=None):
+        if path is None:
+            document = "document %d" % (index,)
+        else:
+            document = "document %d (%s)" % (index, path)
+        super(ParseManyError, self).__init__(
+            "Error parsing %s: %s" % (document, error)
+        )
+        self.index = index
+        self.error = error
+        self.path = path
+
+# The Parser used by a worker process.
+_worker_parser = None
+
+def _init_worker(kwargs):
+    # Create the Parser for a worker process.
+    global _worker_parser # pylint: disable=global-statement
+    _worker_parser = Parser(**kwargs)
+
+def _parse_batch(batch):
+    # Parse a batch of (index, xml_input) pairs in a worker process.
+    # Return a list of (index, flat_tree, error, path) tuples, where path
+    # is the path of a document which fails to parse, if it was given
+    # as a path. The trees are returned in the flat format, which is
+    # smaller and faster to pickle than the nodes.
+    results = []
+    for (index, xml_input) in batch:
+        try:
+            flat = _flatten_tree(_worker_parser(xml_input))
+        except Exception as e: # pylint: disable=broad-except
+            path = None
+            if hasattr(xml_input, '__fspath__'):
+                path = os.fspath(xml_input)
+            results.append((index, None, e, path))
+        else:
+            results.append((index, flat, None, None))
+    return results
+
+def _batches(inputs, batch_size):
+    # Split the inputs into lists of (index, xml_input) pairs. File-like
+    # objects cannot be sent to the workers, so they are read here.
+    batch = []
+    for (index, xml_input) in enumerate(inputs):
+        if hasattr(xml_input, 'read'):
+            xml_input = xml_input.read()
+        batch.append((index, xml_input))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _worker_settings(kwargs):
+    # Check the Parser arguments here, so errors are raised by the
+    # caller, and return the full set of arguments (including the
+    # defaults from parser_defaults) to send to the workers.
+    settings = dict(Parser(**kwargs)._default_kwargs) # pylint: disable=protected-access
+    if settings.get('generator'):
+        raise ValueError("Parallel parsing does not support the "
+                         "'generator' argument")
+    settings['lazy'] = False
+    # Let each worker use its own expat module, which may not be
+    # picklable.
+    if settings.get('expat') is expat:
+        del settings['expat']
+    return settings
+
+def parse_many(inputs, workers=None, ordered=True, batch_size=1, **kwargs):
+    """Parse many XML documents in parallel.
+
+    This function parses the documents in a pool of worker processes, so
+    that the parsing is not limited to one CPU. Each worker creates a
+    :py:class:`Parser` with the given arguments and uses it to parse the
+    documents it is sent. The parsed trees are sent back in a compact
+    format, which is rebuilt into :py:class:`XMLDictNode` objects.
+
+    For example::
+
+        >>> docs = ["<a>%d</a>" % i for i in range(3)]
+        >>> for root in parse_many(docs, workers=2):
+        ...   print(root["a"])
+        ...
+        0
+        1
+        2
+
+    Args:
+        inputs (iterable): The XML documents. Each document may be a
+            string, a :py:obj:`bytes` object, a path-like object (which
+            the worker opens), or a file-like object (which is read
+            before it is sent to a worker).
+        workers (int): The number of worker processes. (Default: the
+            number of CPUs)
+        ordered (bool): If True, the results are produced in the order of
+            the inputs. If False, the results are produced as they are
+            finished, as tuples of ``(index, root)``, where ``index`` is
+            the position of the document in the inputs. (Default: True)
+        batch_size (int): The number of documents sent to a worker at a
+            time. Larger batches reduce the overhead of communicating with
+            the workers when the documents are small. (Default: 1)
+        Also accepts the same keyword arguments you can supply when
+        creating a :py:class:`Parser` object, except :py:obj:`generator`.
+        The :py:obj:`lazy` argument is ignored, as the whole tree is sent
+        back from the worker.
+
+    Returns:
+        A generator, which produces the :py:class:`XMLDictNode` containing
+        the parsed XML tree of each document (or, if :py:obj:`ordered` is
+        False, a tuple of ``(index, root)`` for each document).
+
+    Raises:
+        :py:exc:`ValueError`: If the arguments are not valid.
+        :py:exc:`ParseManyError`: If a document cannot be parsed. (This
+            is raised by the generator when it reaches the document.)
+    """
+    if batch_size < 1:
+        raise ValueError("'batch_size' argument must be at least 1, not %r"
+                         % (batch_size,))
+    settings = _worker_settings(kwargs)
+    parent_links = settings.get('parent_links', 'strong')
+    suspend_gc = settings.get('suspend_gc', False)
+    return _parse_many(inputs, workers, ordered, batch_size, settings,
+                       parent_links, suspend_gc)
+
+def _parse_many(inputs, workers, ordered, batch_size, settings,
+                parent_links, suspend_gc):
+    # pylint: disable=too-many-arguments
+    pool = multiprocessing.Pool(workers, _init_worker, (settings,))
+    try:
+        if ordered:
+            imap = pool.imap
+        else:
+            imap = pool.imap_unordered
+        for results in imap(_parse_batch, _batches(inputs, batch_size)):
+            for (index, flat, error, path) in results:
+                if error is not None:
+                    raise ParseManyError(index, error, path)
+                with _gc_suspended(suspend_gc):
+                    root = _build_tree(flat, parent_links)
+                if ordered:
+                    yield root
+                else:
+                    yield (index, root)
+    finally:
+        pool.terminate()
+        pool.join()
+
+# The smallest range of records parse_split() sends to a worker. This is
+# also the size of the blocks used to scan for the first record.
+_min_range_size = 65536
+
+class _RecordFound(Exception):
+    # Stops the scan for the first record.
+    pass
+
+class _SplitError(Exception):
+    # Reports that a worker could not parse its range of records
+    # separately. The original error is the first argument.
+    pass
+
+def _find_first_record(data, record):
+    # Scan data with expat until the first element named record starts.
+    # Return a tuple of (offset, ancestors, skip): the byte offset of the
+    # record, the names of the elements which contain it, and the number
+    # of elements at its depth which end before it. Return None if there
+    # is no such element (or the document is not well-formed).
+    parser = expat.ParserCreate()
+    ancestors = []
+    ends = {}
+    def start_element(name, attrs): # pylint: disable=unused-argument
+        """Handle the start of an element."""
+        if name == record:
+            raise _RecordFound(parser.CurrentByteIndex)
+        ancestors.append(name)
+    def end_element(name): # pylint: disable=unused-argument
+        """Handle the end of an element."""
+        depth = len(ancestors)
+        ancestors.pop()
+        ends[depth] = ends.get(depth, 0) + 1
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    try:
+        for i in range(0, len(data), _min_range_size):
+            parser.Parse(data[i:i + _min_range_size], False)
+        parser.Parse(_bytes(), True)
+    except _RecordFound as e:
+        return (e.args[0], ancestors, ends.get(len(ancestors) + 1, 0))
+    except expat.ExpatError:
+        pass
+    return None
+
+def _find_records(data, start, record, range_size):
+    # Find the run of records which begins at start. The records must be
+    # siblings, separated only by whitespace. Return a tuple of (end,
+    # ranges): the end of the run, and a list of (start, end) ranges of
+    # about range_size bytes, each holding whole records. Return None if
+    # the records cannot be found reliably.
+    #
+    # This uses regular expressions rather than a parser. That is safe
+    # because, outside of comments, CDATA sections and processing
+    # instructions (which the run may not contain), every "<" in a
+    # well-formed document starts a tag. The workers check the rest when
+    # they parse the records.
+    name = re.escape(record.encode('utf-8'))
+    start_tag = re.compile(b'<' + name + b'(?=[ \t\r\n/>])' +
+                           br"""(?:[^"'>]|"[^"]*"|'[^']*')*>""")
+    end_tag = re.compile(b'</' + name + b'[ \t\r\n]*>')
+    nested_tag = re.compile(b'<' + name + b'[ \t\r\n/>]')
+    whitespace = re.compile(b'[ \t\r\n]*')
+    ranges = []
+    range_start = pos = start
+    end = None
+    while True:
+        match = start_tag.match(data, pos)
+        if match is None:
+            break
+        if data[match.end() - 2:match.end() - 1] == b'/':
+            end = match.end()
+        else:
+            close = end_tag.search(data, match.end())
+            if close is None or nested_tag.search(data, match.end(),
+                                                  close.start()):
+                return None
+            end = close.end()
+        pos = whitespace.match(data, end).end()
+        if end - range_start >= range_size:
+            ranges.append((range_start, end))
+            range_start = pos
+    if end is None:
+        return None
+    if end > range_start:
+        ranges.append((range_start, end))
+    if data.find(b'<!', start, end) >= 0 or data.find(b'<?', start, end) >= 0:
+        return None
+    return (end, ranges)
+
+def _parse_records(task):
+    # Parse a range of records in a worker process. The task is a tuple
+    # of (source, prefix_end, start, end, suffix, keys, skip). The source
+    # is either the path of the document, or the document's prefix and
+    # the range (as bytes). The worker parses the prefix (everything
+    # before the first record), the range, and the suffix (which closes
+    # the elements the prefix opened).
+    #
+    # If keys is set, it holds the keys of the records' ancestors and of
+    # the records, which lead to the records in the parsed tree.
+    # Otherwise (when namespaces are processed, so the keys are not
+    # known), the worker's Parser matches every element at the depth of
+    # the records, and the first skip matches, which come from the
+    # prefix, are dropped.
+    #
+    # Return a tuple of (path, flat_list, error), where path is the path
+    # of the records (if found here) and flat_list is the flat format of
+    # an XMLListNode holding the records. If the range cannot be parsed
+    # separately (because the scan for the records was wrong, or the
+    # document is not well-formed), error is a _SplitError.
+    (source, prefix_end, start, end, suffix, keys, skip) = task
+    try:
+        if isinstance(source, _bytes):
+            data = source
+        else:
+            with open(source, 'rb') as fileobj:
+                data = fileobj.read(prefix_end)
+                fileobj.seek(start)
+                data += fileobj.read(end - start)
+        path = None
+        try:
+            if keys is None:
+                records = []
+                for (match_path, _, node) in _worker_parser(data + suffix):
+                    if skip > 0:
+                        skip -= 1
+                        continue
+                    path = match_path
+                    records.append(node)
+            else:
+                node = _worker_parser(data + suffix)
+                for key in keys[:-1]:
+                    node = node[key]
+                    # The ancestor is the last element with its key.
+                    if isinstance(node, XMLListNode):
+                        node = node[-1]
+                records = node[keys[-1]]
+                if not isinstance(records, XMLListNode):
+                    records = [records]
+        except (expat.ExpatError, KeyError, IndexError, TypeError) as e:
+            raise _SplitError(e)
+        flat = _flatten_tree(XMLListNode._new_fast(list(records), None, None)) # pylint: disable=protected-access
+    except Exception as e: # pylint: disable=broad-except
+        # Send the error back to be raised by the caller.
+        return (None, None, e)
+    return (path, flat, None)
+
+def _find_placeholder(root, marker):
+    # Return a tuple of (node, parent, owner) for the CDATA node whose
+    # text is marker. The parent is the dictionary or list node which
+    # holds it, and the owner is the dictionary node for its element.
+    # Return None if there is no such node.
+    stack = [(root, None, None)]
+    while stack:
+        (node, parent, owner) = stack.pop()
+        if isinstance(node, XMLDictNode):
+            stack.extend((child, node, node) for child in node.values())
+        elif isinstance(node, XMLListNode):
+            stack.extend((child, node, owner) for child in node)
+        elif isinstance(node, XMLNodeBase) and node.get_cdata() == marker:
+            return (node, parent, owner)
+    return None
+
+def _splice_records(placeholder, parent, records, parent_links):
+    # Replace the placeholder in the tree with the records, as the parser
+    # would have added them.
+    # pylint: disable=protected-access
+    if isinstance(parent, XMLListNode):
+        # There are other elements with the same key, outside the run of
+        # records.
+        index = placeholder._find_in_list(parent)
+        list.__setitem__(parent, slice(index, index + 1), records)
+        nodes = parent
+    elif len(records) == 1:
+        records[0]._parent = placeholder._parent
+        OrderedDict.__setitem__(parent, placeholder.key, records[0])
+        return
+    else:
+        nodes = XMLListNode._new_fast(records, placeholder.tag,
+                                      placeholder.key, placeholder._parent)
+        OrderedDict.__setitem__(parent, placeholder.key, nodes)
+    make_parent_link = _get_parent_link(parent_links)
+    if make_parent_link is None:
+        link = nodes
+    else:
+        link = make_parent_link(nodes)
+    for (i, node) in enumerate(nodes):
+        node._parent = link
+        node._index_hint = i
+
+def parse_split(xml_input, record, workers=None, stream=False,
+                range_size=None, **kwargs):
+    """Parse one large XML document in parallel.
+
+    This function parses a document which holds many sibling elements
+    with the same name (the "records"), such as the ``<rt>`` elements
+    of a full routing table. It finds the byte offsets of the records,
+    splits them into ranges, and parses the ranges in a pool of worker
+    processes. Each worker parses its range together with the start of
+    the document (everything before the first record), so the records
+    see the same namespace declarations, entities and ancestors they
+    would see in a normal parse. Note that the start of the document is
+    parsed once for each range, so this works best when the records
+    make up most of the document. (Otherwise, the total work grows with
+    the number of ranges, which grows with the number of workers.)
+
+    If :py:obj:`stream` is False, the records are added to the tree of
+    the rest of the document, so the result is the same as a normal
+    parse. If :py:obj:`stream` is True, this returns a generator which
+    produces the records as tuples of ``(path,match_string,xml_node)``,
+    in the same way as a :py:class:`Parser` used as a generator with
+    the path of the records, except that the nodes have no parents.
+
+    For example::
+
+        >>> root = parse_split("rib.xml", "rt", workers=8)
+        >>> len(root["route-table"]["rt"])
+        2500000
+
+    The records are found with a quick scan of the document, which
+    requires them to be a run of siblings separated only by whitespace,
+    without comments, CDATA sections or processing instructions between
+    them. If the document does not fit these rules, or the records
+    cannot be parsed separately, the function parses the document
+    normally instead. (So, a document which is not well-formed raises
+    the same error as it does in a normal parse.) Other errors in the
+    workers are raised. In stream mode, a worker's error is raised after
+    the records before it are produced.
+
+    Args:
+        xml_input (bytes, string, or path): The document, or the path of
+            a file holding it. A file is mapped into memory for the scan,
+            and each worker reads its own ranges from the file.
+        record (string): The name of the record elements, as it
+            appears in the document (including any namespace prefix).
+        workers (int): The number of worker processes. (Default: the
+            number of CPUs)
+        stream (bool): Produce the records as they are parsed, rather
+            than returning the whole tree. (Default: False)
+        range_size (int): The approximate size, in bytes, of the ranges
+            sent to the workers. (Default: the size which gives each
+            worker about four ranges, but at least 64 KB)
+        Also accepts the same keyword arguments you can supply when
+        creating a :py:class:`Parser` object, except :py:obj:`generator`.
+        The :py:obj:`lazy` argument is ignored.
+
+    Returns:
+        An :py:class:`XMLDictNode` containing the parsed XML tree or, if
+        :py:obj:`stream` is True, a generator.
+
+    Raises:
+        :py:exc:`ValueError`: If the arguments are not valid.
+        :py:exc:`TypeError`: If the input is not a supported type.
+    """
+    settings = _worker_settings(kwargs)
+    if isinstance(xml_input, _unicode):
+        if not settings.get('encoding'):
+            settings['encoding'] = 'utf-8'
+        xml_input = xml_input.encode(settings['encoding'])
+    elif isinstance(xml_input, bytearray):
+        xml_input = _bytes(xml_input)
+    elif not (isinstance(xml_input, _bytes) or
+              hasattr(xml_input, '__fspath__')):
+        raise TypeError("'xml_input' argument must be bytes, a string or "
+                        "a path, not '%s'" % (type(xml_input).__name__))
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    job = _SplitJob(xml_input, record, workers, range_size, settings)
+    if stream:
+        return job.stream()
+    return job.parse()
+
+class _SplitJob(object):
+    # The state of one parse_split() call.
+    def __init__(self, xml_input, record, workers, range_size, settings):
+        # pylint: disable=too-many-arguments
+        self.xml_input = xml_input
+        self.record = record
+        self.workers = workers
+        self.range_size = range_size
+        self.settings = settings
+        self.parent_links = settings.get('parent_links', 'strong')
+        self.path = None
+        self.data = None
+        self.to_close = []
+
+    def _open(self):
+        # Make the document available as self.data. A file is mapped
+        # into memory.
+        if not hasattr(self.xml_input, '__fspath__'):
+            self.data = self.xml_input
+            return
+        self.path = os.fspath(self.xml_input)
+        fileobj = open(self.path, 'rb')
+        self.to_close.append(fileobj)
+        if os.fstat(fileobj.fileno()).st_size == 0:
+            self.data = _bytes()
+        else:
+            self.data = mmap.mmap(fileobj.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            self.to_close.insert(0, self.data)
+
+    def _close(self):
+        for obj in self.to_close:
+            obj.close()
+        self.to_close = []
+        self.data = None
+
+    def _plan(self):
+        # Find the records. Return a tuple of (first, end, ranges,
+        # ancestors, skip), or None if the document cannot be split.
+        found = _find_first_record(self.data, self.record)
+        if found is None:
+            return None
+        (first, ancestors, skip) = found
+        range_size = self.range_size
+        if range_size is None:
+            range_size = max(_min_range_size,
+                             (len(self.data) - first) // (self.workers * 4))
+        records = _find_records(self.data, first, self.record, range_size)
+        if records is None:
+            return None
+        (end, ranges) = records
+        return (first, end, ranges, ancestors, skip)
+
+    def _tasks(self, plan, keys):
+        # Yield the worker tasks for the ranges. Each task includes the
+        # prefix of the document (everything before the first record),
+        # which its worker must parse again.
+        (first, _, ranges, ancestors, skip) = plan
+        suffix = _bytes().join(b'</' + name.encode('utf-8') + b'>'
+                               for name in reversed(ancestors))
+        for (start, end) in ranges:
+            if self.path is not None:
+                source = self.path
+            else:
+                source = self.data[:first] + self.data[start:end]
+            yield (source, first, start, end, suffix, keys, skip)
+
+    def _run(self, plan):
+        # Parse the ranges in the workers. Yield a tuple of (path,
+        # records) for each range, in order.
+        ancestors = plan[3]
+        settings = self.settings
+        if settings.get('process_namespaces'):
+            # The keys are not the names in the document.
+            keys = path = None
+            settings = dict(settings,
+                            generator=["/*" * (len(ancestors) + 1)])
+        else:
+            keys = ancestors + [self.record]
+            path = "/" + "/".join(keys)
+        pool = multiprocessing.Pool(min(self.workers, len(plan[2])),
+                                    _init_worker, (settings,))
+        try:
+            for (range_path, flat, error) in pool.imap(
+                    _parse_records, self._tasks(plan, keys)):
+                if error is not None:
+                    raise error
+                with _gc_suspended(self.settings.get('suspend_gc', False)):
+                    records = list(_build_tree(flat, self.parent_links))
+                yield (range_path or path, records)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _skeleton(self, plan, marker):
+        # Return the document with the run of records replaced by one
+        # placeholder record, whose text is marker.
+        (first, end, _, _, _) = plan
+        name = self.record.encode('utf-8')
+        return _bytes().join([
+            self.data[:first], b'<', name, b'>', marker.encode('utf-8'),
+            b'</', name, b'>', self.data[end:]
+        ])
+
+    def _serial_parse(self, xml_input=None, **kwargs):
+        if xml_input is None:
+            xml_input = self.xml_input
+        return Parser(**self.settings)(xml_input, **kwargs)
+
+    def parse(self):
+        """Parse the document and return the tree."""
+        self._open()
+        try:
+            plan = self._plan()
+            # The text around the records only matches a normal parse if
+            # the whitespace between them is dropped.
+            if (plan is None or len(plan[2]) < 2 or
+                    not self.settings.get('strip_whitespace', True) or
+                    self.settings.get('cdata_separator')):
+                return self._serial_parse()
+            try:
+                records = []
+                for (_, range_records) in self._run(plan):
+                    records.extend(range_records)
+            except _SplitError:
+                # Report the error (if there really is one) in terms of
+                # the whole document.
+                return self._serial_parse()
+            marker = "jxmlease-split-%s" % (uuid.uuid4().hex,)
+            root = self._serial_parse(self._skeleton(plan, marker))
+            found = _find_placeholder(root, marker)
+            if found is None or found[2].text:
+                return self._serial_parse()
+            _splice_records(found[0], found[1], records, self.parent_links)
+            return root
+        finally:
+            self._close()
+
+    def stream(self):
+        """Parse the document and yield the records."""
+        self._open()
+        try:
+            plan = self._plan()
+            if plan is None:
+                for match in self._serial_matches():
+                    yield match
+                return
+            path = None
+            try:
+                for (path, records) in self._run(plan):
+                    for node in records:
+                        node._parent = None # pylint: disable=protected-access
+                        yield (path, path, node)
+            except _SplitError as e:
+                # The records already produced cannot be taken back, so
+                # raise the worker's error.
+                raise e.args[0]
+            # Produce any other records with the same path, which were
+            # not part of the run of records.
+            if self.data.find(b'<' + self.record.encode('utf-8'),
+                              plan[1]) >= 0:
+                marker = "jxmlease-split-%s" % (uuid.uuid4().hex,)
+                for match in self._serial_matches(
+                        self._skeleton(plan, marker), path, marker):
+                    yield match
+        finally:
+            self._close()
+
+    def _serial_matches(self, xml_input=None, path=None, marker=None):
+        # Yield the records from a normal parse of the document. If path
+        # is None, use the path of the first record.
+        found = _find_first_record(self.data, self.record)
+        if found is None:
+            # Raise the parser's error, if any.
+            self._serial_parse(xml_input)
+            return
+        (_, ancestors, skip) = found
+        generator = ["/*" * (len(ancestors) + 1)]
+        for (match_path, _, node) in self._serial_parse(xml_input,
+                                                        generator=generator):
+            if skip > 0:
+                skip -= 1
+                continue
+            if path is None:
+                path = match_path
+            if match_path == path and node.get_cdata() != marker:
+                node._parent = None # pylint: disable=protected-access
+                yield (path, path, node)
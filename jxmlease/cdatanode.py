@@ -12,8 +12,9 @@ from xml.sax.xmlreader import AttributesImpl
 from . import _node_refs, pprint, _unicode
 from . import _XMLDictPlaceholder
 from ._basenode import _common_docstring, _docstring_fixup, XMLNodeBase
+from ._basenode import _node_slots, _NoArg, _common_slots
 
-__all__ = ['XMLCDATANode']
+__all__ = ['XMLCDATANode', 'XMLMutableCDATANode']
 
 XMLDictNode = _XMLDictPlaceholder
 def _resolve_references_once():
@@ -40,19 +41,43 @@ _resolve_references = _resolve_references_once
 class XMLCDATANode(XMLNodeBase, _unicode):
     """(docstring to be replaced by __doc__)"""
     __doc__ = _common_docstring("XMLCDATANode")
+    __slots__ = _node_slots(_unicode)
     def __new__(cls, *args, **kwargs):
         _resolve_references()
         return super(XMLCDATANode, cls).__new__(cls, *args, **kwargs)
     def __init__(self, *args, **kwargs): # pylint: disable=unused-argument
-        self.text = self
         super(XMLCDATANode, self).__init__(**kwargs)
 
+    # The text of a CDATA node is the node itself. This is computed,
+    # rather than stored, so that the node does not refer to itself.
+    # (A self-reference would keep it alive until the cyclic garbage
+    # collector runs.)
+    @property
+    def text(self):
+        """The node's CDATA, which is the node itself."""
+        return self
+
+    @text.setter
+    def text(self, value):
+        # The text cannot be changed in place. (See set_cdata().)
+        pass
+
+    @classmethod
+    def _new_fast(cls, text, tag, xml_attrs, parent=None):
+        # Create a node without the argument processing done by
+        # __new__() and __init__(). See XMLNodeBase._init_fast() for the
+        # requirements on the arguments.
+        _resolve_references()
+        node = _unicode.__new__(cls, text)
+        node._init_fast(tag, tag, parent, xml_attrs, node) # pylint: disable=protected-access
+        return node
+
     def add_node(self, tag, key=None, *args, **kwargs):
         self._check_replacement()
         # Hmmm... We were a CDATA node, but we need to become a
         # dictionary so we can have members.
         newnode = XMLDictNode(tag=self.tag, key=self.key, parent=self.parent,
-                              text=_unicode(self), xml_attrs=self.xml_attrs)
+                              text=_unicode(self), xml_attrs=self._xml_attrs)
         # Now, add the new node as a child of our replacement.
         rv = newnode.add_node(tag, key, *args, **kwargs)
         # Finally, replace ourselves.
@@ -62,7 +87,7 @@ class XMLCDATANode(XMLNodeBase, _unicode):
     def set_cdata(self, cdata, return_node=False):
         self._check_replacement()
         newnode = XMLCDATANode(cdata, tag=self.tag, key=self.key,
-                               parent=self.parent, xml_attrs=self.xml_attrs)
+                               parent=self.parent, xml_attrs=self._xml_attrs)
         self._replace_node(newnode)
         if return_node:
             return newnode
@@ -81,7 +106,7 @@ class XMLCDATANode(XMLNodeBase, _unicode):
     def _emit_handler(self, content_handler, depth, pretty, newl, indent):
         if pretty:
             content_handler.ignorableWhitespace(depth * indent)
-        content_handler.startElement(self.tag, AttributesImpl(self.xml_attrs))
+        content_handler.startElement(self.tag, AttributesImpl(self._xml_attrs))
         content_handler.characters(self.get_cdata())
         content_handler.endElement(self.tag)
         if pretty and depth > 0:
@@ -105,3 +130,161 @@ class XMLCDATANode(XMLNodeBase, _unicode):
         return super(XMLNodeBase, self).__str__()
 
 _docstring_fixup(XMLCDATANode)
+
+def _text_of(value):
+    # Return the string to compare with the text of an
+    # XMLMutableCDATANode.
+    if isinstance(value, XMLMutableCDATANode):
+        return value.text
+    return value
+
+class XMLMutableCDATANode(XMLNodeBase):
+    """(docstring to be replaced by __doc__)"""
+    __doc__ = _common_docstring("XMLMutableCDATANode") + """
+Unlike an :py:class:`XMLCDATANode`, an :py:class:`XMLMutableCDATANode` is
+not a string. It stores its CDATA in its :py:obj:`text` attribute, so
+methods such as :py:meth:`set_cdata` and :py:meth:`append_cdata` change
+the node in place, rather than replacing it in the tree. The parser
+creates these nodes when the :py:obj:`mutable_cdata` parameter is True.
+
+The node compares and hashes like its text, and the string methods (such
+as :py:meth:`strip` or :py:meth:`split`) are available on it and operate
+on its text. However, code that requires an actual string (for example,
+:py:func:`json.dumps`) must use :py:meth:`get_cdata`.
+"""
+    __slots__ = _node_slots(object, 'text')
+
+    def __new__(cls, *args, **kwargs): # pylint: disable=unused-argument
+        _resolve_references()
+        # Unlike the other node classes, the base class (object) does
+        # not accept the initial value.
+        return super(XMLMutableCDATANode, cls).__new__(cls)
+
+    def __init__(self, *args, **kwargs):
+        kwargs = dict(kwargs)
+        initializer = kwargs.pop("initializer", _NoArg())
+        if not isinstance(initializer, _NoArg):
+            if len(args) > 0:
+                raise TypeError("got multiple values for keyword "
+                                "argument 'initializer'")
+        elif len(args) == 1:
+            initializer = args[0]
+        elif len(args) > 1:
+            raise TypeError("expected at most 1 positional argument, got %d"
+                            % len(args))
+        else:
+            initializer = kwargs.get("text", _unicode())
+        kwargs.pop("text", None)
+        if isinstance(initializer, XMLNodeBase):
+            kwargs.setdefault("xml_attrs", initializer._xml_attrs) # pylint: disable=protected-access
+            text = initializer.get_cdata()
+        elif initializer is None:
+            text = _unicode()
+        else:
+            text = _unicode(initializer)
+        super(XMLMutableCDATANode, self).__init__(text=text, **kwargs)
+
+    @classmethod
+    def _new_fast(cls, text, tag, xml_attrs, parent=None):
+        # Create a node without the argument processing done by
+        # __new__() and __init__(). See XMLNodeBase._init_fast() for the
+        # requirements on the arguments.
+        _resolve_references()
+        node = object.__new__(cls)
+        node._init_fast(tag, tag, parent, xml_attrs, text) # pylint: disable=protected-access
+        return node
+
+    def add_node(self, tag, key=None, *args, **kwargs):
+        self._check_replacement()
+        # We need to become a dictionary so we can have members.
+        newnode = XMLDictNode(tag=self.tag, key=self.key, parent=self.parent,
+                              text=self.text, xml_attrs=self._xml_attrs)
+        # Now, add the new node as a child of our replacement.
+        rv = newnode.add_node(tag, key, *args, **kwargs)
+        # Finally, replace ourselves.
+        self._replace_node(newnode)
+        return rv
+
+    def standardize(self, deep=True):
+        # There is nothing to do.
+        return
+
+    def _emit_handler(self, content_handler, depth, pretty, newl, indent):
+        if pretty:
+            content_handler.ignorableWhitespace(depth * indent)
+        content_handler.startElement(self.tag, AttributesImpl(self._xml_attrs))
+        content_handler.characters(self.text)
+        content_handler.endElement(self.tag)
+        if pretty and depth > 0:
+            content_handler.ignorableWhitespace(newl)
+
+    def prettyprint(self, *args, **kwargs):
+        currdepth = kwargs.pop("currdepth", 0)
+        if currdepth == 0:
+            pprint(self.text, *args, **kwargs)
+        else:
+            return self.text
+
+    def _find_nodes_with_tag(self, tag, recursive=True, top_level=False):
+        if self.tag in tag:
+            yield self
+
+    def __getattr__(self, name):
+        # Make the string methods (such as strip() and split()) available
+        # by passing them through to the text. Slots which have not been
+        # set yet (and private names) are not passed through.
+        if name.startswith('_') or name in _common_slots or name == 'text':
+            raise AttributeError(name)
+        return getattr(self.text, name)
+
+    def __repr__(self):
+        return "%s(xml_attrs=%r, value=%r)" % (
+            self.__class__.__name__, self._xml_attrs, self.text
+        )
+
+    def __str__(self):
+        return self.text
+
+    def __unicode__(self):
+        return self.text
+
+    def __eq__(self, other):
+        return self.text == _text_of(other)
+
+    def __ne__(self, other):
+        return self.text != _text_of(other)
+
+    def __lt__(self, other):
+        return self.text < _text_of(other)
+
+    def __le__(self, other):
+        return self.text <= _text_of(other)
+
+    def __gt__(self, other):
+        return self.text > _text_of(other)
+
+    def __ge__(self, other):
+        return self.text >= _text_of(other)
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __len__(self):
+        return len(self.text)
+
+    def __iter__(self):
+        return iter(self.text)
+
+    def __contains__(self, item):
+        return _text_of(item) in self.text
+
+    def __getitem__(self, index):
+        return self.text[index]
+
+    def __add__(self, other):
+        return self.text + _text_of(other)
+
+    def __radd__(self, other):
+        return _text_of(other) + self.text
+
+_docstring_fixup(XMLMutableCDATANode)
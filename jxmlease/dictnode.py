@@ -13,6 +13,7 @@ from copy import copy
 from . import _node_refs, OrderedDict, pprint, _unicode
 from . import _XMLCDATAPlaceholder, _XMLListPlaceholder
 from ._basenode import _common_docstring, _docstring_fixup, XMLNodeBase
+from ._basenode import _node_slots, _empty_xml_attrs
 
 __all__ = ['XMLDictNode']
 
@@ -44,6 +45,8 @@ _resolve_references = _resolve_references_once
 class XMLDictNode(XMLNodeBase, OrderedDict):
     """(docstring to be replaced by __doc__)"""
     __doc__ = _common_docstring("XMLDictNode")
+    __slots__ = _node_slots(OrderedDict, 'text', '__const_class_name__',
+                            '_ignore_level')
     def __new__(cls, *args, **kwargs):
         _resolve_references()
         return super(XMLDictNode, cls).__new__(cls, *args, **kwargs)
@@ -53,12 +56,29 @@ class XMLDictNode(XMLNodeBase, OrderedDict):
         self.__const_class_name__ = self.__class__.__name__
         self._ignore_level = False
 
+    @classmethod
+    def _new_fast(cls, tag, xml_attrs, parent=None):
+        # Create an empty node without the argument processing done by
+        # __new__() and __init__(). See XMLNodeBase._init_fast() for the
+        # requirements on the arguments.
+        _resolve_references()
+        node = OrderedDict.__new__(cls)
+        OrderedDict.__init__(node)
+        node._init_fast(tag, tag, parent, xml_attrs, _unicode()) # pylint: disable=protected-access
+        node.__const_class_name__ = cls.__name__
+        node._ignore_level = False # pylint: disable=protected-access
+        return node
+
     def add_node(self, tag, key=None, text=_unicode(), new_node=None,
                  update=True, **kwargs):
         self._check_replacement()
         if new_node is None:
             # By default, we create a CDATA node.
-            new_node = XMLCDATANode(text, tag=tag, **kwargs)
+            if kwargs:
+                new_node = XMLCDATANode(text, tag=tag, **kwargs)
+            else:
+                # pylint: disable=protected-access
+                new_node = XMLCDATANode._new_fast(text, tag, _empty_xml_attrs)
 
             if key:
                 if update:
@@ -86,16 +106,17 @@ class XMLDictNode(XMLNodeBase, OrderedDict):
             # Make it a list, if not already.
             if not isinstance(self[key], XMLListNode):
                 old_node = self[key]
-                self[key] = XMLListNode([old_node], tag=tag, key=key,
-                                        parent=self, convert=False)
+                self[key] = XMLListNode._new_fast([old_node], tag, key, self) # pylint: disable=protected-access
                 if update:
                     old_node.parent = self[key]
+                old_node._index_hint = 0 # pylint: disable=protected-access
                 del old_node
 
             # Add the new node to the list.
             if update:
                 new_node.parent = self[key]
             self[key].append(new_node)
+            new_node._index_hint = len(self[key]) - 1 # pylint: disable=protected-access
         else:
             # Add to the dictionary.
             if update:
@@ -156,7 +177,7 @@ class XMLDictNode(XMLNodeBase, OrderedDict):
             return
         if pretty:
             content_handler.ignorableWhitespace(depth * indent)
-        content_handler.startElement(self.tag, AttributesImpl(self.xml_attrs))
+        content_handler.startElement(self.tag, AttributesImpl(self._xml_attrs))
         if pretty and len(self) > 0:
             content_handler.ignorableWhitespace(newl)
         for k in self:
@@ -21,7 +21,8 @@ except ImportError: # pragma no cover
         import xml.etree.ElementTree as etree
 
 from . import parser_defaults, _unicode
-from ._parsehandler import _DictSAXHandler
+from ._parsehandler import _make_parser_handler, _gc_suspended
+from ._parsehandler import _gc_suspended_iter, _gc_freeze
 
 # pylint: enable=wrong-import-position
 
@@ -119,13 +120,15 @@ class EtreeParser(object):
         # Populate a dictionary with default arguments.
         self._default_kwargs = dict(process_namespaces=False,
                                     namespace_separator=':',
-                                    strip_namespace=False)
+                                    strip_namespace=False,
+                                    suspend_gc=False, freeze_gc=False)
 
         # Update the dictionary with user-provided defaults, after
         # stripping out arguments not appropriate for this
         # context.
-        local_parser_defaults = parser_defaults
-        for k in ('encoding', 'expat'):
+        local_parser_defaults = dict(parser_defaults)
+        for k in ('encoding', 'expat', 'use_mmap', 'chunk_size', 'backend',
+                  'huge_tree'):
             if k in local_parser_defaults:
                 del local_parser_defaults[k]
         self._default_kwargs.update(local_parser_defaults)
@@ -134,6 +137,12 @@ class EtreeParser(object):
         # the arguments for later use.
         self._default_kwargs.update(kwargs)
 
+        # Initialize the cache of compiled generator match strings.
+        self._automata = {}
+
+        # Initialize the interning table used when intern is True.
+        self._intern_table = {}
+
         # Process the arguments.
         self._process_args()
 
@@ -159,14 +168,16 @@ class EtreeParser(object):
         # Pop off and save the argument(s) that we don't want to pass
         # to the handler class.
         self._process_namespaces = self._kwargs.pop('process_namespaces')
+        self._suspend_gc = self._kwargs.pop('suspend_gc')
+        self._freeze_gc = self._kwargs.pop('freeze_gc')
 
         # Get local versions of the arguments we want.
         self._namespace_separator = self._kwargs['namespace_separator']
         self._strip_namespace = self._kwargs['strip_namespace']
 
     def _make_handler(self):
-        # pylint: disable=unexpected-keyword-arg
-        self._handler = _DictSAXHandler(**self._kwargs)
+        self._handler = _make_parser_handler(self._kwargs, self._automata,
+                                             self._intern_table)
 
     def _parse(self, node):
         # Initialize the namespace_dict. We use this to store locally-
@@ -174,7 +185,7 @@ class EtreeParser(object):
         self._namespace_dict = {'nexttag': _unicode('ns0')}
 
         # Call the main parsing function
-        return self._parse_node(node, root_element=True)
+        return self._parse_node(node)
 
     def _parse_attrib(self, in_dict, out_dict, nsdict):
         for (k, v) in list(in_dict.items()):
@@ -194,178 +205,210 @@ class EtreeParser(object):
                 out_dict[new_k] = v
                 del in_dict[k]
 
-    def _parse_node(self, node, local_nsdict=None, root_element=False):
-        # Parsing LXML/ElementTree is actually quite simple. We
-        # can just recursively call this function to walk through
-        # the tree of elements and call the same handler we use
-        # for parsing the text version through a SAX parser.
-        # Almost all of the complexity is handling the namespaces.
-
-        # Make a local copy of the namespace dict. This lets us
-        # track whether we need to add xmlns attributes to lower
-        # levels.
-        if local_nsdict is None:
-            local_nsdict = self._namespace_dict
-        local_nsdict = dict(local_nsdict)
-
-        # Ignore processing instructions and comments.
-        if node.tag not in (etree.PI, etree.Comment):
-            # Figure out NS:
-            # If 'strip_namespace' or 'process_namespaces' are set, we
-            # can do the same thing. In these cases, we just care about
-            # making sure the attributes and tags are formed correctly so
-            # that the handler will do the correct thing. In general, our
-            # goal is to emulate what the expat processor would do if
-            # process_namespaces was set to True.
-            #
-            # Otherwise, try to restore the original nodename ("ns:tag")
-            # and XMLNS attributes. (Again, this emulates what the expat
-            # processor would do.) If we've lost the original
-            # namespace identifiers, make up our own.
-            if self._strip_namespace or self._process_namespaces:
-                parsed_tag = QNameDecode(node)
-                if not parsed_tag.namespace:
-                    tag = parsed_tag.localname
+    def _parse_node(self, root):
+        # Parsing LXML/ElementTree is actually quite simple. We walk
+        # through the tree of elements and call the same handler we
+        # use for parsing the text version through a SAX parser.
+        # Almost all of the complexity is handling the namespaces
+        # (see _start_node()).
+        #
+        # The walk uses an explicit stack, rather than recursion, so
+        # deep trees do not reach the recursion limit, and matches are
+        # produced directly, rather than passed up through a generator
+        # for each level. Each entry of the stack holds an element, an
+        # iterator over its children, and the values _start_node()
+        # returned for it.
+        handler = self._handler
+        started = self._start_node(root, self._namespace_dict, {})
+        if started is not None:
+            stack = [(root, iter(root), started)]
+            while stack:
+                (node, children, (tag, local_nsdict, nsmap)) = stack[-1]
+                for child in children:
+                    started = self._start_node(child, local_nsdict, nsmap)
+                    if started is not None:
+                        stack.append((child, iter(child), started))
+                        break
+                    # Processing instructions and comments only add
+                    # their tails.
+                    if child.tail:
+                        handler.characters(child.tail)
+                    for rv in handler.pop_matches():
+                        yield rv
                 else:
-                    tag = self._namespace_separator.join(
-                        (parsed_tag.namespace, parsed_tag.localname)
-                    )
-
-                # Fix the attributes. Just paste them together with
-                # the namespace separator. The standard parsing code
-                # can handle them further. (In the case where
-                # strip_namespace is set, it can check for name
-                # conflicts (e.g.  <a a:attr1="" b:attr1=""
-                # c:attr1=""/>). That is the reason we don't strip
-                # them out here when strip_namespace is true. It seems
-                # best to have the logic in a single place.
-                attrib = dict()
-                for (k, v) in node.attrib.items():
-                    parsed_attr = QNameSeparator(k)
-                    if not parsed_attr.namespace:
-                        attrib[k] = v
-                    else:
-                        new_k = self._namespace_separator.join(
-                            (parsed_attr.namespace,
-                             parsed_attr.localname)
-                        )
-                        attrib[new_k] = v
-
-            elif hasattr(node, 'nsmap') and len(node.nsmap) == 0:
-                # If nsmap is present (lxml) and it is 0, then we
-                # should have no namespace information to process.
-                # If nsmap is present and it is greater than 0,
-                # then we want to process the namespace information,
-                # even if all we do is create proper xmlns attributes.
-                tag = node.tag
-                attrib = dict(node.attrib)
+                    stack.pop()
+                    handler.end_element(tag)
+                    if stack:
+                        if node.tail:
+                            handler.characters(node.tail)
+                        for rv in handler.pop_matches():
+                            yield rv
+        handler.end_document()
+        for rv in handler.pop_matches():
+            yield rv
+
+    def _start_node(self, node, local_nsdict, parent_nsmap):
+        # Report the start of an element (and its text) to the
+        # handler. local_nsdict holds the locally-generated namespace
+        # identifiers in scope, and parent_nsmap is the nsmap of the
+        # element's parent (or an empty dictionary for the root).
+        #
+        # Return a tuple of (tag, local_nsdict, nsmap) for the element:
+        # the tag reported to the handler, the namespace identifiers in
+        # scope for its children, and its nsmap (if needed for its
+        # children). Return None for processing instructions and
+        # comments, which are ignored.
+        if node.tag in (etree.PI, etree.Comment):
+            return None
+        # Figure out NS:
+        # If 'strip_namespace' or 'process_namespaces' are set, we
+        # can do the same thing. In these cases, we just care about
+        # making sure the attributes and tags are formed correctly so
+        # that the handler will do the correct thing. In general, our
+        # goal is to emulate what the expat processor would do if
+        # process_namespaces was set to True.
+        #
+        # Otherwise, try to restore the original nodename ("ns:tag")
+        # and XMLNS attributes. (Again, this emulates what the expat
+        # processor would do.) If we've lost the original
+        # namespace identifiers, make up our own.
+        #
+        # lxml elements have an nsmap attribute (which lxml builds each
+        # time it is read); ElementTree elements do not.
+        if self._strip_namespace or self._process_namespaces:
+            nsmap = None
+        else:
+            nsmap = getattr(node, 'nsmap', None)
+        if self._strip_namespace or self._process_namespaces:
+            parsed_tag = QNameDecode(node)
+            if not parsed_tag.namespace:
+                tag = parsed_tag.localname
             else:
-                # If the node has the nsmap attribute, reverse it to
-                # create a namespace lookup dictionary for us.
-                if hasattr(node, 'nsmap'):
-                    ns_resolve_dict = dict(zip(node.nsmap.values(),
-                                               node.nsmap.keys()))
-                # If the node doesn't have the nsmap attribute, all NS
-                # identfiers are lost. We can recreate them with
-                # locally-generated identifiers, which we store in the
-                # namespace_dict.
-                else:
-                    ns_resolve_dict = local_nsdict
-
-                # Initialize the new attributes
-                attrib = dict()
-
-                # Determine if we need to add a namespace to the tag.
-                parsed_tag = QNameDecode(node)
-                if ((not parsed_tag.namespace) or
-                        (not ns_resolve_dict.get(
-                            parsed_tag.namespace, '@@NOMATCH@@'
-                        ))):
-                    tag = parsed_tag.localname
+                tag = self._namespace_separator.join(
+                    (parsed_tag.namespace, parsed_tag.localname)
+                )
+
+            # Fix the attributes. Just paste them together with
+            # the namespace separator. The standard parsing code
+            # can handle them further. (In the case where
+            # strip_namespace is set, it can check for name
+            # conflicts (e.g.  <a a:attr1="" b:attr1=""
+            # c:attr1=""/>). That is the reason we don't strip
+            # them out here when strip_namespace is true. It seems
+            # best to have the logic in a single place.
+            attrib = dict()
+            for (k, v) in node.attrib.items():
+                parsed_attr = QNameSeparator(k)
+                if not parsed_attr.namespace:
+                    attrib[k] = v
                 else:
-                    # If the namespace isn't in our resolver dictionary,
-                    # add it to the namespace_dict. Note that this
-                    # will not work correctly if the node had an nsmap.
-                    # It isn't supposed to work correctly in that case.
-                    # If the tag uses a namespace that isn't in the
-                    # nsmap, that seems like a bug.
-                    if parsed_tag.namespace not in ns_resolve_dict:
-                        # If we've already seen this in a sibling branch,
-                        # use a consistent NS identifier. Otherwise, add
-                        # the identifier to the main database.
-                        if parsed_tag.namespace in self._namespace_dict:
-                            newns = self._namespace_dict[parsed_tag.namespace]
-                        else:
-                            newns = self._namespace_dict['nexttag']
-                            self._namespace_dict[parsed_tag.namespace] = newns
-                            self._namespace_dict['nexttag'] = _unicode(
-                                "ns%d" % (int(newns[2:]) + 1, )
-                            )
-                        # Add the identifier to the local database, and
-                        # add an xmlns: attribute to cover this branch.
-                        ns_resolve_dict[parsed_tag.namespace] = newns
-                        attrib[_unicode("xmlns:" + newns)] = parsed_tag.namespace
-                    tag = self._namespace_separator.join(
-                        (ns_resolve_dict[parsed_tag.namespace],
-                         parsed_tag.localname)
+                    new_k = self._namespace_separator.join(
+                        (parsed_attr.namespace,
+                         parsed_attr.localname)
                     )
+                    attrib[new_k] = v
+
+        elif nsmap is not None and len(nsmap) == 0:
+            # If nsmap is present (lxml) and it is 0, then we
+            # should have no namespace information to process.
+            # If nsmap is present and it is greater than 0,
+            # then we want to process the namespace information,
+            # even if all we do is create proper xmlns attributes.
+            tag = node.tag
+            attrib = dict(node.attrib)
+        else:
+            # If the node has the nsmap attribute, reverse it to
+            # create a namespace lookup dictionary for us.
+            if nsmap is not None:
+                ns_resolve_dict = dict(zip(nsmap.values(), nsmap.keys()))
+            # If the node doesn't have the nsmap attribute, all NS
+            # identfiers are lost. We can recreate them with
+            # locally-generated identifiers, which we store in the
+            # namespace_dict. (The identifiers added for this element
+            # apply to its children, but not to its siblings, so this
+            # works on a copy.)
+            else:
+                ns_resolve_dict = local_nsdict = dict(local_nsdict)
+
+            # Initialize the new attributes
+            attrib = dict()
+
+            # Determine if we need to add a namespace to the tag.
+            parsed_tag = QNameDecode(node)
+            if ((not parsed_tag.namespace) or
+                    (not ns_resolve_dict.get(
+                        parsed_tag.namespace, '@@NOMATCH@@'
+                    ))):
+                tag = parsed_tag.localname
+            else:
+                # If the namespace isn't in our resolver dictionary,
+                # add it to the namespace_dict. Note that this
+                # will not work correctly if the node had an nsmap.
+                # It isn't supposed to work correctly in that case.
+                # If the tag uses a namespace that isn't in the
+                # nsmap, that seems like a bug.
+                if parsed_tag.namespace not in ns_resolve_dict:
+                    # If we've already seen this in a sibling branch,
+                    # use a consistent NS identifier. Otherwise, add
+                    # the identifier to the main database.
+                    if parsed_tag.namespace in self._namespace_dict:
+                        newns = self._namespace_dict[parsed_tag.namespace]
+                    else:
+                        newns = self._namespace_dict['nexttag']
+                        self._namespace_dict[parsed_tag.namespace] = newns
+                        self._namespace_dict['nexttag'] = _unicode(
+                            "ns%d" % (int(newns[2:]) + 1, )
+                        )
+                    # Add the identifier to the local database, and
+                    # add an xmlns: attribute to cover this branch.
+                    ns_resolve_dict[parsed_tag.namespace] = newns
+                    attrib[_unicode("xmlns:" + newns)] = parsed_tag.namespace
+                tag = self._namespace_separator.join(
+                    (ns_resolve_dict[parsed_tag.namespace],
+                     parsed_tag.localname)
+                )
 
-                # Deal with the attributes.
-                old_attrib = dict(node.attrib)
-                while len(old_attrib) > 0:
-                    try:
-                        self._parse_attrib(
-                            old_attrib, attrib, ns_resolve_dict
+            # Deal with the attributes.
+            old_attrib = dict(node.attrib)
+            while len(old_attrib) > 0:
+                try:
+                    self._parse_attrib(
+                        old_attrib, attrib, ns_resolve_dict
+                    )
+                except NamespaceError as e:
+                    if nsmap is not None:
+                        raise
+
+                    # If we've already seen this in a sibling branch,
+                    # use a consistent NS identifier. Otherwise, add
+                    # the identifier to the main database.
+                    if e.namespace in self._namespace_dict:
+                        newns = self._namespace_dict[e.namespace]
+                    else:
+                        newns = self._namespace_dict['nexttag']
+                        self._namespace_dict[e.namespace] = newns
+                        self._namespace_dict['nexttag'] = _unicode(
+                            "ns%d" % (int(newns[2:]) + 1, )
                         )
-                    except NamespaceError as e:
-                        if hasattr(node, 'nsmap'):
-                            raise
-
-                        # If we've already seen this in a sibling branch,
-                        # use a consistent NS identifier. Otherwise, add
-                        # the identifier to the main database.
-                        if e.namespace in self._namespace_dict:
-                            newns = self._namespace_dict[e.namespace]
+
+                    # Add the identifier to the local database, and
+                    # add an xmlns: attribute to cover this branch.
+                    ns_resolve_dict[e.namespace] = newns
+                    attrib[_unicode("xmlns:" + newns)] = e.namespace
+
+            # Add any necessary xmlns tags.
+            if nsmap is not None:
+                for (k, v) in nsmap.items():
+                    if parent_nsmap.get(k, '@@NOMATCH@@') != v:
+                        if k:
+                            attrib[_unicode("xmlns:" + k)] = v
                         else:
-                            newns = self._namespace_dict['nexttag']
-                            self._namespace_dict[e.namespace] = newns
-                            self._namespace_dict['nexttag'] = _unicode(
-                                "ns%d" % (int(newns[2:]) + 1, )
-                            )
-
-                        # Add the identifier to the local database, and
-                        # add an xmlns: attribute to cover this branch.
-                        ns_resolve_dict[e.namespace] = newns
-                        attrib[_unicode("xmlns:" + newns)] = e.namespace
-
-                # Add any necessary xmlns tags.
-                if hasattr(node, "nsmap"):
-                    if root_element:
-                        parent_nsmap = {}
-                    else:
-                        parent_nsmap = node.getparent().nsmap
-                    for (k, v) in node.nsmap.items():
-                        if parent_nsmap.get(k, '@@NOMATCH@@') != v:
-                            if k:
-                                attrib[_unicode("xmlns:" + k)] = v
-                            else:
-                                attrib[_unicode("xmlns")] = v
-
-            self._handler.start_element(tag, attrib)
-            if node.text and len(node.text) > 0:
-                self._handler.characters(node.text)
-            for child in node:
-                for rv in self._parse_node(child, local_nsdict):
-                    yield rv
-                for rv in self._handler.pop_matches():
-                    yield rv
-            self._handler.end_element(tag)
-        if (not root_element) and node.tail and len(node.tail) > 0:
-            self._handler.characters(node.tail)
-        if root_element:
-            self._handler.end_document()
-            for rv in self._handler.pop_matches():
-                yield rv
+                            attrib[_unicode("xmlns")] = v
+
+        self._handler.start_element(tag, attrib)
+        if node.text and len(node.text) > 0:
+            self._handler.characters(node.text)
+        return (tag, local_nsdict, nsmap)
 
     def __call__(self, etree_root, **kwargs):
         """See the class documentation."""
@@ -403,10 +446,14 @@ class EtreeParser(object):
         # generator (which should be just a single instance), and
         # return the item left over at the end.
         if self._kwargs.get("generator", False):
+            if self._suspend_gc:
+                return _gc_suspended_iter(child_iter)
             return child_iter
         else:
-            for _ in child_iter:
-                pass
+            with _gc_suspended(self._suspend_gc):
+                for _ in child_iter:
+                    pass
+            _gc_freeze(self._freeze_gc)
             return self._handler.item
 
 def parse_etree(etree_root, **kwargs):
@@ -11,10 +11,16 @@ from __future__ import absolute_import
 from . import _node_refs, OrderedDict, pprint, _unicode
 from . import _XMLCDATAPlaceholder, _XMLDictPlaceholder
 from ._basenode import _common_docstring, _docstring_fixup, XMLNodeBase
+from ._basenode import _node_slots, _empty_xml_attrs
 
 __all__ = ['XMLListNode']
 
+# The built-in list type, for use in the body of XMLListNode, which
+# defines a list() method.
+_list = list
+
 XMLCDATANode = _XMLCDATAPlaceholder
+XMLMutableCDATANode = _XMLCDATAPlaceholder
 XMLDictNode = _XMLDictPlaceholder
 def _resolve_references_once():
     """Internal function to resolve late references.
@@ -30,9 +36,11 @@ def _resolve_references_once():
     # pylint: disable=global-statement
     # pylint: disable=invalid-name
     global XMLCDATANode
+    global XMLMutableCDATANode
     global XMLDictNode
     global _resolve_references
     XMLCDATANode = _node_refs['XMLCDATANode']
+    XMLMutableCDATANode = _node_refs['XMLMutableCDATANode']
     XMLDictNode = _node_refs['XMLDictNode']
     _resolve_references = lambda: None
 
@@ -46,7 +54,7 @@ def _get_dict_value_iter(arg, descr="node"):
         except AttributeError:
             # Python 3
             return arg.values()
-    elif isinstance(arg, XMLCDATANode):
+    elif isinstance(arg, (XMLCDATANode, XMLMutableCDATANode)):
         return [arg]
     else:
         raise TypeError("Unexpected type %s for %s" % (str(type(arg)), descr))
@@ -54,10 +62,23 @@ def _get_dict_value_iter(arg, descr="node"):
 class XMLListNode(XMLNodeBase, list):
     """(docstring to be replaced by __doc__)"""
     __doc__ = _common_docstring("XMLListNode")
+    __slots__ = _node_slots(_list, 'text')
     def __new__(cls, *args, **kwargs):
         _resolve_references()
         return super(XMLListNode, cls).__new__(cls, *args, **kwargs)
 
+    @classmethod
+    def _new_fast(cls, nodes, tag, key, parent=None):
+        # Create a list of existing nodes without the argument
+        # processing done by __new__() and __init__(). The nodes must
+        # already be XMLNodeBase objects; the caller is responsible for
+        # updating their parent references.
+        _resolve_references()
+        node = list.__new__(cls)
+        list.__init__(node, nodes)
+        node._init_fast(tag, key, parent, _empty_xml_attrs, _unicode()) # pylint: disable=protected-access
+        return node
+
     def add_node(self, *args, **kwargs): # pylint: disable=unused-argument
         """Add an XML node to the XML tree.
 
@@ -166,7 +187,7 @@ class XMLListNode(XMLNodeBase, list):
                         # The grandchild might be a list.
                         for item in grandchild.list():
                             newkey = key_check.eval_key(
-                                list(item.xml_attrs.keys()),
+                                list(item._xml_attrs.keys()), # pylint: disable=protected-access
                                 item.get_cdata().strip()
                             )
                             if newkey is not None:
@@ -247,6 +268,7 @@ class XMLListNode(XMLNodeBase, list):
                     node.tag = self.tag
                 node.key = self.key
                 node.parent = self
+                node._index_hint = idx # pylint: disable=protected-access
                 if deep:
                     node.standardize(deep=deep)
 
@@ -8,9 +8,14 @@
 """Module that provides XML parsing."""
 from __future__ import absolute_import
 
+import mmap
+import numbers
+import sys
 from xml.parsers import expat
-from . import parser_defaults, parsing_increment, StringIO, _unicode
-from ._parsehandler import _DictSAXHandler
+from . import parser_defaults, StringIO, _unicode
+from ._parsehandler import _make_parser_handler, _gc_suspended
+from ._parsehandler import _gc_suspended_iter, _gc_freeze
+from ._lxmlbackend import _lxml_expat_module
 try: # pragma no cover
     from io import BytesIO # pylint: disable=wrong-import-order
 except ImportError: # pragma no cover
@@ -20,7 +25,495 @@ try:  # pragma no cover
 except NameError:  # pragma no cover
     _bytes = str
 
-__all__ = ['Parser', 'parse']
+__all__ = ['Parser', 'PushParser', 'FramedPushParser', 'parse']
+
+def _is_empty_document_error(err, handler):
+    # Determine whether the only error was parsing an empty document.
+    # In that case, the caller ignores the error and returns the empty
+    # dictionary.
+    return (hasattr(expat, "errors") and
+            hasattr(expat.errors, "XML_ERROR_NO_ELEMENTS") and
+            str(err).startswith(expat.errors.XML_ERROR_NO_ELEMENTS + ":") and
+            not handler.processing_started)
+
+# The largest chunk the adaptive chunk size grows to.
+_max_adaptive_chunk_size = 65536
+
+class _ChunkSizer(object):
+    # Chooses the number of bytes to read for each chunk the parser
+    # processes in generator mode. A fixed size is used as is. The
+    # adaptive size starts at jxmlease.parsing_increment, doubles
+    # (up to _max_adaptive_chunk_size) after each chunk which produces
+    # no matches, and halves (down to the starting size) after each
+    # chunk which does.
+    def __init__(self, chunk_size):
+        self.adaptive = (chunk_size == 'adaptive')
+        if chunk_size is None or self.adaptive:
+            # Read the package's value now, so changes to it take effect.
+            chunk_size = sys.modules[__package__].parsing_increment
+        self.size = chunk_size
+        self.min_size = chunk_size
+        self.max_size = max(chunk_size, _max_adaptive_chunk_size)
+
+    def update(self, matched):
+        """Adjust the size after a chunk, based on whether it matched."""
+        if not self.adaptive:
+            return
+        if matched:
+            self.size = max(self.min_size, self.size // 2)
+        else:
+            self.size = min(self.max_size, self.size * 2)
+
+def _backend_expat_module(backend, expat_module, huge_tree):
+    # Return the expat (or equivalent) module to use for the backend.
+    if backend == 'expat':
+        return expat_module
+    if backend == 'lxml':
+        if expat_module is not expat:
+            raise ValueError("The 'expat' argument cannot be combined with "
+                             "the 'lxml' backend")
+        return _lxml_expat_module(huge_tree)
+    raise ValueError("'backend' argument must be 'expat' or 'lxml', not %r"
+                     % (backend,))
+
+def _check_chunk_size(chunk_size):
+    # Validate the chunk_size argument.
+    if chunk_size is None or chunk_size == 'adaptive':
+        return
+    if (isinstance(chunk_size, bool) or
+            not isinstance(chunk_size, numbers.Integral) or
+            chunk_size <= 0):
+        raise ValueError("'chunk_size' argument must be a positive "
+                         "integer, 'adaptive' or None, not %r"
+                         % (chunk_size,))
+
+class _MappedFile(object):
+    # A file-like object for a file mapped into memory. The read()
+    # method returns memoryview slices of the mapping, which expat
+    # accepts without copying them.
+    def __init__(self, fileobj):
+        self._mmap = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._mmap)
+        self._pos = 0
+        # The last slice returned by read(). It is released by close(),
+        # as the mapping cannot be closed while it exists.
+        self._last = None
+
+    def read(self, size):
+        """Return the next (up to) size bytes of the file."""
+        if self._last is not None:
+            self._last.release()
+        self._last = self.data[self._pos:self._pos + size]
+        self._pos += len(self._last)
+        return self._last
+
+    def close(self):
+        """Release the mapping."""
+        if self._last is not None:
+            self._last.release()
+        self.data.release()
+        self._mmap.close()
+
+def _map_file(fileobj):
+    # Return a _MappedFile for the file object, or None if it cannot be
+    # mapped (for example, because it is a pipe, an in-memory stream or
+    # an empty file).
+    if not hasattr(memoryview, 'release'): # pragma no cover
+        # Python 2's expat does not accept memoryview objects.
+        return None
+    try:
+        return _MappedFile(fileobj)
+    except (AttributeError, ValueError, EnvironmentError, mmap.error):
+        return None
+
+class PushParser(object):
+    """Incrementally parses XML data as it is pushed to it.
+
+    Instances of this class are returned by the :py:meth:`Parser.push_parser`
+    method. Rather than reading the document from a string or file-like
+    object, the caller supplies the document in pieces, as it receives
+    them, by calling the :py:meth:`feed` method. When the whole document
+    has been supplied, the caller calls the :py:meth:`close` method.
+
+    For example::
+
+        >>> push = Parser(generator=["/a/b"]).push_parser()
+        >>> push.feed("<a><b>1</b><b>")
+        [(u'/a/b', '/a/b', XMLCDATANode(xml_attrs=OrderedDict(), value=u'1'))]
+        >>> push.feed("2</b></a>")
+        [(u'/a/b', '/a/b', XMLCDATANode(xml_attrs=OrderedDict(), value=u'2'))]
+        >>> push.close()
+        []
+
+    The parsing options (including the :py:obj:`generator` match paths)
+    are those of the :py:class:`Parser` that created the object, updated
+    with any arguments given to :py:meth:`Parser.push_parser`.
+    """
+
+    def __init__(self, parser, handler, generator=False, suspend_gc=False,
+                 freeze_gc=False):
+        """See the class documentation."""
+        self._parser = parser
+        self._handler = handler
+        self._generator = generator
+        self._suspend_gc = suspend_gc
+        self._freeze_gc = freeze_gc
+
+    def feed(self, data):
+        """Parse the next piece of the document.
+
+        Args:
+            data (string or bytes): The next piece of the XML document.
+
+        Returns:
+            A list of the matches completed by this piece of the document.
+            Each match is a tuple of ``(path,match_string,xml_node)``, as
+            returned by a :py:class:`Parser` used as a generator. If the
+            parser is not running in generator mode, the list is always
+            empty.
+
+        Raises:
+            :py:exc:`xml.parsers.expat.ExpatError`: If the data is not
+                well-formed XML.
+        """
+        with _gc_suspended(self._suspend_gc):
+            self._parser.Parse(data, False)
+        return self._handler.pop_matches()
+
+    def close(self):
+        """Finish parsing the document.
+
+        Returns:
+            If the parser is running in generator mode, a list of the
+            remaining matches. Otherwise, an :py:class:`XMLDictNode`
+            containing the parsed XML tree.
+
+        Raises:
+            :py:exc:`xml.parsers.expat.ExpatError`: If the document is
+                not complete, well-formed XML.
+        """
+        with _gc_suspended(self._suspend_gc):
+            try:
+                self._parser.Parse(_bytes(), True)
+            except expat.ExpatError as e:
+                if not _is_empty_document_error(e, self._handler):
+                    raise
+            self._handler.end_document()
+        if self._generator:
+            return self._handler.pop_matches()
+        _gc_freeze(self._freeze_gc)
+        return self._handler.item
+
+# The delimiter which ends each message in NETCONF 1.0 framing.
+_eom_delimiter = b']]>]]>'
+
+# The longest valid chunk header in RFC 6242 chunked framing
+# ("\n#4294967295\n").
+_max_chunk_header = 13
+
+_whitespace = frozenset(b' \t\r\n')
+
+if hasattr(memoryview, 'release'):
+    _view = memoryview
+else: # pragma no cover
+    # Python 2's expat does not accept memoryview objects, so pass it
+    # slices of the data instead.
+    def _view(data):
+        return data
+
+class _EOMFramer(object):
+    # Splits a NETCONF 1.0 stream into messages, which end with the
+    # ]]>]]> delimiter. Each piece of data is only searched once. The
+    # data between delimiters is passed on as slices of the input. Only a
+    # partial delimiter at the end of a piece of data (at most five bytes)
+    # is held back until the next piece arrives.
+    def __init__(self):
+        self.held = _bytes()
+
+    def feed(self, data, data_cb, end_cb):
+        """Split the next piece of the stream.
+
+        Call data_cb() with each part of a message, and end_cb() at the
+        end of each message.
+        """
+        delim_len = len(_eom_delimiter)
+        start = 0
+        if self.held:
+            # See if the held bytes begin a delimiter.
+            window = self.held + _bytes(data[:delim_len - 1])
+            i = window.find(_eom_delimiter)
+            if i >= 0:
+                if i > 0:
+                    data_cb(window[:i])
+                end_cb()
+                start = i + delim_len - len(self.held)
+                self.held = _bytes()
+            elif len(data) < delim_len - 1:
+                # The window is all the data we have. Hold back the part
+                # that could still begin a delimiter.
+                self.held = _bytes()
+                self._hold(window, 0, data_cb)
+                return
+            else:
+                data_cb(self.held)
+                self.held = _bytes()
+        view = _view(data)
+        while True:
+            i = data.find(_eom_delimiter, start)
+            if i < 0:
+                break
+            if i > start:
+                data_cb(view[start:i])
+            end_cb()
+            start = i + delim_len
+        self._hold(data, start, data_cb, view)
+
+    def _hold(self, data, start, data_cb, view=None):
+        # Pass on data[start:], except for a (possible) partial delimiter
+        # at the end, which is held back.
+        if view is None:
+            view = data
+        end = len(data)
+        for length in range(min(len(_eom_delimiter) - 1, end - start), 0,
+                            -1):
+            if data.endswith(_eom_delimiter[:length]):
+                end -= length
+                self.held = _bytes(data[end:])
+                break
+        if end > start:
+            data_cb(view[start:end])
+
+    def close(self, data_cb):
+        """Pass on any data held back at the end of the stream."""
+        if self.held:
+            data_cb(self.held)
+            self.held = _bytes()
+
+class _ChunkedFramer(object):
+    # Decodes RFC 6242 chunked framing. A message is a series of chunks,
+    # each of which is a "\n#<size>\n" header followed by <size> bytes
+    # of data, and ends with "\n##\n". The chunk data is passed on as
+    # slices of the input.
+    def __init__(self):
+        # The number of bytes of the current chunk still to come.
+        self.remaining = 0
+        # A partial chunk header.
+        self.header = _bytes()
+
+    def feed(self, data, data_cb, end_cb):
+        """Decode the next piece of the stream.
+
+        Call data_cb() with each part of a message, and end_cb() at the
+        end of each message.
+        """
+        view = _view(data)
+        pos = 0
+        length = len(data)
+        while pos < length:
+            if self.remaining:
+                end = min(length, pos + self.remaining)
+                data_cb(view[pos:end])
+                self.remaining -= end - pos
+                pos = end
+                continue
+            # The header ends at the second LF.
+            if self.header:
+                end = data.find(b'\n', pos)
+            else:
+                end = data.find(b'\n', pos + 1)
+            if end < 0:
+                self.header += _bytes(data[pos:])
+                self._check_header(complete=False)
+                return
+            self.header += _bytes(data[pos:end + 1])
+            pos = end + 1
+            if self.header == b'\n##\n':
+                end_cb()
+            else:
+                self._check_header(complete=True)
+                self.remaining = int(self.header[2:-1])
+            self.header = _bytes()
+
+    def _check_header(self, complete):
+        # Raise an error if the header is not valid (or, if it is not
+        # complete, cannot become valid).
+        header = self.header
+        if complete:
+            size = header[2:-1]
+            valid = (header[:2] == b'\n#' and size.isdigit() and
+                     size[:1] != b'0' and int(size) <= 4294967295)
+        else:
+            valid = (b'\n#'.startswith(header[:2]) and
+                     len(header) < _max_chunk_header and
+                     (header[2:] == b'#' or header[2:].isdigit() or
+                      len(header) <= 2))
+        if not valid:
+            raise ValueError("Invalid chunk header in chunked framing: %r"
+                             % (header,))
+
+    def close(self, data_cb): # pylint: disable=unused-argument
+        """Check that the stream did not end in the middle of a chunk."""
+        if self.remaining or self.header:
+            raise ValueError("Chunked framing ended in the middle of a "
+                             "chunk")
+
+class FramedPushParser(object):
+    """Incrementally parses a stream of framed XML documents.
+
+    Instances of this class are returned by the
+    :py:meth:`Parser.framed_push_parser` method. The caller supplies the
+    stream in pieces, as it receives them, by calling the :py:meth:`feed`
+    method. The stream contains a series of XML documents (for example,
+    the ``<rpc-reply>`` messages of a NETCONF session), separated by one
+    of these framing methods:
+
+    * 'eom': Each document ends with the ``]]>]]>`` delimiter, as in
+      NETCONF 1.0.
+    * 'chunked': The chunked framing defined by RFC 6242 (NETCONF 1.1).
+
+    The object splits the stream into documents without copying it and
+    parses each document as it arrives. All the documents use the parsing
+    options of the :py:class:`Parser` that created the object. The
+    handler for those options is created once and reused for each
+    document. Whitespace between documents is ignored.
+
+    For example::
+
+        >>> push = Parser().framed_push_parser()
+        >>> push.feed(b"<a>1</a>]]>]]> <a>")
+        [XMLDictNode(xml_attrs=OrderedDict(), value=OrderedDict([(u'a',
+            XMLCDATANode(xml_attrs=OrderedDict(), value=u'1'))]))]
+        >>> push.feed(b"2</a>]]>]]>")
+        [XMLDictNode(xml_attrs=OrderedDict(), value=OrderedDict([(u'a',
+            XMLCDATANode(xml_attrs=OrderedDict(), value=u'2'))]))]
+        >>> push.close()
+        []
+    """
+
+    def __init__(self, make_parser, handler, framing="eom",
+                 generator=False, suspend_gc=False, freeze_gc=False):
+        """See the class documentation."""
+        if framing == "eom":
+            self._framer = _EOMFramer()
+        elif framing == "chunked":
+            self._framer = _ChunkedFramer()
+        else:
+            raise ValueError("'framing' argument must be 'eom' or "
+                             "'chunked', not %r" % (framing,))
+        self._make_parser = make_parser
+        self._handler = handler
+        self._generator = generator
+        self._suspend_gc = suspend_gc
+        self._freeze_gc = freeze_gc
+        # The PushParser for the current document, if it has started.
+        self._push = None
+        self._results = []
+
+    def _data(self, data):
+        # Parse part of a document.
+        if self._push is None:
+            # Skip whitespace between documents.
+            start = 0
+            while start < len(data) and data[start] in _whitespace:
+                start += 1
+            if start == len(data):
+                return
+            if start > 0:
+                data = data[start:]
+            self._handler.reset()
+            self._push = PushParser(self._make_parser(self._handler),
+                                    self._handler, self._generator,
+                                    self._suspend_gc, self._freeze_gc)
+        self._results.extend(self._push.feed(data))
+
+    def _end(self):
+        # Finish a document. (A document which only contained whitespace
+        # is ignored.)
+        if self._push is None:
+            return
+        push = self._push
+        self._push = None
+        if self._generator:
+            self._results.extend(push.close())
+        else:
+            self._results.append(push.close())
+
+    def _pop_results(self):
+        rv = self._results
+        self._results = []
+        return rv
+
+    def feed(self, data):
+        """Parse the next piece of the stream.
+
+        Args:
+            data (bytes): The next piece of the stream.
+
+        Returns:
+            A list of the results of the documents (or parts of
+            documents) completed by this piece of the stream. If the
+            parser is running in generator mode, this is a list of
+            matches. Each match is a tuple of
+            ``(path,match_string,xml_node)``, as returned by a
+            :py:class:`Parser` used as a generator. Otherwise, this is a
+            list of :py:class:`XMLDictNode` objects, each containing the
+            parsed XML tree of a document.
+
+        Raises:
+            :py:exc:`xml.parsers.expat.ExpatError`: If a document is not
+                well-formed XML.
+            :py:exc:`ValueError`: If the framing is not valid.
+        """
+        self._framer.feed(data, self._data, self._end)
+        return self._pop_results()
+
+    def close(self):
+        """Finish parsing the stream.
+
+        If the stream ends with a document which is not followed by the
+        end-of-message delimiter, that document is parsed as if the
+        delimiter were present.
+
+        Returns:
+            A list of the remaining results, as returned by the
+            :py:meth:`feed` method.
+
+        Raises:
+            :py:exc:`xml.parsers.expat.ExpatError`: If the last document
+                is not complete, well-formed XML.
+            :py:exc:`ValueError`: If the stream ended in the middle of a
+                chunk.
+        """
+        self._framer.close(self._data)
+        self._end()
+        return self._pop_results()
+
+def _parse_framed(stream, push, sizer):
+    # Feed the data from the stream to a FramedPushParser, and yield the
+    # results. The sizer sets the amount read from a file at a time.
+    to_close = []
+    if hasattr(stream, '__fspath__'):
+        stream = open(stream, 'rb')
+        to_close.append(stream)
+    try:
+        if isinstance(stream, (_bytes, bytearray)):
+            pieces = [stream]
+        elif hasattr(stream, 'read'):
+            pieces = iter(lambda: stream.read(sizer.size), _bytes())
+        else:
+            pieces = stream
+        for data in pieces:
+            if not data:
+                break
+            results = push.feed(data)
+            sizer.update(len(results) > 0)
+            for rv in results:
+                yield rv
+        for rv in push.close():
+            yield rv
+    finally:
+        for obj in to_close:
+            obj.close()
 
 class Parser(object):
     """Creates Python data structures from raw XML.
@@ -91,6 +584,29 @@ class Parser(object):
     In this example, ``/a/b/c``, ``c``, ``b/c``, and ``a/b/c`` all match the
     ``<c>`` node.
 
+    Paths may also use a subset of XPath that can be evaluated while the
+    document is streamed:
+
+    * ``//`` matches any number of intermediate levels. For example,
+      ``/a//c`` and ``//c`` both match the ``<c>`` node above.
+    * ``*`` matches any tag. For example, ``/a/*/c`` matches the ``<c>``
+      node above.
+    * The last step of a path may have one or more predicates in square
+      brackets. ``[@attr]`` requires the node to have the XML attribute
+      ``attr``, and ``[@attr='value']`` requires the attribute to have the
+      given value. ``[child]`` requires the node to have a child node with
+      the tag ``child``, and ``[child='value']`` requires one of those
+      child nodes to have the given CDATA. For example,
+      ``//interface[name='ge-0/0/0']`` matches only the ``<interface>``
+      node whose ``<name>`` is ``ge-0/0/0``.
+
+    Predicates are checked when the matching element ends, against the
+    node the parser built. Therefore, they see the names the parser
+    produced after applying the namespace options, and attribute
+    predicates never match if :py:obj:`xml_attribs` is False. If a node
+    does not satisfy a path's predicates, the parser tries the remaining
+    paths.
+
     For each match, the generator returns a tuple of:
     ``(path,match_string,xml_node)``, where the *path* is
     the calculated absolute path to the matching node, *match_string* is the
@@ -109,17 +625,45 @@ class Parser(object):
         /a/b: 2
         /a/b: 3
 
+    When the :py:obj:`namespaces`, :py:obj:`strip_namespace`,
+    :py:obj:`generator`, :py:obj:`exclude`, and :py:obj:`project`
+    parameters are not used and :py:obj:`xml_attribs` is True, the parser
+    uses a specialized event handler that skips the per-element namespace,
+    matching, and filtering checks. The resulting data structures are
+    identical; only the time spent handling parser events changes. Using
+    any of those parameters selects the general handler.
+
     When calling the parser, you can specify all of these parameters. When
     creating a parsing instance, you can specify all of these parameters
     except :py:obj:`xml_input`:
 
     Args:
 	xml_input (stirng or file-like object): Contains the XML to parse.
+            A path object (such as a :py:class:`pathlib.Path`) names a
+            file that contains the XML to parse. (A string is always
+            treated as XML.)
 	encoding (string or None): The input's encoding. If not provided, this
             defaults to 'utf-8'.
         expat (An expat, or equivalent, parser class): Used for parsing the XML
             input. If not provided, defaults to the expat parser in
             :py:data:`xml.parsers`.
+        backend (string): The parser which tokenizes the XML input:
+            'expat' (the default) uses the :py:obj:`expat` parser, and
+            'lxml' uses lxml's parser (which must be installed). lxml
+            may parse large inputs somewhat faster, but building the
+            nodes usually takes most of the time, and each lxml parser
+            costs more to create, so it is slower for small documents.
+            Measure with your own data before choosing it. Both produce
+            the same data structures, with two exceptions: the lxml
+            parser does not expand entities declared in a DTD, and it
+            cannot recover a namespace prefix that is not declared or
+            that shares its namespace with another prefix in scope.
+            Errors are raised as :py:exc:`xml.parsers.expat.ExpatError`
+            exceptions, although the messages differ.
+        huge_tree (bool): If True and :py:obj:`backend` is 'lxml', disable
+            lxml's security limits on the depth of the tree and the size
+            of text nodes. Only use this with trusted input. (Default:
+            False)
         process_namespaces (bool): If True, namespaces in tags and attributes
             are converted to their full URL value. If False (the default), the
             namespaces in tags and attributes are left unchanged.
@@ -151,6 +695,122 @@ class Parser(object):
             returns a :py:obj:`generator` object. On each call to the
             :py:obj:`generator` object, it will return the next node that
             matches one of the provided paths.
+        release_matches (bool): If True, each node returned by the
+            :py:obj:`generator` is removed from its parent node as soon
+            as it matches, and its :py:obj:`parent` attribute is set to
+            None. This lets the parser process a long stream of matching
+            nodes in memory proportional to the size of a single match,
+            rather than the size of the document. Because of this, a
+            node that matches one path will not appear in the nodes
+            returned for matches of its ancestors. If False (the
+            default), matching nodes are left in the tree.
+        exclude (list of strings): A list of paths to exclude from the
+            results. The paths use the same syntax as the
+            :py:obj:`generator` paths, except that predicates may only test
+            XML attributes (for example, ``//interface[@type='ethernet']``).
+            When an element matches one of these paths, the parser skips
+            that element and everything it contains, without creating
+            nodes for them. Excluded elements never match a
+            :py:obj:`generator` path.
+        project (list of strings): A list of paths to keep in the
+            results. The paths use the same syntax as the :py:obj:`exclude`
+            paths. If this is supplied, the parser only creates nodes for
+            elements that match one of these paths (along with everything
+            they contain) and for their ancestors. All other elements are
+            dropped. For example, ``project=["//physical-interface/name"]``
+            returns a tree which only contains the ``<name>`` nodes of
+            each ``<physical-interface>`` node, and the nodes above them.
+            Dropped elements never match a :py:obj:`generator` path.
+        intern (bool or dict): If True, the parser keeps a table of the
+            tag and attribute names it has seen and reuses a single string
+            object for each of them, both within a document and across
+            documents parsed by the same :py:class:`Parser` object. This
+            reduces the memory used by large results and speeds up
+            dictionary lookups on them. If a :py:obj:`dict` is supplied,
+            it is used as the table, which lets several parsers share it.
+            If False (the default), names are not interned.
+        intern_values (bool): If True and :py:obj:`intern` is set, XML
+            attribute values are interned in the same table. This saves
+            memory when a small set of values repeats many times, but the
+            table grows with every distinct value, so it should not be
+            used when the values are mostly unique (for example,
+            timestamps). CDATA is not interned, because each CDATA node is
+            its own string object. (Default: False)
+        parent_links (string): How each node refers to its parent node.
+            If 'strong' (the default), the :py:obj:`parent` attribute
+            holds a normal reference. Because parents also refer to their
+            children, the tree then contains reference cycles, and it is
+            only freed when Python's cyclic garbage collector runs. If
+            'weak', the parser stores weak references instead, so a tree
+            is freed as soon as the last reference to it is dropped. The
+            :py:obj:`parent` attribute returns None once the parent node
+            has been freed, so keep a reference to the root while working
+            with the tree. If 'none', the parser does not record parent
+            nodes at all. This suits read-only trees, but methods that
+            change a node in its parent (such as
+            :py:meth:`XMLCDATANode.set_cdata`) cannot update the tree.
+            Nodes added to the tree after parsing always have strong
+            parent references.
+        mutable_cdata (bool): If True, elements which only contain CDATA
+            are returned as :py:class:`XMLMutableCDATANode` objects, rather
+            than :py:class:`XMLCDATANode` objects. Their text can be
+            changed in place (for example, with
+            :py:meth:`set_cdata <XMLNodeBase.set_cdata>`), which is much
+            faster than replacing the node in its parent when a program
+            changes many values. The nodes compare and hash like their
+            text, but they are not :py:obj:`str` instances.
+            (Default: False)
+        lazy (bool): If True, the parser does not build the tree while it
+            parses the document. Instead, it records the elements, their
+            XML attributes and their CDATA in compact arrays, and returns
+            a root :py:class:`XMLDictNode` which builds its children
+            the first time they are used. Each child
+            :py:class:`XMLDictNode` does the same. This makes parsing
+            faster and a parsed tree much smaller when only a small part
+            of a large document is used. Once built, the nodes are the
+            same as those the parser normally returns. (On Python 2,
+            :py:obj:`dict` copies a dictionary's contents without calling
+            its methods. Call :py:meth:`standardize
+            <XMLNodeBase.standardize>` on the root to build the whole
+            tree before copying a node that way.) This cannot be combined
+            with the :py:obj:`generator`, :py:obj:`exclude` or
+            :py:obj:`project` parameters.
+            (Default: False)
+        suspend_gc (bool): If True, the cyclic garbage collector is
+            disabled while the parser builds the tree, so it does not
+            repeatedly scan the growing tree. The collector's previous
+            state is restored when parsing finishes, even if it fails.
+            When the parser is used as a :py:obj:`generator`, the
+            collector is only disabled while the parser works on the
+            next match, not while the caller handles it. (Default: False)
+        freeze_gc (bool): If True, :py:func:`gc.freeze` is called after a
+            tree is built. This moves every object the garbage collector
+            currently tracks (including the new tree) into a permanent
+            generation that later collections skip. Use this for large,
+            long-lived trees. Note that frozen objects which become
+            garbage are only freed by the collector after
+            :py:func:`gc.unfreeze` is called. This has no effect in
+            :py:obj:`generator` mode or on Python versions before 3.7.
+            (Default: False)
+        chunk_size (int or string): The number of bytes (or, for text
+            input, characters) the parser reads and parses at a time when
+            it is used as a :py:obj:`generator`. Larger chunks parse large
+            inputs faster, while smaller chunks return the first matches
+            sooner from slow streams. If 'adaptive', the parser starts
+            with :py:data:`jxmlease.parsing_increment` bytes, doubles the
+            chunk size (up to 64 KiB) after each chunk that produces no
+            matches, and halves it (down to the starting size) after each
+            chunk that does. If None (the default), the parser uses the
+            value of :py:data:`jxmlease.parsing_increment` (1 KiB, unless
+            it has been changed) when parsing starts.
+        use_mmap (bool): If True and :py:obj:`xml_input` is a path or a
+            file object for a regular file, the parser maps the file into
+            memory and passes the mapped data to expat without copying
+            it, rather than reading the file into a series of new
+            :py:obj:`bytes` objects. The parser always reads from the
+            start of the file. If the file cannot be mapped (for example,
+            because it is a pipe or an in-memory stream), the parser
+            reads it normally. (Default: False)
 
     Returns:
         A callable instance of the :py:class:`Parser` class.
@@ -167,8 +827,11 @@ class Parser(object):
         """See class documentation."""
         # Populate a dictionary with default arguments.
         self._default_kwargs = dict(encoding=None, expat=expat,
+                                    backend='expat', huge_tree=False,
                                     process_namespaces=False,
-                                    namespace_separator=":")
+                                    namespace_separator=":",
+                                    suspend_gc=False, freeze_gc=False,
+                                    use_mmap=False, chunk_size=None)
 
         # Update the dictionary with user-provided defaults.
         self._default_kwargs.update(parser_defaults)
@@ -177,6 +840,12 @@ class Parser(object):
         # the arguments for later use.
         self._default_kwargs.update(kwargs)
 
+        # Initialize the cache of compiled generator match strings.
+        self._automata = {}
+
+        # Initialize the interning table used when intern is True.
+        self._intern_table = {}
+
         # Process the arguments.
         self._process_args()
 
@@ -204,38 +873,64 @@ class Parser(object):
         # Pop off and save the arguments that we don't want to pass to
         # the handler class.
         self._encoding = self._kwargs.pop('encoding')
-        self._expat = self._kwargs.pop('expat')
+        self._expat = _backend_expat_module(self._kwargs.pop('backend'),
+                                            self._kwargs.pop('expat'),
+                                            self._kwargs.pop('huge_tree'))
         self._process_namespaces = self._kwargs.pop('process_namespaces')
+        self._suspend_gc = self._kwargs.pop('suspend_gc')
+        self._freeze_gc = self._kwargs.pop('freeze_gc')
+        self._use_mmap = self._kwargs.pop('use_mmap')
+        self._chunk_size = self._kwargs.pop('chunk_size')
+        _check_chunk_size(self._chunk_size)
 
     def _make_handler(self):
-        # pylint: disable=unexpected-keyword-arg
-        self._handler = _DictSAXHandler(**self._kwargs)
+        self._handler = _make_parser_handler(self._kwargs, self._automata,
+                                             self._intern_table)
 
     def _make_parser(self):
+        self._parser = self._expat_factory()(self._handler)
+
+    def _expat_factory(self):
+        # Return a function which creates an expat parser that sends its
+        # events to a handler. The function uses the current arguments,
+        # even if they change later.
+        expat_module = self._expat
+        encoding = self._encoding
         # We don't need a namespace separator if we're not processing
         # namespaces.
         if not self._process_namespaces:
             namespace_separator = None
         else:
             namespace_separator = self._kwargs['namespace_separator']
-        self._parser = self._expat.ParserCreate(
-            self._encoding, namespace_separator
-        )
 
-        # Setup some parser attributes
-        self._parser.buffer_text = True
-        try:
-            self._parser.ordered_attributes = True
-        except AttributeError: # pragma no cover
-            # Jython's expat does not support ordered_attributes
-            pass
+        def make_parser(handler):
+            """Create an expat parser for the handler."""
+            if handler.intern is not None:
+                # Let expat intern the names it reports in the same table.
+                parser = expat_module.ParserCreate(
+                    encoding, namespace_separator, intern=handler.intern
+                )
+            else:
+                parser = expat_module.ParserCreate(
+                    encoding, namespace_separator
+                )
 
-        # Assign the handler methods to the parser
-        self._parser.StartElementHandler = self._handler.start_element
-        self._parser.EndElementHandler = self._handler.end_element
-        self._parser.CharacterDataHandler = self._handler.characters
+            # Setup some parser attributes
+            parser.buffer_text = True
+            try:
+                parser.ordered_attributes = True
+            except AttributeError: # pragma no cover
+                # Jython's expat does not support ordered_attributes
+                pass
+
+            # Assign the handler methods to the parser
+            parser.StartElementHandler = handler.start_element
+            parser.EndElementHandler = handler.end_element
+            parser.CharacterDataHandler = handler.characters
+            return parser
+        return make_parser
 
-    def _parse_generator(self, xml_input):
+    def _parse_generator(self, xml_input, to_close=()):
         if isinstance(xml_input, (str, _unicode)):
             io_obj = StringIO(xml_input)
         elif isinstance(xml_input, _bytes):
@@ -243,32 +938,131 @@ class Parser(object):
         else:
             io_obj = xml_input
 
-        at_eof = False
-        while not at_eof:
-            buf = io_obj.read(parsing_increment)
-            if len(buf) == 0:
-                at_eof = True
-            try:
-                self._parser.Parse(buf, at_eof)
-            except expat.ExpatError as e:
-                # If the only error was parsing an empty document, ignore
-                # the error and return the empty dictionary.
-                raise_error = True
-                if (hasattr(expat, "errors") and
-                        hasattr(expat.errors, "XML_ERROR_NO_ELEMENTS") and
-                        str(e).startswith(expat.errors.XML_ERROR_NO_ELEMENTS + ":") and
-                        at_eof and
-                        not self._handler.processing_started):
-                    raise_error = False
-
-                # If needed, raise the error
-                if raise_error:
-                    raise
+        sizer = _ChunkSizer(self._chunk_size)
+        try:
+            at_eof = False
+            while not at_eof:
+                buf = io_obj.read(sizer.size)
+                if len(buf) == 0:
+                    at_eof = True
+                try:
+                    self._parser.Parse(buf, at_eof)
+                except expat.ExpatError as e:
+                    if not (at_eof and
+                            _is_empty_document_error(e, self._handler)):
+                        raise
 
-            if at_eof:
-                self._handler.end_document()
-            for rv in self._handler.pop_matches():
-                yield rv
+                if at_eof:
+                    self._handler.end_document()
+                matches = self._handler.pop_matches()
+                sizer.update(len(matches) > 0)
+                for rv in matches:
+                    yield rv
+        finally:
+            for obj in to_close:
+                obj.close()
+
+    def push_parser(self, **kwargs):
+        """Create a :py:class:`PushParser` for one document.
+
+        The returned object parses a document that is supplied in pieces
+        through its :py:meth:`PushParser.feed` method, rather than read
+        from a string or file-like object. This is useful when the data
+        arrives through callbacks (for example, from a network socket).
+
+        The :py:class:`PushParser` uses the same handler logic as the
+        :py:class:`Parser` object, so the resulting tree and matches are
+        the same as if the whole document had been passed to the
+        :py:class:`Parser` object.
+
+        Args:
+            Accepts the same keyword arguments you can supply when calling
+            the :py:class:`Parser` object. They override the defaults for
+            this document.
+
+        Returns:
+            A :py:class:`PushParser` object.
+        """
+        self._process_args(**kwargs)
+        self._make_handler()
+        self._make_parser()
+        rv = PushParser(self._parser, self._handler,
+                        bool(self._kwargs.get("generator", False)),
+                        self._suspend_gc, self._freeze_gc)
+        self._parser = None
+        self._handler = None
+        return rv
+
+    def framed_push_parser(self, framing="eom", **kwargs):
+        """Create a :py:class:`FramedPushParser` for a stream of documents.
+
+        The returned object parses a stream of framed XML documents (such
+        as the messages of a NETCONF session), which is supplied in pieces
+        through its :py:meth:`FramedPushParser.feed` method.
+
+        Args:
+            framing (string): The framing method: 'eom' for documents
+                which end with ``]]>]]>`` (NETCONF 1.0), or 'chunked' for
+                RFC 6242 chunked framing (NETCONF 1.1).
+            Also accepts the same keyword arguments you can supply when
+            calling the :py:class:`Parser` object. They override the
+            defaults for the documents in this stream.
+
+        Returns:
+            A :py:class:`FramedPushParser` object.
+
+        Raises:
+            :py:exc:`ValueError`: If the framing method is not valid.
+        """
+        self._process_args(**kwargs)
+        self._make_handler()
+        rv = FramedPushParser(self._expat_factory(), self._handler, framing,
+                              bool(self._kwargs.get("generator", False)),
+                              self._suspend_gc, self._freeze_gc)
+        self._handler = None
+        return rv
+
+    def parse_framed(self, stream, framing="eom", **kwargs):
+        """Parse a stream of framed XML documents.
+
+        This reads a stream that contains a series of framed XML documents
+        (such as the messages of a NETCONF session) and parses each one.
+        It returns a generator. If the :py:obj:`generator` parameter is
+        specified, the generator produces the matches of each document,
+        in the same way a :py:class:`Parser` used as a generator does.
+        Otherwise, it produces an :py:class:`XMLDictNode` containing the
+        parsed XML tree of each document.
+
+        For example::
+
+            >>> stream = b"<a>1</a>]]>]]> <a>2</a>]]>]]>"
+            >>> for root in Parser().parse_framed(stream):
+            ...   print(root["a"])
+            ...
+            1
+            2
+
+        Args:
+            stream (bytes, file-like object, path or iterable): The
+                stream. A file-like object is read (in pieces of
+                :py:obj:`chunk_size` bytes) until it returns no data. An
+                iterable (such as a list or a generator) supplies the
+                stream in pieces.
+            framing (string): The framing method: 'eom' for documents
+                which end with ``]]>]]>`` (NETCONF 1.0), or 'chunked' for
+                RFC 6242 chunked framing (NETCONF 1.1).
+            Also accepts the same keyword arguments you can supply when
+            calling the :py:class:`Parser` object, except
+            :py:obj:`use_mmap`, which is ignored.
+
+        Returns:
+            A generator, as described above.
+
+        Raises:
+            :py:exc:`ValueError`: If the framing method is not valid.
+        """
+        push = self.framed_push_parser(framing, **kwargs)
+        return _parse_framed(stream, push, _ChunkSizer(self._chunk_size))
 
     def __call__(self, xml_input, **kwargs):
         """See class documentation."""
@@ -294,28 +1088,42 @@ class Parser(object):
         # Create our parser.
         self._make_parser()
 
+        # Open a path, and map the file into memory if requested. We
+        # close anything we open (or map) when parsing finishes.
+        to_close = []
+        if hasattr(xml_input, '__fspath__'):
+            xml_input = open(xml_input, 'rb')
+            to_close.append(xml_input)
+        if self._use_mmap and not isinstance(xml_input,
+                                             (str, _unicode, _bytes)):
+            mapped = _map_file(xml_input)
+            if mapped is not None:
+                xml_input = mapped
+                to_close.insert(0, mapped)
+
         # Do the actual parsing.
         if self._kwargs.get("generator", False):
-            return self._parse_generator(xml_input)
+            if self._suspend_gc:
+                return _gc_suspended_iter(
+                    self._parse_generator(xml_input, to_close)
+                )
+            return self._parse_generator(xml_input, to_close)
         else:
-            try:
-                if isinstance(xml_input, (str, _unicode, _bytes)):
-                    self._parser.Parse(xml_input, True)
-                else:
-                    self._parser.ParseFile(xml_input)
-            except expat.ExpatError as e:
-                # If the only error was parsing an empty document, ignore
-                # the error and return the empty dictionary.
-                raise_error = True
-                if (hasattr(expat, "errors") and
-                        hasattr(expat.errors, "XML_ERROR_NO_ELEMENTS") and
-                        str(e).startswith(expat.errors.XML_ERROR_NO_ELEMENTS + ":") and
-                        not self._handler.processing_started):
-                    raise_error = False
-
-                # If needed, raise the error
-                if raise_error:
-                    raise
+            with _gc_suspended(self._suspend_gc):
+                try:
+                    if isinstance(xml_input, (str, _unicode, _bytes)):
+                        self._parser.Parse(xml_input, True)
+                    elif isinstance(xml_input, _MappedFile):
+                        self._parser.Parse(xml_input.data, True)
+                    else:
+                        self._parser.ParseFile(xml_input)
+                except expat.ExpatError as e:
+                    if not _is_empty_document_error(e, self._handler):
+                        raise
+                finally:
+                    for obj in to_close:
+                        obj.close()
+            _gc_freeze(self._freeze_gc)
 
         return self._handler.item
 
@@ -12,6 +12,7 @@ if __name__ == "__main__":
 
 from jxmlease import parse, Parser, parse_etree, EtreeParser, XMLDictNode, XMLListNode, XMLCDATANode
 from copy import deepcopy
+import pickle
 from types import GeneratorType
 import jxmlease
 import jxmlease.xmlparser
@@ -314,6 +315,313 @@ class XMLToObjTestCase(unittest.TestCase):
         self.assertEqual(self.parse(xml), dict(root=''))
         self.assertEqual(self.parse(xml, strip_whitespace=False), dict(root=' '))
 
+    def test_large_cdata(self):
+        value = "line &amp; more text\n" * 5000
+        xml = "<root><output>%s</output><b>x</b></root>" % value
+        xml = self.xmlTextToTestFormat(xml)
+        rv = self.parse(xml)
+        expected = value.replace("&amp;", "&").strip()
+        self.assertEqual(rv['root']['output'], expected)
+        self.assertIsInstance(rv['root']['output'], XMLCDATANode)
+        self.assertTrue(rv['root']['output'].parent is rv['root'])
+
+    def test_fast_handler_matches_general_handler(self):
+        xml = """<root a="1" b="2">
+                   <x>1</x>
+                   <x c="3">2</x>
+                   <y>text<z>3</z>more<z/>tail</y>
+                   <empty/>
+                 </root>"""
+        xml = self.xmlTextToTestFormat(xml)
+        handler_class = jxmlease._parsehandler._DictSAXHandler
+        parser = self.Parser()
+        parser._make_handler()
+        self.assertIsInstance(parser._handler,
+                              jxmlease._parsehandler._FastDictSAXHandler)
+        parser = self.Parser(project=["/root"])
+        parser._make_handler()
+        self.assertIs(type(parser._handler), handler_class)
+        fast = self.parse(xml, cdata_separator="|")
+        general = self.parse(xml, cdata_separator="|", project=["/root"])
+        self.assertEqual(fast, general)
+        self.assertEqual(fast.emit_xml(), general.emit_xml())
+        self.assertEqual(fast['root']['x'][1].get_xml_attrs(), {'c': '3'})
+        self.assertEqual(fast['root']['y'].get_cdata(), "text|more|tail")
+
+    def test_parent_links(self):
+        xml = '<a><b>1</b><b>2</b><c><d>x</d></c></a>'
+        xml = self.xmlTextToTestFormat(xml)
+        rv = self.parse(xml, parent_links="weak")
+        self.assertEqual(rv, {'a': {'b': ['1', '2'], 'c': {'d': 'x'}}})
+        self.assertTrue(rv['a'].parent is rv)
+        self.assertTrue(rv['a']['b'].parent is rv['a'])
+        self.assertTrue(rv['a']['b'][0].parent is rv['a']['b'])
+        self.assertTrue(rv['a']['c']['d'].parent is rv['a']['c'])
+        node = rv['a']['b'][1].set_cdata('3', return_node=True)
+        self.assertTrue(rv['a']['b'][1] is node)
+        self.assertEqual(rv['a']['b'], ['1', '3'])
+        # Without strong parent links, the tree is freed by reference
+        # counting alone.
+        import gc
+        import weakref
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            rv = self.parse(xml, parent_links="weak")
+            ref = weakref.ref(rv['a']['b'][0])
+            del rv
+            self.assertTrue(ref() is None)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        rv = self.parse(xml, parent_links="none")
+        self.assertTrue(rv['a'].parent is None)
+        self.assertTrue(rv['a']['b'][0].parent is None)
+        self.assertEqual(rv, {'a': {'b': ['1', '2'], 'c': {'d': 'x'}}})
+        self.assertRaises(ValueError, self.parse, xml, parent_links="other")
+
+    def test_mutable_cdata(self):
+        xml = '<a><b x="1">1</b><b>2</b><c><d>x</d></c></a>'
+        xml = self.xmlTextToTestFormat(xml)
+        rv = self.parse(xml, mutable_cdata=True)
+        self.assertEqual(rv, {'a': {'b': ['1', '2'], 'c': {'d': 'x'}}})
+        self.assertEqual(rv, self.parse(xml))
+        self.assertEqual(rv.emit_xml(), self.parse(xml).emit_xml())
+        node = rv['a']['b'][0]
+        self.assertIsInstance(node, jxmlease.XMLMutableCDATANode)
+        self.assertEqual(node.get_xml_attrs(), {'x': '1'})
+        self.assertEqual(hash(node), hash('1'))
+        # Changing the text does not replace the node.
+        rv['a']['b'].list()[0].set_cdata('3')
+        node.append_cdata('4')
+        self.assertTrue(rv['a']['b'][0] is node)
+        self.assertTrue(node.get_current_node() is node)
+        self.assertEqual(rv['a']['b'], ['34', '2'])
+        self.assertEqual(rv['a']['b'].dict(tags=['b']), {'34': '34', '2': '2'})
+        # Adding a child still converts the node to a dictionary.
+        rv['a']['c']['d'].add_node('e', text='y')
+        self.assertIsInstance(rv['a']['c']['d'], XMLDictNode)
+        self.assertEqual(rv['a']['c']['d'], {'e': 'y'})
+        self.assertEqual(rv['a']['c']['d'].get_cdata(), 'x')
+
+    def test_lazy(self):
+        xml = ('<a x="1"><b>1</b><b y="2">2</b><c>t<d><e>x</e></d>u</c>'
+               '<f/><c><d>y</d></c></a>')
+        xml = self.xmlTextToTestFormat(xml)
+        expected = self.parse(xml)
+        rv = self.parse(xml, lazy=True)
+        self.assertIsInstance(rv, XMLDictNode)
+        self.assertEqual(rv, expected)
+        self.assertEqual(repr(rv), repr(expected))
+        self.assertEqual(rv.emit_xml(), expected.emit_xml())
+        self.assertEqual(rv['a'].get_xml_attrs(), {'x': '1'})
+        self.assertEqual(rv['a']['c'][0].get_cdata(), 'tu')
+        self.assertTrue(rv['a']['c'][0]['d'].parent is rv['a']['c'][0])
+        self.assertTrue(rv['a']['c'].parent is rv['a'])
+        self.assertEqual(rv['a']['b'][1].get_xml_attrs(), {'y': '2'})
+        # Unbuilt nodes compare equal, and copies are ordinary nodes.
+        self.assertEqual(self.parse(xml, lazy=True),
+                         self.parse(xml, lazy=True))
+        for other in (pickle.loads(pickle.dumps(self.parse(xml, lazy=True))),
+                      deepcopy(self.parse(xml, lazy=True))):
+            self.assertEqual(type(other['a']['c'][1]), XMLDictNode)
+            self.assertEqual(other, expected)
+        # Code in C, such as the C implementation of json.dumps(), sees
+        # the whole tree.
+        import json
+        self.assertEqual(json.dumps(self.parse(xml, lazy=True)),
+                         json.dumps(expected))
+        # The other options apply to the lazy tree.
+        rv = self.parse(xml, lazy=True, parent_links="none",
+                        mutable_cdata=True)
+        self.assertIsInstance(rv['a']['b'][0], jxmlease.XMLMutableCDATANode)
+        self.assertTrue(rv['a']['c'][0]['d'].parent is None)
+        self.assertRaises(ValueError, self.parse, xml, lazy=True,
+                          generator=["/a/b"])
+
+    def test_suspend_gc(self):
+        import gc
+        xml = self.xmlTextToTestFormat('<a><b>1</b><b>2</b></a>')
+        gc_enabled = gc.isenabled()
+        try:
+            for state in (True, False):
+                if state:
+                    gc.enable()
+                else:
+                    gc.disable()
+                rv = self.parse(xml, suspend_gc=True)
+                self.assertEqual(rv, {'a': {'b': ['1', '2']}})
+                self.assertEqual(gc.isenabled(), state)
+                for (path, match, value) in self.parse(xml, generator=["b"],
+                                                       suspend_gc=True):
+                    # The collector runs while the caller has control.
+                    self.assertEqual(gc.isenabled(), state)
+                self.assertEqual(gc.isenabled(), state)
+            if hasattr(gc, "freeze"):
+                rv = self.parse(xml, freeze_gc=True)
+                self.assertTrue(gc.get_freeze_count() > 0)
+                gc.unfreeze()
+        finally:
+            if gc_enabled:
+                gc.enable()
+            else:
+                gc.disable()
+
+    def test_use_mmap(self):
+        import os
+        import tempfile
+        xml = '<a><b x="1">1</b><b>2</b><c>3</c></a>'
+        expected = self.parse(xml)
+        (fd, path) = tempfile.mkstemp(suffix=".xml")
+        try:
+            os.write(fd, xml.encode('utf-8'))
+            os.close(fd)
+            for use_mmap in (False, True):
+                with open(path, 'rb') as fileobj:
+                    self.assertEqual(self.parse(fileobj, use_mmap=use_mmap),
+                                     expected)
+                with open(path, 'rb') as fileobj:
+                    rv = [str(node) for (_, _, node) in
+                          self.parse(fileobj, generator=["b"],
+                                     use_mmap=use_mmap)]
+                    self.assertEqual(rv, ['1', '2'])
+                if hasattr(os, 'fspath'):
+                    import pathlib
+                    self.assertEqual(self.parse(pathlib.Path(path),
+                                                use_mmap=use_mmap),
+                                     expected)
+            # Streams which cannot be mapped are read normally.
+            self.assertEqual(self.parse(BytesIO(xml.encode('utf-8')),
+                                        use_mmap=True), expected)
+        finally:
+            os.remove(path)
+
+    def test_parse_framed(self):
+        docs = ['<a><b>%d</b><b>x</b></a>' % i for i in range(5)]
+        expected = [self.parse(doc) for doc in docs]
+        stream = ''.join(doc + ']]>]]>\n' for doc in docs).encode('utf-8')
+        self.assertEqual(list(Parser().parse_framed(stream)), expected)
+        self.assertEqual(list(Parser().parse_framed(BytesIO(stream),
+                                                    chunk_size=7)),
+                         expected)
+        # The delimiter may be split across pieces of the stream.
+        for size in (1, 2, 3, 5, 7):
+            push = Parser().framed_push_parser()
+            rv = []
+            for i in range(0, len(stream), size):
+                rv.extend(push.feed(stream[i:i + size]))
+            rv.extend(push.close())
+            self.assertEqual(rv, expected)
+        # A final document without a delimiter is parsed at the end.
+        self.assertEqual(list(Parser().parse_framed(stream[:-7])), expected)
+        # Generator mode produces the matches of all the documents.
+        rv = [str(node) for (_, _, node) in
+              Parser().parse_framed([stream], generator="/a/b")]
+        self.assertEqual(rv, ['0', 'x', '1', 'x', '2', 'x', '3', 'x', '4',
+                              'x'])
+        self.assertRaises(ExpatError, list,
+                          Parser().parse_framed(b'<a>]]>]]><a></b>]]>]]>'))
+        self.assertRaises(ValueError, Parser().framed_push_parser,
+                          framing="bogus")
+
+    def test_parse_framed_chunked(self):
+        docs = ['<a><b>%d</b><b>x</b></a>' % i for i in range(5)]
+        expected = [self.parse(doc) for doc in docs]
+        stream = b''
+        for doc in docs:
+            doc = doc.encode('utf-8')
+            for i in range(0, len(doc), 4):
+                stream += b'\n#%d\n' % len(doc[i:i + 4]) + doc[i:i + 4]
+            stream += b'\n##\n'
+        for size in (1, 3, 11, len(stream)):
+            push = Parser().framed_push_parser(framing="chunked")
+            rv = []
+            for i in range(0, len(stream), size):
+                rv.extend(push.feed(stream[i:i + size]))
+            rv.extend(push.close())
+            self.assertEqual(rv, expected)
+        for bad in (b'\n#01\n0\n##\n', b'\n#a\n', b'#1\na',
+                    b'\n#12345678901234\n', b'\n#5\nabc'):
+            self.assertRaises(ValueError, list,
+                              Parser().parse_framed(bad, framing="chunked"))
+
+    def test_chunk_size(self):
+        class RecordingReader(object):
+            def __init__(self, data):
+                self.io_obj = BytesIO(data)
+                self.sizes = []
+            def read(self, size):
+                self.sizes.append(size)
+                return self.io_obj.read(size)
+        xml = ('<a>' + '<x>1</x>' * 2000 + '<b>1</b><b>2</b>' +
+               '<x>1</x>' * 200 + '</a>').encode('utf-8')
+        reader = RecordingReader(xml)
+        rv = list(self.parse(reader, generator=["/a/b"], chunk_size=100))
+        self.assertEqual([str(node) for (_, _, node) in rv], ['1', '2'])
+        self.assertEqual(set(reader.sizes), set([100]))
+        # The default is read when parsing starts.
+        old_increment = jxmlease.parsing_increment
+        try:
+            jxmlease.parsing_increment = 50
+            reader = RecordingReader(xml)
+            list(self.parse(reader, generator=["/a/b"]))
+            self.assertEqual(set(reader.sizes), set([50]))
+        finally:
+            jxmlease.parsing_increment = old_increment
+        # The adaptive size grows until the matches arrive, and then
+        # shrinks.
+        reader = RecordingReader(xml)
+        rv = list(self.parse(reader, generator=["/a/b"],
+                             chunk_size="adaptive"))
+        self.assertEqual([str(node) for (_, _, node) in rv], ['1', '2'])
+        self.assertEqual(reader.sizes[:4], [old_increment, old_increment * 2,
+                                            old_increment * 4,
+                                            old_increment * 8])
+        peak = reader.sizes.index(max(reader.sizes))
+        self.assertTrue(reader.sizes[peak + 1] < reader.sizes[peak])
+        for chunk_size in (0, -1, 1.5, "big"):
+            self.assertRaises(ValueError, self.parse, xml,
+                              chunk_size=chunk_size)
+
+    def test_suspend_gc_error(self):
+        import gc
+        gc_enabled = gc.isenabled()
+        gc.enable()
+        try:
+            self.assertRaises(ExpatError, self.parse, "<a><b></a>",
+                              suspend_gc=True)
+            self.assertTrue(gc.isenabled())
+            gen = self.parse("<a><b>1</b><c></a>", generator=["b"],
+                             suspend_gc=True)
+            self.assertRaises(ExpatError, list, gen)
+            self.assertTrue(gc.isenabled())
+        finally:
+            if not gc_enabled:
+                gc.disable()
+
+    def test_intern(self):
+        xml1 = self.xmlTextToTestFormat('<root><item state="up">1</item></root>')
+        xml2 = self.xmlTextToTestFormat('<root><item state="up">2</item></root>')
+        def first_attr(node):
+            return list(node.get_xml_attrs().keys())[0]
+        parser = self.Parser(intern=True)
+        a = parser(xml1)['root']['item']
+        b = parser(xml2)['root']['item']
+        self.assertEqual(b, '2')
+        self.assertTrue(a.tag is b.tag)
+        self.assertTrue(a.key is b.key)
+        self.assertTrue(first_attr(a) is first_attr(b))
+        table = {}
+        a = self.Parser(intern=table, intern_values=True)(xml1)['root']['item']
+        b = self.parse(xml2, intern=table, intern_values=True,
+                       strip_namespace=True)['root']['item']
+        self.assertTrue(a.tag is b.tag)
+        self.assertTrue(first_attr(a) is first_attr(b))
+        self.assertTrue(a.get_xml_attr('state') is b.get_xml_attr('state'))
+        for k in ('root', 'item', 'state', 'up'):
+            self.assertIn(k, table)
+        self.assertRaises(TypeError, self.Parser, intern="yes")
+
     def test_generator_string_basic(self):
         xml = '<a x="y"><b>1</b><b>2</b><b>3</b></a>'
         xml = self.xmlTextToTestFormat(xml)
@@ -388,7 +696,93 @@ class XMLToObjTestCase(unittest.TestCase):
         self.assertEqual(len(expected_values), 0)
         self.assertTrue(saw_root)
 
-    @skipUnless(_test_expat_partial_processing(), "Expat does not do partial processing of a file; no need to check for generator correctness.")
+    def test_generator_many_patterns(self):
+        xml = '<a><a><a><b>1</b></a><b>2</b></a><c><b>3</b></c></a>'
+        xml = self.xmlTextToTestFormat(xml)
+        matches = ["x%d/b" % i for i in range(0, 50)]
+        matches += ["c/b", "a/a/b", "a/b", "/a/a/b"]
+        parser = self.Parser(generator=matches)
+        for i in range(0, 2):
+            rv = [(path, match, value) for (path, match, value) in parser(xml)]
+            self.assertEqual(rv, [("/a/a/a/b", "a/a/b", "1"),
+                                  ("/a/a/b", "a/a/b", "2"),
+                                  ("/a/c/b", "c/b", "3")])
+
+    def test_generator_xpath_subset(self):
+        xml = ('<r><l><i><name>ge-0/0/1</name><v>1</v></i>'
+               '<i><name>ge-0/0/0</name><v>2</v></i></l>'
+               '<rt style="brief"><d>3</d></rt><rt><d>4</d></rt></r>')
+        xml = self.xmlTextToTestFormat(xml)
+        def run(generator):
+            return [(path, value) for (path, match, value)
+                    in self.parse(xml, generator=generator)]
+        rv = run("//i[name='ge-0/0/0']")
+        self.assertEqual(rv, [("/r/l/i", {'name': 'ge-0/0/0', 'v': '2'})])
+        self.assertEqual(run("/r/*/i/v"), [("/r/l/i/v", "1"),
+                                           ("/r/l/i/v", "2")])
+        self.assertEqual(run("/r//v"), [("/r/l/i/v", "1"),
+                                        ("/r/l/i/v", "2")])
+        self.assertEqual(run("rt[@style='brief']"), [("/r/rt", {'d': '3'})])
+        self.assertEqual(len(run("rt[@style]")), 1)
+        self.assertEqual(len(run("/r/rt[d]")), 2)
+        self.assertEqual(run(["rt[d='4']", "i[@x]", "/r/rt"]),
+                         [("/r/rt", {'d': '3'}), ("/r/rt", {'d': '4'})])
+        for bad in ("//i[name]/v", "a///b", "i[name=x]", "i[name='x'", "a//"):
+            self.assertRaises(Warning, self.Parser, generator=bad)
+
+    def test_exclude(self):
+        xml = ('<r><i t="e"><name>ge-0/0/0</name><stats><in>1</in></stats>'
+               'a<x/>b</i><i><name>lo0</name><stats><in>2</in></stats></i>'
+               '<stats><in>3</in></stats></r>')
+        xml = self.xmlTextToTestFormat(xml)
+        rv = self.parse(xml, exclude=["//i/stats", "x"])
+        self.assertEqual(rv, {'r': {'i': [{'name': 'ge-0/0/0'},
+                                          {'name': 'lo0'}],
+                                    'stats': {'in': '3'}}})
+        self.assertEqual(rv['r']['i'][0].get_cdata(), 'ab')
+        rv = self.parse(xml, exclude="/r/i[@t='e']")
+        self.assertEqual(rv['r']['i'], {'name': 'lo0', 'stats': {'in': '2'}})
+        rv = [value for (path, match, value) in
+              self.parse(xml, generator="in", exclude="i/stats")]
+        self.assertEqual(rv, ['3'])
+        self.assertRaises(Warning, self.Parser, exclude="i[name='lo0']")
+
+    def test_project(self):
+        xml = ('<r><pi><name>ge-0/0/0</name><oper>up</oper><stats><in>1</in>'
+               '</stats></pi><pi t="x"><name>lo0</name><stats><in>2</in>'
+               '</stats></pi><other><pi><q>3</q></pi></other></r>')
+        xml = self.xmlTextToTestFormat(xml)
+        rv = self.parse(xml, project=["//pi/name", "//pi/oper"])
+        self.assertEqual(rv, {'r': {'pi': [{'name': 'ge-0/0/0', 'oper': 'up'},
+                                           {'name': 'lo0'}]}})
+        self.assertEqual(rv['r']['pi'][1].get_xml_attrs(), {'t': 'x'})
+        rv = self.parse(xml, project="/r/pi[@t]")
+        self.assertEqual(rv, {'r': {'pi': {'name': 'lo0',
+                                           'stats': {'in': '2'}}}})
+        rv = [(path, value) for (path, match, value) in
+              self.parse(xml, generator="pi", project="//in")]
+        self.assertEqual(rv, [('/r/pi', {'stats': {'in': '1'}}),
+                              ('/r/pi', {'stats': {'in': '2'}})])
+        self.assertEqual(self.parse(xml, project="//nothing"), {})
+        self.assertRaises(Warning, self.Parser, project="pi[name='lo0']")
+
+    def test_generator_release_matches(self):
+        xml = '<a x="y"><b>1</b><c>x</c><b>2</b><b><d>3</d></b></a>'
+        xml = self.xmlTextToTestFormat(xml)
+        values = []
+        root = None
+        for (path, match, value) in self.parse(xml, generator=["/a/b", "/"],
+                                               release_matches=True):
+            if path == "/":
+                root = value
+            else:
+                self.assertTrue(value.parent is None)
+                values.append(value)
+        self.assertEqual(values, ['1', '2', {'d': '3'}])
+        self.assertEqual(root, {'a': {'c': 'x'}})
+        self.assertEqual(root['a'].get_xml_attrs(), {'x': 'y'})
+
+    @skipUnless(_test_expat_partial_processing(),"Expat does not do partial processing of a file; no need to check for generator correctness.")
     def test_generator_file_is_incremental(self):
         xml = _encode(large_xml_string)
         ioObj = BytesIO(xml)
@@ -449,6 +843,33 @@ class XMLToObjTestCase(unittest.TestCase):
             small_xml_string, small_xml_values, small_xml_path
         )
 
+    def test_push_parser_generator(self):
+        xml = _encode(large_xml_string)
+        push = self.Parser(generator=large_xml_path).push_parser()
+        values = []
+        for i in range(0, len(xml), 100):
+            for (path, match, value) in push.feed(xml[i:i+100]):
+                self.assertEqual(path, large_xml_path)
+                values.append(value)
+        for (path, match, value) in push.close():
+            values.append(value)
+        self.assertEqual(values, large_xml_values)
+
+    def test_push_parser_tree(self):
+        xml = '<a x="y"><b>1</b>text<b>2</b></a>'
+        parser = self.Parser()
+        push = parser.push_parser(cdata_separator='|')
+        for c in xml:
+            self.assertEqual(push.feed(c), [])
+        rv = push.close()
+        self.assertEqual(rv, parser(xml))
+        self.assertEqual(rv['a'].get_cdata(), 'text')
+        self.assertEqual(rv['a'].get_xml_attrs(), {'x': 'y'})
+        self.assertEqual(self.Parser().push_parser().close(), {})
+        push = self.Parser().push_parser()
+        push.feed("<a><b>")
+        self.assertRaises(ExpatError, push.close)
+
     def test_unicode(self):
         try:
             value = unichr(39321)
@@ -963,6 +1384,34 @@ class EtreeToObjTestCase(XMLToObjTestCase):
     def test_generator_file_is_incremental(self):
         pass
 
+    @skip("Test does not make sense in the Etree context")
+    def test_push_parser_generator(self):
+        pass
+
+    @skip("Test does not make sense in the Etree context")
+    def test_push_parser_tree(self):
+        pass
+
+    @skip("Test does not make sense in the Etree context")
+    def test_suspend_gc_error(self):
+        pass
+
+    @skip("Test does not make sense in the Etree context")
+    def test_use_mmap(self):
+        pass
+
+    @skip("Test does not make sense in the Etree context")
+    def test_chunk_size(self):
+        pass
+
+    @skip("Test does not make sense in the Etree context")
+    def test_parse_framed(self):
+        pass
+
+    @skip("Test does not make sense in the Etree context")
+    def test_parse_framed_chunked(self):
+        pass
+
     @skip("Test does not make sense in the Etree context")
     def test_empty_node(self):
         pass
@@ -980,6 +1429,317 @@ class EtreeToObjTestCase(XMLToObjTestCase):
         self.assertEqual(self.parse(xml_element),
                          self.parse(xml_elementtree))
 
+    def test_deep_tree(self):
+        # Trees deeper than the recursion limit can be parsed.
+        depth = sys.getrecursionlimit() + 100
+        root = etree.Element('a')
+        node = root
+        for i in range(depth):
+            node = etree.SubElement(node, 'b')
+            node.text = str(i)
+        rv = self.parse(root)
+        count = 0
+        node = rv['a']
+        while 'b' in node:
+            node = node['b']
+            count += 1
+        self.assertEqual(count, depth)
+        self.assertEqual(node, str(depth - 1))
+        rv = [str(node) for (_, _, node) in self.parse(root, generator="b")
+              if not isinstance(node, XMLDictNode)]
+        self.assertEqual(rv, [str(depth - 1)])
+
+    def test_parser_defaults(self):
+        # Creating a parser leaves the global defaults it ignores intact.
+        defaults = dict(use_mmap=False, chunk_size=4096, backend='expat',
+                        huge_tree=False)
+        jxmlease.parser_defaults.update(defaults)
+        try:
+            self.assertEqual(self.parse(etree.fromstring('<a>b</a>')),
+                             {'a': 'b'})
+            for (k, v) in defaults.items():
+                self.assertEqual(jxmlease.parser_defaults[k], v)
+        finally:
+            for k in defaults:
+                del jxmlease.parser_defaults[k]
+
+class LxmlBackendParser(Parser):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('backend', 'lxml')
+        Parser.__init__(self, **kwargs)
+
+@skipUnless(jxmlease._lxmlbackend.etree is not None, "lxml not available")
+class LxmlBackendToObjTestCase(XMLToObjTestCase):
+    # Runs the XMLToObjTestCase tests with the lxml backend, which must
+    # produce the same results as expat.
+    def __init__(self, *args, **kwargs):
+        XMLToObjTestCase.__init__(self, *args, **kwargs)
+        self.parse = lambda *args, **kwargs: parse(*args, backend='lxml',
+                                                   **kwargs)
+        self.Parser = LxmlBackendParser
+
+    def test_lxml_namespaces(self):
+        xml = ('<a:root xmlns:a="urn:a" xmlns="urn:d" a:x="1" xml:lang="en">'
+               '<b xmlns:a="urn:other" a:y="2"><a:c>1</a:c></b>'
+               '<a:c xmlns="">2</a:c><d xmlns="urn:a">3</d><a:e/></a:root>')
+        for kwargs in ({}, {'process_namespaces': True},
+                       {'strip_namespace': True},
+                       {'generator': ['/*/*']}):
+            expected = parse(xml, **kwargs)
+            rv = self.parse(xml, **kwargs)
+            if 'generator' in kwargs:
+                expected = [(path, str(node)) for (path, _, node) in expected]
+                rv = [(path, str(node)) for (path, _, node) in rv]
+            self.assertEqual(rv, expected)
+            self.assertEqual(repr(rv), repr(expected))
+
+    def test_lxml_backend_arguments(self):
+        xml = '<a>\n<b>1</b><b>2</b></a>'
+        self.assertEqual(self.parse(xml, huge_tree=True), parse(xml))
+        self.assertRaises(ValueError, parse, xml, backend='bogus')
+        self.assertRaises(ValueError, Parser, backend='lxml',
+                          expat=jxmlease.xmlparser.expat.ParserCreate)
+        try:
+            self.parse('<a>\n<b></a>')
+        except ExpatError as e:
+            self.assertEqual(e.lineno, 2)
+        else:
+            self.fail("ExpatError not raised")
+
+    def test_lxml_large_string(self):
+        # Strings are passed to lxml in pieces, so lxml's limit on the
+        # size of each piece does not apply to them.
+        text = "x" * 10000
+        xml = "<a>%s</a>" % ("".join("<b>%s</b>" % text
+                                     for _ in range(1100)),)
+        self.assertTrue(len(xml) > 10000000)
+        for xml_input in (xml, _encode(xml)):
+            rv = self.parse(xml_input)
+            self.assertEqual(len(rv['a']['b']), 1100)
+            self.assertEqual(rv['a']['b'][-1], text)
+
+@skipUnless(hasattr(jxmlease, "parse_many"), "multiprocessing not available")
+class ParseManyTestCase(unittest.TestCase):
+    docs = ['<a x="%d"><b>%d</b><b>2</b><c><d/></c>text</a>' % (i, i)
+            for i in range(10)]
+
+    def test_parse_many(self):
+        expected = [parse(doc) for doc in self.docs]
+        rv = list(jxmlease.parse_many(self.docs, workers=2))
+        self.assertEqual(rv, expected)
+        self.assertEqual([repr(node) for node in rv],
+                         [repr(node) for node in expected])
+        root = rv[3]
+        self.assertEqual(root['a'].get_xml_attr('x'), '3')
+        self.assertEqual(root['a'].text, 'text')
+        self.assertTrue(root['a']['b'][1].parent is root['a']['b'])
+        self.assertTrue(root['a']['b'].parent is root['a'])
+        self.assertTrue(root['a'].parent is root)
+        root['a']['b'][1].set_cdata('changed')
+        self.assertEqual(root['a']['b'], ['3', 'changed'])
+        rv = list(jxmlease.parse_many([BytesIO(_encode(doc))
+                                       for doc in self.docs],
+                                      workers=2, batch_size=3))
+        self.assertEqual(rv, expected)
+
+    def test_parse_many_unordered(self):
+        rv = dict(jxmlease.parse_many(self.docs, workers=2, ordered=False))
+        self.assertEqual(sorted(rv.keys()), list(range(len(self.docs))))
+        for (i, doc) in enumerate(self.docs):
+            self.assertEqual(rv[i], parse(doc))
+
+    def test_parse_many_arguments(self):
+        rv = list(jxmlease.parse_many(self.docs[:2], workers=1,
+                                      xml_attribs=False, mutable_cdata=True,
+                                      parent_links='none'))
+        self.assertEqual(rv, [parse(doc, xml_attribs=False)
+                              for doc in self.docs[:2]])
+        self.assertTrue(isinstance(rv[0]['a']['b'][0],
+                                   jxmlease.XMLMutableCDATANode))
+        self.assertTrue(rv[0]['a']['b'][0].parent is None)
+        self.assertRaises(ValueError, jxmlease.parse_many, self.docs,
+                          generator="/a/b")
+        self.assertRaises(ValueError, jxmlease.parse_many, self.docs,
+                          batch_size=0)
+        self.assertRaises(ValueError, jxmlease.parse_many, self.docs,
+                          parent_links='bogus')
+
+    def test_parse_many_error(self):
+        docs = self.docs[:3] + ['<a><b></a>'] + self.docs[3:]
+        rv = []
+        try:
+            for root in jxmlease.parse_many(docs, workers=2):
+                rv.append(root)
+        except jxmlease.ParseManyError as e:
+            self.assertEqual(e.index, 3)
+            self.assertTrue(isinstance(e.error, ExpatError))
+            self.assertTrue("document 3" in str(e))
+            self.assertIsNone(e.path)
+        else:
+            self.fail("ParseManyError not raised")
+        self.assertEqual(len(rv), 3)
+        # The error names a document given as a path.
+        import os
+        import tempfile
+        if not hasattr(os, 'fspath'):
+            return
+        import pathlib
+        (fd, path) = tempfile.mkstemp(suffix=".xml")
+        try:
+            os.write(fd, b'<a><b></a>')
+            os.close(fd)
+            try:
+                list(jxmlease.parse_many(self.docs[:1] + [pathlib.Path(path)],
+                                         workers=1))
+            except jxmlease.ParseManyError as e:
+                self.assertEqual(e.index, 1)
+                self.assertEqual(e.path, path)
+                self.assertTrue(path in str(e))
+            else:
+                self.fail("ParseManyError not raised")
+        finally:
+            os.remove(path)
+
+    split_doc = ('<?xml version="1.0"?>\n'
+                 '<r:rib xmlns:r="urn:rib" xmlns="urn:default">'
+                 '<r:name>inet.0</r:name>\n' +
+                 '\n'.join('<r:rt a="%d"><r:dest>10.%d.0.0</r:dest>'
+                           '<r:nh>ge-0/0/%d</r:nh></r:rt>' % (i, i, i % 3)
+                           for i in range(40)) +
+                 '\n<other/><r:rt>last</r:rt><r:rt/><last a=">">x</last>'
+                 '</r:rib>')
+
+    def test_parse_split(self):
+        expected = parse(self.split_doc)
+        rv = jxmlease.parse_split(self.split_doc, "r:rt", workers=2,
+                                  range_size=200)
+        self.assertEqual(rv, expected)
+        self.assertEqual(repr(rv), repr(expected))
+        self.assertEqual(list(rv['r:rib'].keys()),
+                         list(expected['r:rib'].keys()))
+        rts = rv['r:rib']['r:rt']
+        self.assertEqual(len(rts), 42)
+        self.assertTrue(rts[5].parent is rts)
+        self.assertTrue(rts.parent is rv['r:rib'])
+        self.assertEqual(rts[5].get_xml_attr('a'), '5')
+        self.assertEqual(rts[5]['r:dest'].parent, rts[5])
+        self.assertEqual(jxmlease.parse_split(self.split_doc, "r:rt",
+                                              workers=2, range_size=200,
+                                              process_namespaces=True),
+                         parse(self.split_doc, process_namespaces=True))
+        # Records which are all in one run, and a file.
+        import os
+        import tempfile
+        if not hasattr(os, 'fspath'):
+            return
+        import pathlib
+        doc = '<a><b/>%s</a>' % ('\n'.join('<rt>%d</rt>' % i
+                                           for i in range(100)),)
+        (fd, path) = tempfile.mkstemp(suffix=".xml")
+        try:
+            os.write(fd, doc.encode('utf-8'))
+            os.close(fd)
+            rv = jxmlease.parse_split(pathlib.Path(path), "rt", workers=2,
+                                      range_size=100, parent_links='weak')
+            self.assertEqual(rv, parse(doc))
+            self.assertTrue(rv['a']['rt'][3].parent is rv['a']['rt'])
+        finally:
+            os.remove(path)
+
+    def test_parse_split_fallback(self):
+        # Documents which cannot be split are parsed normally.
+        docs = [
+            '<a><rt>1</rt><!-- c --><rt>2</rt></a>',
+            '<a><rt>1<rt>2</rt></rt><rt>3</rt></a>',
+            '<a><rt>1</rt>text<rt>2</rt></a>',
+            '<a>text<rt>1</rt>\n<rt>2</rt>\n</a>',
+            '<a><b/><b/></a>',
+            '<a><rt>1</rt><rt>2</rt><rt>3</a>',
+        ]
+        for doc in docs[:-1]:
+            self.assertEqual(jxmlease.parse_split(doc, "rt", workers=2,
+                                                  range_size=1),
+                             parse(doc))
+        self.assertRaises(ExpatError, jxmlease.parse_split, docs[-1], "rt",
+                          workers=2, range_size=1)
+        self.assertRaises(ValueError, jxmlease.parse_split, docs[0], "rt",
+                          generator="/a/rt")
+        self.assertRaises(TypeError, jxmlease.parse_split, BytesIO(), "rt")
+
+    def test_parse_split_stream(self):
+        expected = [(path, match, str(node)) for (path, match, node) in
+                    parse(self.split_doc, generator="/r:rib/r:rt")]
+        rv = jxmlease.parse_split(self.split_doc, "r:rt", workers=2,
+                                  range_size=200, stream=True)
+        self.assertTrue(isinstance(rv, GeneratorType))
+        rv = list(rv)
+        self.assertEqual([(path, match, str(node))
+                          for (path, match, node) in rv], expected)
+        self.assertTrue(rv[3][2].parent is None)
+        self.assertEqual(rv[3][2]['r:nh'], 'ge-0/0/0')
+        doc = '<a><rt>1</rt><rt>2</rt><!-- c --><rt>3</rt></a>'
+        rv = jxmlease.parse_split(doc, "rt", range_size=1, stream=True)
+        self.assertEqual([str(node) for (_, _, node) in rv],
+                         ['1', '2', '3'])
+
+@skipUnless(hasattr(jxmlease, "AsyncParser"), "asyncio parsing not available")
+class AsyncParserTestCase(unittest.TestCase):
+    def setUp(self):
+        import asyncio
+        self.asyncio = asyncio
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def make_reader(self, xml):
+        reader = self.asyncio.StreamReader(loop=self.loop)
+        reader.feed_data(_encode(xml))
+        reader.feed_eof()
+        return reader
+
+    def collect(self, async_iter):
+        rv = []
+        while True:
+            try:
+                rv.append(self.loop.run_until_complete(async_iter.__anext__()))
+            except StopAsyncIteration:
+                return rv
+
+    def test_async_generator(self):
+        parser = jxmlease.AsyncParser(generator=large_xml_path)
+        matches = self.collect(parser(self.make_reader(large_xml_string)))
+        self.assertEqual([value for (_, _, value) in matches],
+                         large_xml_values)
+        self.assertEqual(set(path for (path, _, _) in matches),
+                         set([large_xml_path]))
+
+    def test_async_long_line(self):
+        # A StreamReader is read in chunks, not line by line, so a
+        # document on one line may exceed the reader's line limit.
+        xml = large_xml_string.replace("\n", "")
+        self.assertTrue(len(xml) > 65536)
+        parser = jxmlease.AsyncParser(generator=[large_xml_path])
+        matches = self.collect(parser(self.make_reader(xml)))
+        self.assertEqual([value for (_, _, value) in matches],
+                         large_xml_values)
+        rv = self.loop.run_until_complete(
+            jxmlease.AsyncParser()(self.make_reader(xml)))
+        self.assertEqual(rv, parse(xml))
+
+    def test_async_tree(self):
+        xml = '<a x="y"><b>1</b><b>2</b></a>'
+        parser = jxmlease.AsyncParser()
+        rv = self.loop.run_until_complete(parser(self.make_reader(xml)))
+        self.assertEqual(rv, parse(xml))
+        self.assertEqual(rv['a'].get_xml_attrs(), {'x': 'y'})
+        self.assertRaises(ExpatError, self.loop.run_until_complete,
+                          parser(self.make_reader("<a><b>")))
+
+class SubclassDictNode(XMLDictNode):
+    # A node class the pickle format does not know about.
+    pass
+
 class XMLNodeTestCase(unittest.TestCase):
     if need_assertIn:
         def assertIn(self, a, b, msg=None):
@@ -992,6 +1752,182 @@ class XMLNodeTestCase(unittest.TestCase):
         jxmlease.pprint(obj2, width=1000, stream=ioObj2, **kwargs)
         self.assertEqual(ioObj1.getvalue(), ioObj2.getvalue())
 
+    def test_slots_and_shared_attrs(self):
+        root = parse('<a x="1"><b>1</b><b>2</b><c/></a>')
+        b = root['a']['b']
+        c = root['a']['c']
+        self.assertFalse(hasattr(b, '__dict__'))
+        self.assertFalse(hasattr(b[0], '__dict__'))
+        self.assertRaises(AttributeError, setattr, b[0], 'foo', 1)
+        # Nodes without attributes share one immutable dictionary.
+        self.assertTrue(b[0]._xml_attrs is c._xml_attrs)
+        self.assertRaises(TypeError, c._xml_attrs.__setitem__, 'y', '2')
+        self.assertEqual(repr(c._xml_attrs), "OrderedDict()")
+        c.set_xml_attr('y', '2')
+        self.assertEqual(c.get_xml_attrs(), {'y': '2'})
+        self.assertEqual(b[0].get_xml_attrs(), {})
+        self.assertFalse(b[1].has_xml_attrs())
+        b[1].get_xml_attrs()['z'] = '3'
+        self.assertEqual(b[1].get_xml_attr('z'), '3')
+        self.assertEqual(b[0].xml_attrs, {})
+        self.assertRaises(KeyError, b[0].delete_xml_attr, 'z')
+        # The xml_attrs attribute is the node's own dictionary.
+        other = parse('<x><y/><z/></x>')['x']
+        self.assertTrue(other['y']._xml_attrs is other['z']._xml_attrs)
+        other['y'].xml_attrs['a'] = '1'
+        self.assertEqual(other['y'].get_xml_attr('a'), '1')
+        self.assertEqual(other['z'].xml_attrs, {})
+        node = XMLDictNode()
+        node.xml_attrs['k'] = 'v'
+        self.assertEqual(node.get_xml_attrs(), {'k': 'v'})
+        self.assertEqual(XMLDictNode().xml_attrs, {})
+        # Shallow copies have their own keys.
+        from copy import copy
+        tree = parse('<a><b>1</b><c>2</c></a>')
+        copied = copy(tree['a'])
+        self.assertEqual(list(copied.keys()), ['b', 'c'])
+        del copied['b']
+        self.assertEqual(list(tree['a'].keys()), ['b', 'c'])
+        # Copies keep the slot values.
+        for copied in (deepcopy(root), pickle.loads(pickle.dumps(root))):
+            self.assertEqual(copied, root)
+            self.assertEqual(copied.emit_xml(), root.emit_xml())
+            self.assertEqual(copied['a'].tag, 'a')
+            self.assertEqual(copied['a'].get_xml_attrs(), {'x': '1'})
+            self.assertTrue(copied['a']['b'][0].parent is copied['a']['b'])
+
+    def test_pickle_format(self):
+        from copy import copy
+        xml = '<a x="1"><b>1</b><b y="2">2</b><c><d/></c><e>t<f>u</f></e></a>'
+        for parent_links in ('strong', 'weak', 'none'):
+            root = parse(xml, parent_links=parent_links)
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                copied = pickle.loads(pickle.dumps(root, protocol))
+                self.assertEqual(copied, root)
+                self.assertEqual(repr(copied), repr(root))
+                self.assertEqual(copied['a']['b'][1].get_xml_attrs(),
+                                 {'y': '2'})
+                self.assertEqual(copied['a']['e'].text, 't')
+                self.assertEqual(type(copied['a']['b'][0]._parent),
+                                 type(root['a']['b'][0]._parent))
+                self.assertEqual(copied['a']['b'][1].parent,
+                                 root['a']['b'][1].parent)
+        # The pickled node becomes the root of the copy.
+        root = parse(xml)
+        copied = pickle.loads(pickle.dumps(root['a']['c']))
+        self.assertEqual(copied, root['a']['c'])
+        self.assertIsNone(copied.parent)
+        self.assertTrue(copied['d'].parent is copied)
+        # Shallow copies still share the children and the parent.
+        copied = copy(root['a'])
+        self.assertEqual(copied, root['a'])
+        self.assertTrue(copied['c'] is root['a']['c'])
+        self.assertTrue(copied.parent is root)
+        # Trees with other objects are pickled node by node.
+        root = XMLDictNode({'a': {'b': '1'}})
+        root['a'].add_node('c', new_node=SubclassDictNode({'d': '2'}))
+        copied = pickle.loads(pickle.dumps(root))
+        self.assertEqual(copied, root)
+        self.assertEqual(type(copied['a']['c']), SubclassDictNode)
+
+    def test_pickle_dict_keys(self):
+        # Copies keep the keys under which dictionaries store their
+        # children, even when they differ from the children's keys.
+        root = parse('<a><b><name>p</name><v>1</v></b>'
+                     '<b><name>q</name><v>2</v></b></a>')
+        by_name = root['a']['b'].dict(tags=['name'])
+        node = XMLDictNode()
+        node['foo'] = XMLCDATANode('v', tag='bar')
+        for tree in (by_name, node):
+            for copied in (deepcopy(tree), pickle.loads(pickle.dumps(tree))):
+                self.assertEqual(copied, tree)
+                self.assertEqual(list(copied.keys()), list(tree.keys()))
+                for (k, v) in tree.items():
+                    self.assertEqual(copied[k].key, v.key)
+                    self.assertEqual(copied[k].tag, v.tag)
+        self.assertEqual(list(deepcopy(by_name).keys()), ['p', 'q'])
+
+    def test_deepcopy_child_node(self):
+        # A deep copy of a child node copies its whole tree.
+        root = parse('<a><b>1</b><c><d>2</d></c></a>')
+        copied = deepcopy(root['a']['c'])
+        self.assertEqual(copied, root['a']['c'])
+        self.assertFalse(copied.parent is root['a'])
+        self.assertEqual(copied.parent, root['a'])
+        self.assertTrue(copied.parent['c'] is copied)
+        self.assertTrue(copied.parent.parent['a'] is copied.parent)
+        self.assertTrue(copied['d'].parent is copied)
+
+    def test_replace_node_by_identity(self):
+        root = parse('<a><b>x</b><b>x</b><b>x</b><c><d>1</d></c><c><d>1</d></c></a>')
+        first, second, third = root['a']['b']
+        second = second.set_cdata('y', return_node=True)
+        self.assertEqual(root['a']['b'], ['x', 'y', 'x'])
+        self.assertTrue(root['a']['b'][0] is first)
+        self.assertTrue(root['a']['b'][1] is second)
+        self.assertTrue(root['a']['b'][2] is third)
+        # A stale position hint falls back to a search by identity.
+        del root['a']['b'][0]
+        third = third.set_cdata('z', return_node=True)
+        self.assertEqual(root['a']['b'], ['y', 'z'])
+        self.assertTrue(root['a']['b'][1] is third)
+        # Equal dictionaries are told apart, too.
+        root['a']['c'][1]._replace_node(None)
+        self.assertEqual(len(root['a']['c']), 1)
+        root['a']['c'][0]['d'].set_cdata('2')
+        self.assertEqual(root['a']['c'], [{'d': '2'}])
+        self.assertTrue(root['a']['c'][0]['d'].parent is root['a']['c'][0])
+
+    def test_fast_constructors(self):
+        attrs = jxmlease.OrderedDict([("a", unicode("1"))])
+        fast = XMLDictNode._new_fast("root", attrs)
+        slow = XMLDictNode(tag="root", xml_attrs={"a": "1"})
+        fast.add_node("b", text="x")
+        fast.add_node("b", new_node=XMLCDATANode._new_fast("y", "b",
+                                                         jxmlease.OrderedDict()))
+        slow.add_node("b", text="x")
+        slow.add_node("b", text="y")
+        self.assertEqual(fast, slow)
+        self.assertEqual(fast.emit_xml(), slow.emit_xml())
+        self.assertEqual(fast.get_xml_attrs(), {"a": "1"})
+        self.assertEqual(fast.tag, "root")
+        self.assertEqual(fast.key, "root")
+        self.assertIsNone(fast.parent)
+        self.assertIsInstance(fast["b"], XMLListNode)
+        self.assertEqual(fast["b"].key, "b")
+        self.assertTrue(fast["b"].parent is fast)
+        for node in fast["b"]:
+            self.assertTrue(node.parent is fast["b"])
+            self.assertEqual(node.text, node)
+        self.assertTrue(fast.get_current_node() is fast)
+
+    def test_mutable_cdata_node(self):
+        node = jxmlease.XMLMutableCDATANode("abc", tag="a",
+                                            xml_attrs={"x": "1"})
+        self.assertFalse(isinstance(node, str))
+        self.assertEqual(node, "abc")
+        self.assertEqual(node, jxmlease.XMLMutableCDATANode("abc"))
+        self.assertNotEqual(node, "abd")
+        self.assertTrue(node < "abd")
+        self.assertEqual({node: 1}["abc"], 1)
+        self.assertEqual(len(node), 3)
+        self.assertEqual(node.upper(), "ABC")
+        self.assertEqual(node + "d", "abcd")
+        self.assertEqual(str(node), "abc")
+        node.set_cdata("  def ")
+        node.strip_cdata()
+        self.assertEqual(node.get_cdata(), "def")
+        self.assertEqual(node.text, "def")
+        self.assertEqual(node.emit_xml(full_document=False),
+                         '<a x="1">def</a>')
+        copy = jxmlease.XMLMutableCDATANode(node)
+        self.assertEqual(copy.get_xml_attrs(), {"x": "1"})
+        self.assertEqual(copy, "def")
+        copy.set_cdata("ghi")
+        self.assertEqual(node, "def")
+        self.assertEqual(pickle.loads(pickle.dumps(node)), node)
+        self.assertEqual(deepcopy(node).get_xml_attrs(), {"x": "1"})
+
     def test_newstyle_prettyprint(self):
         data1_orig = unicode("data1")
         data1 = XMLCDATANode(data1_orig)